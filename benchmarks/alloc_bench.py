@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+"""
+Measures the memory the threaded engine allocates to serve a request, with
+tracemalloc: the peak of traced memory above what was in use before the request,
+from the moment it's sent until its reply is read.
+
+The handler serves one end of a socketpair on its own thread, like a real
+connection, and payments are relayed to a local fake bank in another process so
+only the server's allocations are traced.
+
+Usage: python -m benchmarks.alloc_bench [requests]
+"""
+import logging
+import subprocess
+import sys
+import tracemalloc
+from json import dumps
+from socket import socketpair
+from statistics import mean, median
+from sys import argv
+from tempfile import TemporaryDirectory
+from threading import Thread
+from time import sleep
+from benchmarks.loadgen import free_port
+from src import cipher, server
+from src.bank import BankGateway
+from src.db import Liquor, LiquorDatabase
+from src.liquor import LiquorStore
+from src.sessions import SessionRegistry
+from src.watch import WatchHub
+
+UUID = "42eecd9e-13de-4b12-b91a-b0b599bb59db"
+
+QUOTE = f"BUY {UUID}\r\n".encode()
+PAYMENT = cipher.encrypt("transfer 1 2 3", 3).encode() + b" 3\r\n"
+
+# Request line, reply lines it gets, and the exchanges sent before and after it
+# without measuring them, as the payment must follow its quote
+SCENARIOS = [
+    ("unknown command", b"NOPE\r\n", 1, None, None),
+    ("UNWATCH", b"UNWATCH\r\n", 1, None, None),
+    ("BUY quote", QUOTE, 1, None, (PAYMENT, 2)),
+    ("BUY payment", PAYMENT, 2, (QUOTE, 1), None),
+]
+
+
+class Client:
+    """
+    Sends requests and waits for their replies without allocating, so the
+    allocations traced are the server's.
+    """
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.buffer = bytearray(65536)
+
+    def request(self, line: bytes, replies: int):
+        self.sock.sendall(line)
+        received = 0
+        while replies:
+            size = self.sock.recv_into(self.buffer)
+            replies -= self.buffer.count(b"\n", 0, size)
+            received += size
+        return received
+
+
+def setup_server(tmp_dir: str, bank_port: int) -> LiquorDatabase:
+    """
+    Sets the globals __main__ would, over a one liquor catalog.
+    """
+    database = LiquorDatabase(f"{tmp_dir}/liquor_store.db")
+    database.create(Liquor(UUID, "Vodka", "ru", 10**9, 114_900))
+    server.LOGGER = logging.getLogger("alloc_bench")
+    server.LOGGER.addHandler(logging.NullHandler())
+    server.LOGGER.propagate = False
+    server.STORE = LiquorStore(database)
+    server.OWNER_UUID = "4e0d3bbc-fac8-4a28-909a-752f65cf9c6c"
+    server.OWNER_UUID_JSON = dumps(server.OWNER_UUID)
+    server.SESSIONS = SessionRegistry()
+    server.HUB = WatchHub(database)
+    server.BANK = BankGateway(("127.0.0.1", bank_port), timeout=1)
+    return database
+
+
+def measure(
+    client: Client,
+    line: bytes,
+    replies: int,
+    before: tuple[bytes, int] | None,
+    after: tuple[bytes, int] | None,
+    number: int,
+) -> list[int]:
+    peaks = []
+    for _ in range(number):
+        if before is not None:
+            client.request(*before)
+        tracemalloc.reset_peak()
+        in_use = tracemalloc.get_traced_memory()[0]
+        client.request(line, replies)
+        peaks.append(tracemalloc.get_traced_memory()[1] - in_use)
+        if after is not None:
+            client.request(*after)
+    return peaks
+
+
+if __name__ == "__main__":
+    number = int(argv[1]) if len(argv) > 1 else 2000
+
+    bank_port = free_port()
+    bank = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.fake_bank", "--port", str(bank_port)]
+    )
+    try:
+        with TemporaryDirectory() as tmp_dir:
+            database = setup_server(tmp_dir, bank_port)
+            client_end, server_end = socketpair()
+            handler = Thread(
+                target=server.LiquorStoreTCPServerHandler,
+                args=(server_end, ("127.0.0.1", 5000), None),
+                daemon=True,
+            )
+            handler.start()
+            client = Client(client_end)
+            sleep(0.5)
+
+            tracemalloc.start()
+            print(f"{'request':<20}{'mean':>12}{'median':>12}  (peak bytes allocated)")
+            for label, *scenario in SCENARIOS:
+                # Warm the caches, pools and free lists first
+                measure(client, *scenario, 100)
+                peaks = measure(client, *scenario, number)
+                print(f"{label:<20}{mean(peaks):>12.0f}{median(peaks):>12.0f}")
+            tracemalloc.stop()
+
+            client_end.close()
+            handler.join()
+            server_end.close()
+            server.BANK.close()
+            database.close()
+    finally:
+        bank.terminate()
+        bank.wait()
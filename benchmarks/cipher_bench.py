@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+"""
+Compares the table-driven cypher against the character by character implementation
+it replaced.
+
+Usage: python -m benchmarks.cipher_bench [message_length]
+"""
+from sys import argv
+from timeit import timeit
+from src import cipher
+
+
+def legacy_encrypt(msg: str, n: int) -> str:
+    result = ""
+    for char in msg:
+        if char.isalpha():
+            if char.islower():
+                result += chr((ord(char) - ord("a") + n) % 26 + ord("a"))
+            else:
+                result += chr((ord(char) - ord("A") + n) % 26 + ord("A"))
+        elif char.isdigit():
+            result += chr((ord(char) - ord("0") + n) % 10 + ord("0"))
+        else:
+            result += char
+    return result
+
+
+def bench(label: str, fn, number: int, baseline: float | None = None) -> float:
+    seconds = timeit(fn, number=number) / number
+    speedup = f"  x{baseline / seconds:.1f}" if baseline else ""
+    print(f"{label:<28}{seconds * 1e6:>12.2f} us{speedup}")
+    return seconds
+
+
+if __name__ == "__main__":
+    length = int(argv[1]) if len(argv) > 1 else 4096
+    sample = "OK Transfer 4e0d3bbc-fac8-4a28-909a-752f65cf9c6c done 3 "
+    msg = (sample * (length // len(sample) + 1))[:length]
+    data = msg.encode("utf-8")
+    number = max(10, 2_000_000 // length)
+
+    print(f"Message of {length} characters, {number} runs")
+    baseline = bench("legacy str", lambda: legacy_encrypt(msg, 7), number)
+    bench("cipher.encrypt str", lambda: cipher.encrypt(msg, 7), number, baseline)
+    bench(
+        "legacy bytes (decode/encode)",
+        lambda: legacy_encrypt(data.decode("utf-8"), 7).encode("utf-8"),
+        number,
+    )
+    bench("cipher.encrypt_bytes", lambda: cipher.encrypt_bytes(data, 7), number, baseline)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+"""
+Local UDP stand-in for the bank, answering every payment like the real one does:
+the reply is encrypted with the shift cypher and followed by the shift number.
+
+Usage: python -m benchmarks.fake_bank [--port PORT] [--latency SECONDS]
+           [--drop-rate RATE] [--error-rate RATE]
+"""
+import asyncio
+from argparse import ArgumentParser
+from random import Random
+from src import cipher
+
+
+class FakeBankProtocol(asyncio.DatagramProtocol):
+    """
+    Answers each datagram with 'OK Transfer done' or, at error_rate, with
+    'ERR 3' (insufficient funds), after latency seconds. At drop_rate the
+    datagram is ignored, like a packet lost on the way.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        drop_rate: float = 0.0,
+        error_rate: float = 0.0,
+        shift: int = 3,
+        seed: int | None = None,
+    ):
+        self.latency = latency
+        self.drop_rate = drop_rate
+        self.error_rate = error_rate
+        self.random = Random(seed)
+        self.replies = {
+            message: f"{cipher.encrypt(message, shift)} {shift}\r\n".encode("utf-8")
+            for message in ["OK Transfer done", "ERR 3"]
+        }
+        self.transport: asyncio.DatagramTransport | None = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, address):
+        if self.random.random() < self.drop_rate:
+            return
+        reply = self.replies[
+            "ERR 3" if self.random.random() < self.error_rate else "OK Transfer done"
+        ]
+        loop = asyncio.get_running_loop()
+        if self.latency:
+            loop.call_later(self.latency, self.transport.sendto, reply, address)
+        else:
+            self.transport.sendto(reply, address)
+
+
+async def serve(host: str, port: int, **options):
+    loop = asyncio.get_running_loop()
+    transport, _ = await loop.create_datagram_endpoint(
+        lambda: FakeBankProtocol(**options), local_addr=(host, port)
+    )
+    try:
+        await asyncio.Event().wait()
+    finally:
+        transport.close()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(prog="python -m benchmarks.fake_bank")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5001)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(
+            serve(
+                args.host,
+                args.port,
+                latency=args.latency,
+                drop_rate=args.drop_rate,
+                error_rate=args.error_rate,
+            )
+        )
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,334 @@
+#!/usr/bin/env python
+"""
+End-to-end load generator.
+
+Starts `src.server` against a temporary catalog and a local fake bank, drives
+thousands of concurrent simulated clients running a weighted HI/LIST/BUY mix and
+prints throughput, latency percentiles and error rates as JSON, so engines and
+configurations can be compared run against run.
+
+Usage: python -m benchmarks.loadgen [--clients N] [--duration SECONDS]
+           [--mix HI:1,LIST:5,BUY:1] [--engine threaded|asyncio] [...]
+           [-- extra server arguments]
+"""
+import asyncio
+import json
+import subprocess
+import sys
+from argparse import ArgumentParser, Namespace
+from random import Random
+from socket import socket
+from tempfile import TemporaryDirectory
+from time import monotonic, perf_counter, sleep
+from src.db import Liquor, LiquorDatabase
+from src.server import raise_open_files_limit
+
+# Payment forwarded to the bank, the fake bank doesn't read it
+PAYMENT = b"Sfy 4e0d3bbc 114900 3\r\n"
+
+
+def free_port() -> int:
+    with socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 10.0):
+    deadline = monotonic() + timeout
+    while monotonic() < deadline:
+        with socket() as probe:
+            if probe.connect_ex(("127.0.0.1", port)) == 0:
+                return
+        sleep(0.05)
+    raise TimeoutError(f"Server didn't listen on port {port}")
+
+
+def rss_kb(pid: int) -> int | None:
+    """
+    Resident memory of a process in KiB, None where /proc isn't available.
+    """
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def percentiles(latencies: list[float]) -> dict[str, float]:
+    if not latencies:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    latencies.sort()
+    last = len(latencies) - 1
+    return {
+        f"p{q}": round(latencies[min(last, int(q / 100 * len(latencies)))] * 1000, 3)
+        for q in (50, 95, 99)
+    } | {"max": round(latencies[-1] * 1000, 3)}
+
+
+class Results:
+    """
+    Latencies and outcomes of every operation, per operation kind.
+    """
+
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = {}
+        self.errors: dict[str, dict[str, int]] = {}
+
+    def ok(self, operation: str, seconds: float):
+        self.latencies.setdefault(operation, []).append(seconds)
+
+    def error(self, operation: str, reason: str):
+        errors = self.errors.setdefault(operation, {})
+        errors[reason] = errors.get(reason, 0) + 1
+
+    def report(self, duration: float) -> dict:
+        operations = {}
+        for operation in sorted(set(self.latencies) | set(self.errors)):
+            done = len(self.latencies.get(operation, []))
+            failed = sum(self.errors.get(operation, {}).values())
+            operations[operation] = {
+                "ok": done,
+                "errors": self.errors.get(operation, {}),
+                "error_rate": round(failed / (done + failed), 4) if done + failed else 0,
+                "throughput": round(done / duration, 1),
+                "latency_ms": percentiles(self.latencies.get(operation, [])),
+            }
+        total_ok = sum(len(latencies) for latencies in self.latencies.values())
+        total_failed = sum(
+            sum(errors.values()) for errors in self.errors.values()
+        )
+        return {
+            "throughput": round(total_ok / duration, 1),
+            "ok": total_ok,
+            "errors": total_failed,
+            "error_rate": round(total_failed / (total_ok + total_failed), 4)
+            if total_ok + total_failed
+            else 0,
+            "latency_ms": percentiles(
+                [latency for latencies in self.latencies.values() for latency in latencies]
+            ),
+            "operations": operations,
+        }
+
+
+async def client(
+    port: int,
+    uuids: list[str],
+    mix: list[tuple[str, int]],
+    deadline: float,
+    results: Results,
+    rng: Random,
+    think_time: float,
+    timeout: float,
+):
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection("127.0.0.1", port, limit=1 << 24), timeout
+        )
+    except (OSError, asyncio.TimeoutError) as error:
+        results.error("CONNECT", type(error).__name__)
+        return
+
+    operations = [operation for operation, _ in mix]
+    weights = [weight for _, weight in mix]
+
+    try:
+        while monotonic() < deadline:
+            operation = rng.choices(operations, weights)[0]
+            start = perf_counter()
+            try:
+                reply = await asyncio.wait_for(
+                    run_operation(operation, reader, writer, uuids, rng), timeout
+                )
+            except asyncio.TimeoutError:
+                results.error(operation, "timeout")
+                break
+            except (OSError, asyncio.IncompleteReadError) as error:
+                results.error(operation, type(error).__name__)
+                break
+
+            if reply.startswith(b"ERR"):
+                results.error(operation, reply.strip().decode())
+            else:
+                results.ok(operation, perf_counter() - start)
+
+            if think_time:
+                await asyncio.sleep(rng.expovariate(1 / think_time))
+    finally:
+        writer.close()
+
+
+async def run_operation(
+    operation: str,
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+    uuids: list[str],
+    rng: Random,
+) -> bytes:
+    """
+    Runs an operation and returns its last reply line.
+    """
+    match operation:
+        case "HI":
+            # HI has no reply, a one-liquor LIST page behind it times the round trip
+            writer.write(b"HI\r\nLIST limit=1\r\n")
+            await writer.drain()
+            return await reader.readuntil(b"\r\n")
+
+        case "LIST":
+            writer.write(b"LIST\r\n")
+            await writer.drain()
+            return await reader.readuntil(b"\r\n")
+
+        case "BUY":
+            writer.write(f"BUY {rng.choice(uuids)}\r\n".encode())
+            await writer.drain()
+            quote = await reader.readuntil(b"\r\n")
+            if quote.startswith(b"ERR"):
+                return quote
+
+            writer.write(PAYMENT)
+            await writer.drain()
+            bank_reply = await reader.readuntil(b"\r\n")
+            if bank_reply.startswith(b"OK"):
+                # Either the liquor or the error of a failed stock decrement
+                return await reader.readuntil(b"\r\n")
+            return bank_reply
+
+    raise ValueError(f"Unknown operation {operation}")
+
+
+async def drive(args: Namespace, port: int, uuids: list[str]) -> tuple[Results, float]:
+    results = Results()
+    rng = Random(args.seed)
+    mix = [
+        (operation, int(weight))
+        for operation, _, weight in (item.partition(":") for item in args.mix.split(","))
+    ]
+
+    start = monotonic()
+    deadline = start + args.duration
+    tasks = []
+    for index in range(args.clients):
+        tasks.append(
+            asyncio.create_task(
+                client(
+                    port,
+                    uuids,
+                    mix,
+                    deadline,
+                    results,
+                    Random(rng.random()),
+                    args.think_time,
+                    args.timeout,
+                )
+            )
+        )
+        # Ramp up instead of flooding the listen backlog at once
+        if index % 200 == 199:
+            await asyncio.sleep(0.01)
+    await asyncio.gather(*tasks)
+    return results, monotonic() - start
+
+
+def main(argv: list[str]):
+    if "--" in argv:
+        split = argv.index("--")
+        argv, server_args = argv[:split], argv[split + 1 :]
+    else:
+        server_args = []
+
+    parser = ArgumentParser(prog="python -m benchmarks.loadgen")
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--mix", default="HI:1,LIST:5,BUY:1")
+    parser.add_argument("--engine", choices=["threaded", "asyncio"], default="threaded")
+    parser.add_argument("--catalog-size", type=int, default=100)
+    parser.add_argument("--think-time", type=float, default=0.0)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--bank-latency", type=float, default=0.0)
+    parser.add_argument("--bank-drop-rate", type=float, default=0.0)
+    parser.add_argument("--bank-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=2023)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    parser.add_argument("--server-log", help="write the server's log to this file")
+    args = parser.parse_args(argv)
+
+    raise_open_files_limit()
+
+    with TemporaryDirectory() as tmp_dir:
+        db_path = f"{tmp_dir}/liquor_store.db"
+        uuids = [f"{index:08}-load-test" for index in range(args.catalog_size)]
+        with LiquorDatabase(db_path) as database:
+            database.create_many(
+                Liquor(uuid, f"Liquor {index}", "co", 10**9, 1000 + index)
+                for index, uuid in enumerate(uuids)
+            )
+
+        server_log = open(args.server_log, "w") if args.server_log else subprocess.DEVNULL
+        bank_port, server_port = free_port(), free_port()
+        bank = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "benchmarks.fake_bank",
+                "--port",
+                str(bank_port),
+                "--latency",
+                str(args.bank_latency),
+                "--drop-rate",
+                str(args.bank_drop_rate),
+                "--error-rate",
+                str(args.bank_error_rate),
+            ]
+        )
+        server = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "src.server",
+                "127.0.0.1",
+                str(server_port),
+                "127.0.0.1",
+                str(bank_port),
+                "--engine",
+                args.engine,
+                "--db-path",
+                db_path,
+                "--sales-db",
+                "",
+                *server_args,
+            ],
+            stderr=server_log,
+        )
+
+        try:
+            wait_for_port(server_port)
+            results, duration = asyncio.run(drive(args, server_port, uuids))
+            server_rss = rss_kb(server.pid)
+        finally:
+            server.terminate()
+            bank.terminate()
+            server.wait()
+            bank.wait()
+            if args.server_log:
+                server_log.close()
+
+    report = {
+        "config": vars(args) | {"server_args": server_args},
+        "duration": round(duration, 3),
+        "server_rss_kb": server_rss,
+    } | results.report(duration)
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+"""
+Measures the overhead the latency instrumentation adds to every command, DB call
+and bank round trip.
+
+Usage: python -m benchmarks.metrics_bench
+"""
+from time import perf_counter
+from timeit import timeit
+from src.metrics import Histogram, Metrics
+
+RUNS = 200_000
+
+
+def per_call(fn) -> float:
+    return timeit(fn, number=RUNS) / RUNS * 1e9
+
+
+if __name__ == "__main__":
+    histogram = Histogram()
+    metrics = Metrics()
+
+    def plain():
+        return 0, ""
+
+    timed = metrics.timed("db", "read")(plain)
+
+    def recorded():
+        start = perf_counter()
+        result = plain()
+        metrics.record("command", "LIST", perf_counter() - start, result[0])
+        return result
+
+    baseline = per_call(plain)
+    print(f"{'plain call':<36}{baseline:>8.0f} ns")
+    print(f"{'Histogram.record':<36}{per_call(lambda: histogram.record(0.0012)):>8.0f} ns")
+    print(f"{'Metrics.timed call':<36}{per_call(timed):>8.0f} ns  (+{per_call(timed) - baseline:.0f} ns)")
+    print(
+        f"{'Command.fn style record':<36}{per_call(recorded):>8.0f} ns  (+{per_call(recorded) - baseline:.0f} ns)"
+    )
+    print(f"{'snapshot with p50/p95/p99':<36}{per_call(histogram.snapshot):>8.0f} ns")
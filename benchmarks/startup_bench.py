@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""
+Measures how long a restarted server takes to serve its first LIST, reading and
+serializing the catalog from SQLite or loading a catalog snapshot.
+
+Usage: python -m benchmarks.startup_bench [catalog_size]
+"""
+import subprocess
+import sys
+from sys import argv
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from benchmarks.wire_bench import catalog
+from src.db import LiquorDatabase
+from src.liquor import LiquorStore
+from src.snapshot import load_snapshot, save_snapshot
+
+RUNS = 5
+
+
+def first_list(db_path: str, snapshot_path: str | None = None) -> float:
+    """
+    Opens the database and a store like the server does at boot, and serves the
+    text and binary LIST once.
+    """
+    start = perf_counter()
+    database = LiquorDatabase(db_path)
+    store = LiquorStore(database)
+    if snapshot_path is not None:
+        load_snapshot(snapshot_path, store, database)
+    store.list_prefix()
+    store.list_binary()
+    elapsed = perf_counter() - start
+    database.close()
+    return elapsed
+
+
+def import_time() -> float:
+    """
+    Imports the server in a new interpreter, which no longer touches the database.
+    """
+    code = (
+        "from time import perf_counter; start = perf_counter(); import src.server; "
+        "print(perf_counter() - start)"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, check=True, text=True
+    )
+    return float(output.stdout)
+
+
+def report(label: str, seconds: float, baseline: float | None = None):
+    speedup = f"  x{baseline / seconds:.1f}" if baseline else ""
+    print(f"{label:<28}{seconds * 1e3:>12.2f} ms{speedup}")
+
+
+if __name__ == "__main__":
+    size = int(argv[1]) if len(argv) > 1 else 100_000
+
+    with TemporaryDirectory() as tmp_dir:
+        db_path = f"{tmp_dir}/liquor_store.db"
+        snapshot_path = f"{tmp_dir}/catalog.snapshot"
+        with LiquorDatabase(db_path) as database:
+            database.create_many(catalog(size))
+            snapshot_size = save_snapshot(snapshot_path, LiquorStore(database), database)
+
+        print(f"Catalog of {size} liquors, snapshot of {snapshot_size} bytes")
+        report("import src.server", min(import_time() for _ in range(RUNS)))
+        cold = min(first_list(db_path) for _ in range(RUNS))
+        report("first LIST from SQLite", cold)
+        report(
+            "first LIST from snapshot",
+            min(first_list(db_path, snapshot_path) for _ in range(RUNS)),
+            cold,
+        )
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+"""
+Compares the size of a LIST reply in the text and binary protocols, and how long
+clients take to decode each one.
+
+Usage: python -m benchmarks.wire_bench [catalog_size]
+"""
+from json import dumps, loads
+from random import Random
+from sys import argv
+from timeit import timeit
+from uuid import UUID
+from src import wire
+from src.db import Liquor
+
+OWNER_UUID = "4e0d3bbc-fac8-4a28-909a-752f65cf9c6c"
+COUNTRY_CODES = ["ru", "kr", "jp", "co", "de", "mx", "fr", "gb"]
+
+
+def catalog(size: int) -> list[Liquor]:
+    rng = Random(2023)
+    return [
+        Liquor(
+            str(UUID(int=rng.getrandbits(128), version=4)),
+            f"Liquor {index}",
+            rng.choice(COUNTRY_CODES),
+            rng.randrange(100),
+            rng.randrange(1_000, 400_000, 100) + 0.0,
+        )
+        for index in range(size)
+    ]
+
+
+def bench(label: str, fn, number: int, baseline: float | None = None) -> float:
+    seconds = timeit(fn, number=number) / number
+    speedup = f"  x{baseline / seconds:.1f}" if baseline else ""
+    print(f"{label:<28}{seconds * 1e6:>12.2f} us{speedup}")
+    return seconds
+
+
+if __name__ == "__main__":
+    size = int(argv[1]) if len(argv) > 1 else 1000
+    liquors = catalog(size)
+    number = max(5, 200_000 // size)
+
+    text = f"OK {dumps([liquor.get_data() for liquor in liquors] + [1, OWNER_UUID])}\r\n"
+    text = text.encode("utf-8")
+    binary = wire.encode_list(wire.encode_page(liquors), 1, OWNER_UUID)
+
+    print(f"Catalog of {size} liquors, {number} runs")
+    print(f"{'text LIST':<28}{len(text):>12} bytes")
+    print(f"{'binary LIST':<28}{len(binary):>12} bytes  x{len(text) / len(binary):.1f}")
+
+    baseline = bench("text decode", lambda: loads(text[3:]), number)
+    bench(
+        "binary decode",
+        lambda: wire.decode_list(wire.split_frames(bytearray(binary))[0][1]),
+        number,
+        baseline,
+    )
+    bench(
+        "text encode",
+        lambda: dumps([liquor.get_data() for liquor in liquors]),
+        number,
+    )
+    bench("binary encode", lambda: wire.encode_page(liquors), number)
@@ -0,0 +1,410 @@
+import atexit
+import sqlite3
+from heapq import nsmallest
+from os import makedirs, path as os_path
+from threading import Event, Lock, Thread
+from time import time
+from typing import Callable
+
+# Seconds per bucket and buckets kept of each window
+WINDOWS = {"minute": (1, 60), "hour": (60, 60), "day": (3600, 24)}
+
+# Window counting every sale since the sales DB was created
+ALL_TIME = "all"
+
+# Counters of whole orders, kept next to the liquors' under a UUID none can have
+TOTAL = "*"
+
+CREATE_SALES_SQL = """
+CREATE TABLE IF NOT EXISTS sales (
+    minute INTEGER NOT NULL,
+    uuid TEXT NOT NULL,
+    orders INTEGER NOT NULL,
+    units INTEGER NOT NULL,
+    revenue REAL NOT NULL,
+    PRIMARY KEY (minute, uuid)
+)
+"""
+
+UPSERT_SALES_SQL = """
+INSERT INTO sales (minute, uuid, orders, units, revenue) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (minute, uuid) DO UPDATE SET
+    orders = orders + excluded.orders,
+    units = units + excluded.units,
+    revenue = revenue + excluded.revenue
+"""
+
+SELECT_TOTALS_SQL = """
+SELECT uuid, SUM(orders), SUM(units), SUM(revenue) FROM sales GROUP BY uuid
+"""
+
+SELECT_SINCE_SQL = """
+SELECT minute, uuid, orders, units, revenue FROM sales WHERE minute >= ?
+"""
+
+
+def parse_report_options(*options: str) -> dict | None:
+    """
+    Parses the options of TOP and SALES, each one formatted as key=value.
+
+    Options:
+        window (str): 'minute', 'hour', 'day' or 'all', the default.
+        limit (int): Liquors listed by TOP.
+        uuid (str): The liquor reported by SALES.
+
+    Returns:
+        dict | None: The options, or None if one is malformed.
+    """
+    parsed: dict = {"window": ALL_TIME}
+    for option in options:
+        key, _, value = option.partition("=")
+        match key:
+            case "window":
+                if value != ALL_TIME and value not in WINDOWS:
+                    return None
+                parsed["window"] = value
+            case "limit":
+                # str.isdigit also accepts digits like '²', which int rejects
+                if not (value.isascii() and value.isdigit()):
+                    return None
+                try:
+                    parsed["limit"] = int(value)
+                except ValueError:
+                    # Past int's limit of digits
+                    return None
+                if parsed["limit"] <= 0:
+                    return None
+            case "uuid" if value:
+                parsed["uuid"] = value
+            case _:
+                return None
+    return parsed
+
+
+def add_counters(table: dict[str, list], uuid: str, counters: list):
+    """
+    Adds orders, units and revenue to the counters of a UUID in a table.
+    """
+    current = table.get(uuid)
+    if current is None:
+        table[uuid] = list(counters)
+    else:
+        current[0] += counters[0]
+        current[1] += counters[1]
+        current[2] += counters[2]
+
+
+class SalesRing:
+    """
+    Sales of the last `width * size` seconds, in `size` buckets reused in turn as
+    time goes by.
+
+    The totals of the window are kept up to date as sales are added and buckets
+    fall out of it, so reading them never merges the buckets.
+
+    Not thread-safe on its own, SalesAggregator guards its rings with a lock.
+    """
+
+    def __init__(self, width: int, size: int):
+        self.width = width
+        self.__indexes = [-1] * size
+        self.__buckets: list[dict[str, list]] = [{} for _ in range(size)]
+        self.__totals: dict[str, list] = {}
+        self.__latest = -1
+
+    def __expire(self, index: int):
+        """
+        Takes the buckets older than the window out of its totals.
+        """
+        self.__latest = index
+        oldest = index - len(self.__buckets)
+        for slot, bucket_index in enumerate(self.__indexes):
+            if bucket_index < 0 or bucket_index > oldest:
+                continue
+            for uuid, counters in self.__buckets[slot].items():
+                total = self.__totals[uuid]
+                total[0] -= counters[0]
+                total[1] -= counters[1]
+                total[2] -= counters[2]
+                # Units are whole, the revenue left over is rounding
+                if not total[1]:
+                    del self.__totals[uuid]
+            self.__indexes[slot] = -1
+            self.__buckets[slot] = {}
+
+    def add(self, now: float, uuid: str, counters: list):
+        index = int(now // self.width)
+        if index > self.__latest:
+            self.__expire(index)
+        elif index <= self.__latest - len(self.__buckets):
+            # Older than the window
+            return
+        slot = index % len(self.__buckets)
+        self.__indexes[slot] = index
+        add_counters(self.__buckets[slot], uuid, counters)
+        add_counters(self.__totals, uuid, counters)
+
+    def totals(self, now: float) -> dict[str, list]:
+        """
+        Returns the totals of the window, which must not be changed.
+        """
+        index = int(now // self.width)
+        if index > self.__latest:
+            self.__expire(index)
+        return self.__totals
+
+
+class SalesAggregator:
+    """
+    Counts the orders, units and revenue of every liquor sold, as sales happen.
+
+    Sales are added to all-time counters and to ring buffers of the last minute,
+    hour and day, so reports never scan past sales. The best sellers of all time
+    are ranked as sales arrive, since all-time counters only grow a liquor enters
+    the ranking by passing its last one. Rankings of a window are taken from the
+    running totals of its ring buffer.
+
+    With a path, sales are also compacted to one row per minute and liquor in a
+    SQLite file of their own, written every flush_interval seconds by a
+    background thread, and the counters are loaded back from it on start. The
+    `sales` table holds `minute` (Unix time // 60), `uuid`, `orders`, `units` and
+    `revenue`, with whole orders under the UUID '*'.
+
+    Attributes:
+        top_k (int): Best sellers of all time kept ranked.
+        flush_interval (float): Seconds between writes to SQLite.
+
+    Methods:
+        record(order: dict[str, int], prices: dict[str, float]): Counts a sale.
+        top(limit: int, window: str) -> list[list]: Returns the best sellers.
+        sales(window: str, uuid: str | None) -> dict: Returns sale totals.
+        flush() -> int: Writes the pending sales in one transaction.
+        close(): Flushes everything and stops the background thread.
+        stats() -> dict[str, int]: Returns the aggregator counters.
+    """
+
+    def __init__(
+        self,
+        path: str | None = None,
+        top_k: int = 100,
+        flush_interval: float = 10.0,
+        clock: Callable[[], float] = time,
+    ):
+        """
+        Args:
+            path (str | None): SQLite file of the sales, None keeps them in memory.
+            top_k (int): Best sellers of all time kept ranked.
+            flush_interval (float): Seconds between writes to SQLite.
+            clock (Callable[[], float]): Unix time in seconds.
+        """
+        self.top_k = top_k
+        self.flush_interval = flush_interval
+        self.__clock = clock
+        self.__rings = {
+            window: SalesRing(width, size) for window, (width, size) in WINDOWS.items()
+        }
+        # Orders, units and revenue of each liquor since the sales DB was created
+        self.__totals: dict[str, list] = {}
+        # Units of the best sellers, and of the last of them once there are top_k
+        self.__top: dict[str, int] = {}
+        self.__floor = 0
+        # Sales not written yet, by minute and liquor
+        self.__pending: dict[tuple[int, str], list] = {}
+        self.__lock = Lock()
+        self.__flush_lock = Lock()
+        self.__counters = {"sales": 0, "flushes": 0, "retries": 0}
+        self.__connection: sqlite3.Connection | None = None
+        self.__stop = Event()
+        self.__thread: Thread | None = None
+        if path is None:
+            return
+
+        makedirs(os_path.dirname(path) or ".", exist_ok=True)
+        self.__connection = sqlite3.connect(path, check_same_thread=False)
+        # Dashboards read while the server writes
+        self.__connection.execute("PRAGMA journal_mode=WAL")
+        with self.__connection:
+            self.__connection.execute(CREATE_SALES_SQL)
+        self.__load()
+        self.__thread = Thread(target=self.__run, name="sales", daemon=True)
+        self.__thread.start()
+        atexit.register(self.close)
+
+    def __load(self):
+        """
+        Loads the all-time counters and the sales of the last day from SQLite.
+        """
+        for uuid, orders, units, revenue in self.__connection.execute(
+            SELECT_TOTALS_SQL
+        ):
+            self.__totals[uuid] = [orders, units, revenue]
+            if uuid != TOTAL:
+                self.__rank(uuid)
+
+        # Minutes only fit the hour and day rings
+        now = self.__clock()
+        width, size = WINDOWS["day"]
+        since = int(now - width * size) // 60
+        for minute, uuid, orders, units, revenue in self.__connection.execute(
+            SELECT_SINCE_SQL, (since,)
+        ):
+            for window in ("hour", "day"):
+                self.__rings[window].add(minute * 60, uuid, [orders, units, revenue])
+
+    def __rank(self, uuid: str):
+        """
+        Moves a liquor into the best sellers if it just passed the last of them.
+        """
+        units = self.__totals[uuid][1]
+        if uuid in self.__top:
+            last = self.__top[uuid] == self.__floor
+            self.__top[uuid] = units
+            if last and len(self.__top) == self.top_k:
+                self.__floor = min(self.__top.values())
+        elif len(self.__top) < self.top_k:
+            self.__top[uuid] = units
+            if len(self.__top) == self.top_k:
+                self.__floor = min(self.__top.values())
+        elif units > self.__floor:
+            del self.__top[min(self.__top, key=self.__top.__getitem__)]
+            self.__top[uuid] = units
+            self.__floor = min(self.__top.values())
+
+    def __add(self, now: float, uuid: str, counters: list):
+        add_counters(self.__totals, uuid, counters)
+        for ring in self.__rings.values():
+            ring.add(now, uuid, counters)
+        if self.__connection is not None:
+            add_counters(self.__pending, (int(now // 60), uuid), counters)
+
+    def record(self, order: dict[str, int], prices: dict[str, float]):
+        """
+        Counts a paid order.
+
+        Args:
+            order (dict[str, int]): The quantity sold of each liquor UUID.
+            prices (dict[str, float]): The unit price of each liquor sold.
+        """
+        now = self.__clock()
+        with self.__lock:
+            units = revenue = 0
+            for uuid, quantity in order.items():
+                self.__add(now, uuid, [1, quantity, quantity * prices[uuid]])
+                self.__rank(uuid)
+                units += quantity
+                revenue += quantity * prices[uuid]
+            self.__add(now, TOTAL, [1, units, revenue])
+            self.__counters["sales"] += 1
+
+    def __window(self, window: str, now: float) -> dict[str, list]:
+        if window == ALL_TIME:
+            return self.__totals
+        return self.__rings[window].totals(now)
+
+    def top(self, limit: int = 10, window: str = ALL_TIME) -> list[list]:
+        """
+        Returns the best sellers by units sold.
+
+        Args:
+            limit (int): Liquors returned, at most top_k for all time.
+            window (str): 'minute', 'hour', 'day' or 'all'.
+
+        Returns:
+            list[list]: The UUID, units and revenue of each liquor, best first.
+
+        Raises:
+            KeyError: If the window is unknown.
+        """
+        now = self.__clock()
+        with self.__lock:
+            if window == ALL_TIME:
+                uuids = sorted(self.__top, key=lambda uuid: (-self.__top[uuid], uuid))
+                return [
+                    [uuid, self.__totals[uuid][1], self.__totals[uuid][2]]
+                    for uuid in uuids[:limit]
+                ]
+
+            best = nsmallest(
+                limit,
+                (
+                    item
+                    for item in self.__rings[window].totals(now).items()
+                    if item[0] != TOTAL
+                ),
+                key=lambda item: (-item[1][1], item[0]),
+            )
+            return [[uuid, counters[1], counters[2]] for uuid, counters in best]
+
+    def sales(self, window: str = ALL_TIME, uuid: str | None = None) -> dict:
+        """
+        Returns the orders, units and revenue of a window, of every liquor or one.
+
+        Raises:
+            KeyError: If the window is unknown.
+        """
+        now = self.__clock()
+        with self.__lock:
+            counters = self.__window(window, now).get(TOTAL if uuid is None else uuid)
+            orders, units, revenue = counters or (0, 0, 0.0)
+        return {"orders": orders, "units": units, "revenue": revenue}
+
+    def flush(self) -> int:
+        """
+        Writes the pending sales to SQLite in a single transaction.
+
+        Returns:
+            int: The number of rows written.
+        """
+        if self.__connection is None:
+            return 0
+        with self.__flush_lock:
+            with self.__lock:
+                batch = self.__pending
+                self.__pending = {}
+            if not batch:
+                return 0
+
+            try:
+                with self.__connection:
+                    self.__connection.executemany(
+                        UPSERT_SALES_SQL,
+                        [
+                            (minute, uuid, *counters)
+                            for (minute, uuid), counters in batch.items()
+                        ],
+                    )
+            except sqlite3.Error:
+                # Locked DB, like while another worker writes, tried again next flush
+                with self.__lock:
+                    for key, counters in batch.items():
+                        add_counters(self.__pending, key, counters)
+                    self.__counters["retries"] += 1
+                return 0
+
+            with self.__lock:
+                self.__counters["flushes"] += 1
+            return len(batch)
+
+    def __run(self):
+        while not self.__stop.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        """
+        Writes every pending sale and stops the background thread, closing twice
+        is harmless.
+        """
+        if self.__thread is None or self.__stop.is_set():
+            return
+        self.__stop.set()
+        self.__thread.join()
+        self.flush()
+        self.__connection.close()
+        atexit.unregister(self.close)
+
+    def stats(self) -> dict[str, int]:
+        with self.__lock:
+            return self.__counters | {
+                "pending": len(self.__pending),
+                "liquors": len(self.__totals) - (TOTAL in self.__totals),
+            }
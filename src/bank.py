@@ -0,0 +1,157 @@
+from queue import Empty, Full, LifoQueue
+from socket import AF_INET, SOCK_DGRAM, gethostbyname, socket, timeout as SocketTimeout
+from threading import Lock
+from time import perf_counter
+
+
+class BankGateway:
+    """
+    Gateway owning the UDP traffic between the store and the bank.
+
+    The bank protocol has no room for a request identifier, so every in-flight
+    request is tagged by the local port of the socket it's sent from. Sockets are
+    borrowed from a pool, one per request, so a reply can only be read by the buyer
+    waiting for it and concurrent BUYs never wait on each other. A socket with an
+    attempt that timed out is closed instead of returned to the pool, even when a
+    retry got its reply, so a late reply can't reach the next buyer.
+
+    Attributes:
+        address (tuple[str, int]): The IP and port of the bank.
+        timeout (float): Seconds to wait for each reply.
+        retries (int): Times a request is sent again after a timeout. Only enable it
+            if the bank discards repeated transfers, otherwise a reply lost on the
+            way back would charge the buyer twice.
+
+    Methods:
+        request(data: bytes) -> bytes: Sends a datagram and waits for the bank's reply.
+        stats() -> dict[str, int | float]: Returns the gateway counters.
+        close(): Closes every pooled socket.
+    """
+
+    def __init__(
+        self,
+        address: tuple[str, int],
+        timeout: float = 5.0,
+        retries: int = 0,
+        pool_size: int = 64,
+        buffer_size: int = 4096,
+    ):
+        # Replies come from the resolved IP, which is what they're matched against
+        self.address = (gethostbyname(address[0]), address[1])
+        self.timeout = timeout
+        self.retries = retries
+        self.__buffer_size = buffer_size
+        # Sockets with the buffer their replies are received into
+        self.__pool: LifoQueue[tuple[socket, bytearray]] = LifoQueue(maxsize=pool_size)
+        self.__lock = Lock()
+        self.__in_flight = 0
+        self.__requests = 0
+        self.__replies = 0
+        self.__timeouts = 0
+        self.__retried = 0
+        self.__latency_total = 0.0
+        self.__latency_max = 0.0
+
+    def __borrow(self) -> tuple[socket, bytearray]:
+        try:
+            return self.__pool.get_nowait()
+        except Empty:
+            udp_socket = socket(AF_INET, SOCK_DGRAM)
+            udp_socket.settimeout(self.timeout)
+            return udp_socket, bytearray(self.__buffer_size)
+
+    def __give_back(self, pooled: tuple[socket, bytearray]):
+        try:
+            self.__pool.put_nowait(pooled)
+        except Full:
+            pooled[0].close()
+
+    def request(self, data: bytes) -> bytes:
+        """
+        Sends a datagram to the bank and waits for its reply.
+
+        Args:
+            data (bytes): The encrypted message to forward.
+
+        Returns:
+            bytes: The encrypted reply of the bank.
+
+        Raises:
+            TimeoutError: If no reply arrived after every retry.
+        """
+        pooled = self.__borrow()
+        udp_socket, buffer = pooled
+        with self.__lock:
+            self.__in_flight += 1
+            self.__requests += 1
+        start = perf_counter()
+
+        timed_out = False
+        try:
+            for attempt in range(self.retries + 1):
+                if attempt > 0:
+                    with self.__lock:
+                        self.__retried += 1
+                udp_socket.sendto(data, self.address)
+                try:
+                    reply = self.__receive(udp_socket, buffer)
+                except SocketTimeout:
+                    timed_out = True
+                    continue
+
+                latency = perf_counter() - start
+                with self.__lock:
+                    self.__replies += 1
+                    self.__latency_total += latency
+                    self.__latency_max = max(self.__latency_max, latency)
+                if timed_out:
+                    # The reply to an earlier attempt may still be on its way
+                    udp_socket.close()
+                else:
+                    self.__give_back(pooled)
+                return reply
+
+            with self.__lock:
+                self.__timeouts += 1
+            raise TimeoutError(f"No reply from the bank at {self.address}")
+
+        except OSError:
+            # Never reuse a socket that may still receive a late reply
+            udp_socket.close()
+            raise
+
+        finally:
+            with self.__lock:
+                self.__in_flight -= 1
+
+    def __receive(self, udp_socket: socket, buffer: bytearray) -> bytes:
+        """
+        Reads the next datagram sent by the bank, ignoring strays from anyone else.
+        Datagrams land in the socket's buffer, only the bank's reply is copied out.
+        """
+        while True:
+            size, sender = udp_socket.recvfrom_into(buffer)
+            if sender == self.address:
+                with memoryview(buffer) as view:
+                    return bytes(view[:size])
+
+    def stats(self) -> dict[str, int | float]:
+        with self.__lock:
+            return {
+                "in_flight": self.__in_flight,
+                "requests": self.__requests,
+                "replies": self.__replies,
+                "timeouts": self.__timeouts,
+                "retries": self.__retried,
+                "latency_avg": self.__latency_total / self.__replies
+                if self.__replies
+                else 0.0,
+                "latency_max": self.__latency_max,
+            }
+
+    def close(self):
+        while True:
+            try:
+                self.__pool.get_nowait()[0].close()
+            except Empty:
+                break
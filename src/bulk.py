@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+import csv
+import json
+from argparse import ArgumentParser
+from sys import exit, stdin, stdout
+from typing import IO, Iterable, Iterator
+from src.db import Liquor, LiquorDatabase, ShardedLiquorDatabase
+from src.utils import get_project_root
+
+FIELDS = ["uuid", "commercial_name", "country_code", "stock", "price"]
+
+
+def read_liquors(file: IO[str], file_format: str) -> Iterator[Liquor]:
+    """
+    Streams the liquors of a CSV file with a header row, or of a JSON Lines file
+    with one object per line, both using the liquor_store column names.
+
+    Args:
+        file (IO[str]): The file to read.
+        file_format (str): Either "csv" or "jsonl".
+
+    Yields:
+        Liquor: Each liquor of the file.
+    """
+    rows: Iterable[dict] = (
+        csv.DictReader(file)
+        if file_format == "csv"
+        else (json.loads(line) for line in file if line.strip())
+    )
+    for row in rows:
+        yield Liquor(
+            str(row["uuid"]),
+            str(row["commercial_name"]),
+            str(row["country_code"]),
+            int(row["stock"]),
+            float(row["price"]),
+        )
+
+
+def write_liquors(file: IO[str], file_format: str, liquors: Iterable[Liquor]) -> int:
+    """
+    Writes a stream of liquors as CSV with a header row or as JSON Lines.
+
+    Returns:
+        int: The number of liquors written.
+    """
+    written = 0
+    if file_format == "csv":
+        writer = csv.writer(file)
+        writer.writerow(FIELDS)
+        for liquor in liquors:
+            writer.writerow(liquor.get_data())
+            written += 1
+        return written
+
+    for liquor in liquors:
+        file.write(json.dumps(dict(zip(FIELDS, liquor.get_data()))) + "\n")
+        written += 1
+    return written
+
+
+def import_liquors(
+    database: LiquorDatabase,
+    file: IO[str],
+    file_format: str = "csv",
+    batch_size: int = 10_000,
+    upsert: bool = False,
+) -> int:
+    return database.create_many(
+        read_liquors(file, file_format), batch_size=batch_size, upsert=upsert
+    )
+
+
+def export_liquors(
+    database: LiquorDatabase,
+    file: IO[str],
+    file_format: str = "csv",
+    batch_size: int = 1_000,
+) -> int:
+    return write_liquors(file, file_format, database.iter_all(batch_size=batch_size))
+
+
+def split_database(
+    source: LiquorDatabase, target: ShardedLiquorDatabase, batch_size: int = 10_000
+) -> int:
+    """
+    Copies a single-file database into the shards of a sharded one, streaming the
+    liquors so the catalog is never held in memory. The source is left untouched.
+
+    Returns:
+        int: The number of liquors copied.
+    """
+    return target.create_many(source.iter_all(), batch_size=batch_size)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(
+        prog="python -m src.bulk", description="Bulk catalog import and export"
+    )
+    parser.add_argument("action", choices=["import", "export", "split"])
+    parser.add_argument(
+        "file",
+        nargs="?",
+        default="-",
+        help='CSV or JSON Lines file, "-" for stdin/stdout, unused by split',
+    )
+    parser.add_argument("--format", choices=["csv", "jsonl"], default=None)
+    parser.add_argument(
+        "--db-path", default=f"{get_project_root()}/db/liquor_store.db"
+    )
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=1,
+        help="shard files of the database, split copies --db-path into this many",
+    )
+    parser.add_argument(
+        "--upsert",
+        action="store_true",
+        help="replace stock and price of liquors already in the catalog",
+    )
+    args = parser.parse_args()
+
+    if args.action == "split":
+        if args.shards < 2:
+            parser.error("split needs --shards of 2 or more")
+        with LiquorDatabase(args.db_path) as source, ShardedLiquorDatabase(
+            args.db_path, args.shards
+        ) as target:
+            count = split_database(source, target, args.batch_size)
+        print(f"Copied {count} liquors to {args.shards} shards")
+        exit(0)
+
+    file_format = args.format or ("jsonl" if args.file.endswith(".jsonl") else "csv")
+    with (
+        ShardedLiquorDatabase(args.db_path, args.shards)
+        if args.shards > 1
+        else LiquorDatabase(args.db_path)
+    ) as database:
+        if args.action == "import":
+            with stdin if args.file == "-" else open(args.file, newline="") as file:
+                count = import_liquors(
+                    database, file, file_format, args.batch_size, args.upsert
+                )
+            print(f"Imported {count} liquors")
+        else:
+            with stdout if args.file == "-" else open(
+                args.file, "w", newline=""
+            ) as file:
+                export_liquors(database, file, file_format, args.batch_size)
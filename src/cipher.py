@@ -0,0 +1,92 @@
+from functools import lru_cache
+
+# Shifting letters repeats every 26 and digits every 10, so every shift behaves
+# like one in range(130)
+PERIOD = 130
+
+
+def shift_char(char: str, n: int) -> str:
+    """
+    Shifts a single character of a message.
+
+    Letters rotate in the alphabet, digits rotate in 0-9 and anything else is kept.
+    Non-ASCII letters and digits follow the same arithmetic as the ASCII ones, as
+    the cypher always did.
+    """
+    if char.isalpha():
+        # Shift letters
+        if char.islower():
+            return chr((ord(char) - ord("a") + n) % 26 + ord("a"))
+        return chr((ord(char) - ord("A") + n) % 26 + ord("A"))
+    if char.isdigit():
+        # Shift numbers
+        return chr((ord(char) - ord("0") + n) % 10 + ord("0"))
+    # Keep spaces unchanged
+    return char
+
+
+class _ShiftTable(dict):
+    """
+    Translation table for `str.translate`, ASCII characters are filled in upfront
+    and anything else is computed the first time it's seen.
+    """
+
+    def __init__(self, n: int):
+        super().__init__((code, shift_char(chr(code), n)) for code in range(128))
+        self.__n = n
+
+    def __missing__(self, code: int) -> str:
+        shifted = shift_char(chr(code), self.__n)
+        self[code] = shifted
+        return shifted
+
+
+@lru_cache(maxsize=PERIOD)
+def _str_table(n: int) -> _ShiftTable:
+    return _ShiftTable(n)
+
+
+@lru_cache(maxsize=PERIOD)
+def _bytes_table(n: int) -> bytes:
+    return bytes(
+        ord(shift_char(chr(code), n)) if code < 128 else code for code in range(256)
+    )
+
+
+def encrypt(msg: str, n: int) -> str:
+    """
+    Encrypts a message with the shift cypher shared with the bank.
+
+    Args:
+        msg (str): The message to encrypt.
+        n (int): The shift, negative shifts decrypt.
+
+    Returns:
+        str: The encrypted message.
+    """
+    return msg.translate(_str_table(n % PERIOD))
+
+
+def decrypt(msg: str, n: int) -> str:
+    return encrypt(msg, -n)
+
+
+def encrypt_bytes(data: bytes, n: int) -> bytes:
+    """
+    Encrypts a UTF-8 encoded message without decoding it when it's plain ASCII,
+    which is what the bank always sends.
+
+    Args:
+        data (bytes): The UTF-8 encoded message to encrypt.
+        n (int): The shift, negative shifts decrypt.
+
+    Returns:
+        bytes: The UTF-8 encoded encrypted message.
+    """
+    if data.isascii():
+        return data.translate(_bytes_table(n % PERIOD))
+    return encrypt(data.decode("utf-8"), n).encode("utf-8")
+
+
+def decrypt_bytes(data: bytes, n: int) -> bytes:
+    return encrypt_bytes(data, -n)
@@ -1,12 +1,27 @@
+import logging
 from os import makedirs
+from os.path import splitext
 import sqlite3
+from contextlib import contextmanager
 from dataclasses import dataclass
+from heapq import merge
+from queue import Empty, Full, LifoQueue
+from itertools import islice
+from operator import attrgetter
+from typing import Callable, Iterable, Iterator
+from zlib import crc32
 
 # Import utils
+from src.metrics import METRICS
 from src.utils import get_project_root
 
 PROJECT_ROOT = get_project_root()  # obtener la raíz de la carpeta
 
+# Largest integer SQLite stores, larger Python ints raise OverflowError when bound
+MAX_INTEGER = 2**63 - 1
+
+LOGGER = logging.getLogger(__name__)
+
 
 @dataclass
 class Liquor:
@@ -56,44 +71,265 @@ class LiquorDatabase:
     """
     A class representing a liquor database with methods to interact with liquor data.
 
+    Connections are kept open in a small pool and reused across calls instead of
+    being opened and closed on every operation. Every pooled connection runs in WAL
+    journal mode, so readers don't block the writer, and keeps its prepared
+    statements cached by SQLite.
+
     Attributes:
         db_path (str): The path to the SQLite database file.
 
     Methods:
         create(liquor: Liquor): Inserts a new liquor into the database.
+        create_many(liquors: Iterable[Liquor]): Inserts a stream of liquors in batches.
         read(uuid: str): Reads an existing liquor from the database.
+        read_many(uuids: list[str]): Reads several liquors with a single query.
+        iter_all(): Streams every liquor with a cursor.
+        read_page(after: str, limit: int, ...): Reads a filtered page of liquors after a UUID.
+        iter_page(after: str, ...): Streams the filtered liquors after a UUID.
         update(uuid: str, country_code: str, price: float): Updates a country_code or adds to the price of an existing liquor.
+        update_stocks(deltas: dict[str, int]): Changes the stock of several liquors at once.
+        restock(deltas: list[tuple[str, int]]) -> list: Changes many stocks, item by item.
+        reprice(prices: list[tuple[str, float]]) -> list: Sets many prices, item by item.
         delete(uuid: str): Removes an existing liquor from the database.
+        stamp() -> str: Identifies the catalog and its version.
+        close(): Closes every pooled connection.
+        add_listener(listener: Callable): Registers a callback for committed changes.
 
     Note:
         This class assumes the existence of a 'liquor_store' table in the database with columns
         'uuid', 'liquor_name', 'country_code', 'stock', and 'price'.
     """
 
-    def __init__(self, db_path: str = f"{PROJECT_ROOT}/db/liquor_store.db"):
+    CREATE_TABLE_SQL = """
+        CREATE TABLE IF NOT EXISTS liquor_store (
+            uuid TEXT PRIMARY KEY,
+            commercial_name TEXT UNIQUE,
+            country_code TEXT,
+            stock INTEGER,
+            price REAL
+        );
+    """
+
+    INSERT_SQL = """
+        INSERT INTO liquor_store (uuid, commercial_name, country_code, stock, price)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(commercial_name) DO NOTHING;
+    """
+
+    # Identity of the catalog and a counter bumped by every write transaction, so
+    # copies of the catalog kept elsewhere can tell if they're still current
+    CREATE_META_SQL = """
+        CREATE TABLE IF NOT EXISTS catalog_meta (
+            id INTEGER PRIMARY KEY CHECK (id = 0),
+            catalog TEXT NOT NULL,
+            version INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO catalog_meta VALUES (0, lower(hex(randomblob(16))), 0);
+    """
+
+    BUMP_VERSION_SQL = "UPDATE catalog_meta SET version = version + 1"
+
+    SELECT_STAMP_SQL = "SELECT catalog || ':' || version FROM catalog_meta"
+
+    # Keyset pagination walks the primary key, filtered listings use these instead
+    CREATE_INDEXES_SQL = """
+        CREATE INDEX IF NOT EXISTS liquor_store_country_code
+            ON liquor_store (country_code, uuid);
+        CREATE INDEX IF NOT EXISTS liquor_store_price
+            ON liquor_store (price);
+        CREATE INDEX IF NOT EXISTS liquor_store_in_stock
+            ON liquor_store (uuid) WHERE stock > 0;
+    """
+
+    BULK_INSERT_SQL = """
+        INSERT INTO liquor_store (uuid, commercial_name, country_code, stock, price)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT DO NOTHING;
+    """
+
+    BULK_UPSERT_SQL = """
+        INSERT INTO liquor_store (uuid, commercial_name, country_code, stock, price)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(uuid) DO UPDATE SET stock = excluded.stock, price = excluded.price
+        ON CONFLICT DO NOTHING;
+    """
+
+    SELECT_SQL = "SELECT * FROM liquor_store WHERE uuid = ?"
+
+    SELECT_ALL_ORDERED_SQL = "SELECT * FROM liquor_store ORDER BY uuid"
+
+    SELECT_ALL_SQL = "SELECT * FROM liquor_store"
+
+    EXISTS_SQL = "SELECT 1 FROM liquor_store WHERE uuid = ?"
+
+    UPDATE_STOCK_SQL = """
+        UPDATE liquor_store
+        SET stock = stock + ?
+        WHERE uuid = ? AND stock + ? >= 0
+    """
+
+    UPDATE_PRICE_SQL = """
+        UPDATE liquor_store
+        SET price = ?
+        WHERE uuid = ?
+    """
+
+    DELETE_SQL = "DELETE FROM liquor_store WHERE uuid = ?"
+
+    # Sums past MAX_INTEGER turn into floats in SQLite, they are never written
+    RESTOCK_SQL = f"""
+        UPDATE liquor_store
+        SET stock = stock + ?
+        WHERE uuid = ? AND stock + ? BETWEEN 0 AND {MAX_INTEGER}
+        RETURNING stock
+    """
+
+    REPRICE_SQL = "UPDATE liquor_store SET price = ? WHERE uuid = ? RETURNING price"
+
+    # Batched changes touching more liquors than this notify a change of the whole
+    # catalog instead of one per liquor
+    NOTIFY_EACH_LIMIT = 256
+
+    def __init__(
+        self,
+        db_path: str = f"{PROJECT_ROOT}/db/liquor_store.db",
+        synchronous: str = "NORMAL",
+        cache_size: int = -8_000,
+        mmap_size: int = 64 * 1024 * 1024,
+        pool_size: int = 8,
+        cached_statements: int = 128,
+        timeout: float = 5.0,
+    ):
         """
         Initializes the database with a standard liquor_store table containing the
         Liquor data.
 
         Args:
             db_path (str): The path to the DB, defaults to {PROJECT_ROOT}/db/liquor.db
+            synchronous (str): SQLite 'synchronous' pragma, NORMAL is durable in WAL mode
+                except for the last transactions on power loss.
+            cache_size (int): SQLite 'cache_size' pragma, negative values are KiB.
+            mmap_size (int): SQLite 'mmap_size' pragma in bytes, 0 disables memory mapping.
+            pool_size (int): Maximum number of idle connections kept open.
+            cached_statements (int): Prepared statements cached per connection.
+            timeout (float): Seconds to wait for a lock held by another writer.
         """
         self.__db_path: str = db_path
+        self.__pragmas: dict[str, str | int] = {
+            "journal_mode": "WAL",
+            "synchronous": synchronous,
+            "cache_size": cache_size,
+            "mmap_size": mmap_size,
+        }
+        self.__cached_statements = cached_statements
+        self.__timeout = timeout
+        self.__pool: LifoQueue[sqlite3.Connection] = LifoQueue(maxsize=pool_size)
+        self.__closed = False
+        self.__listeners: list[Callable[[str | None], None]] = []
+
         # Create directories if they don't exist
         makedirs(db_path[: db_path.rindex("/")], exist_ok=True)
-        with sqlite3.connect(self.__db_path) as connection:
-            connection.execute(
-                """
-                    CREATE TABLE IF NOT EXISTS liquor_store (
-                        uuid TEXT PRIMARY KEY,
-                        commercial_name TEXT UNIQUE,
-                        country_code TEXT,
-                        stock INTEGER,
-                        price REAL
-                    );
-                    """
-            )
+        with self.__connection() as connection:
+            connection.execute(self.CREATE_TABLE_SQL)
+            connection.executescript(self.CREATE_INDEXES_SQL)
+            connection.executescript(self.CREATE_META_SQL)
+
+    def __connect(self) -> sqlite3.Connection:
+        """
+        Opens a new connection to the database and applies the configured pragmas.
+
+        Returns:
+            sqlite3.Connection: The new connection.
+        """
+        connection = sqlite3.connect(
+            self.__db_path,
+            timeout=self.__timeout,
+            cached_statements=self.__cached_statements,
+            check_same_thread=False,
+        )
+        for pragma, value in self.__pragmas.items():
+            connection.execute(f"PRAGMA {pragma} = {value}")
+        return connection
+
+    @contextmanager
+    def __connection(self, write: bool = False) -> Iterator[sqlite3.Connection]:
+        """
+        Borrows a connection from the pool, opening a new one if the pool is empty,
+        and runs the block inside a transaction on it.
 
+        Args:
+            write (bool): Whether the block changes the catalog, its version is
+                bumped in the same transaction.
+
+        Yields:
+            sqlite3.Connection: A connection only used by the caller until the block exits.
+        """
+        if self.__closed:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+
+        try:
+            connection = self.__pool.get_nowait()
+        except Empty:
+            connection = self.__connect()
+
+        try:
+            with connection:
+                yield connection
+                if write:
+                    connection.execute(self.BUMP_VERSION_SQL)
+        finally:
+            try:
+                if self.__closed:
+                    raise Full
+                self.__pool.put_nowait(connection)
+            except Full:
+                connection.close()
+
+    def close(self):
+        """
+        Closes every pooled connection, connections still in use are closed as soon
+        as they are returned.
+        """
+        self.__closed = True
+        while True:
+            try:
+                self.__pool.get_nowait().close()
+            except Empty:
+                break
+
+    def add_listener(self, listener: Callable[[str | None], None]):
+        """
+        Registers a callback run after every committed change to the catalog.
+
+        Args:
+            listener (Callable[[str | None], None]): Called with the UUID of the changed
+                liquor, or None when the change may affect any liquor.
+        """
+        self.__listeners.append(listener)
+
+    def __notify(self, uuid: str | None):
+        for listener in self.__listeners:
+            listener(uuid)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def stamp(self) -> str:
+        """
+        Identifies the catalog and its version, the stamp changes with every
+        committed write made through this class.
+
+        Returns:
+            str: The random ID of the catalog and its version as 'id:version'.
+        """
+        with self.__connection() as connection:
+            return connection.execute(self.SELECT_STAMP_SQL).fetchone()[0]
+
+    @METRICS.timed("db", "create")
     def create(self, liquor: Liquor):
         """
         Inserts a new liquor into the 'liquor_store' table of the database.
@@ -101,16 +337,39 @@ class LiquorDatabase:
         Args:
             liquor (Liquor): The Liquor instance to be inserted into the database.
         """
-        with sqlite3.connect(self.__db_path) as connection:
-            connection.execute(
-                """
-                    INSERT INTO liquor_store (uuid, commercial_name, country_code, stock, price)
-                    VALUES (?, ?, ?, ?, ?)
-                    ON CONFLICT(commercial_name) DO NOTHING;
-                """,
-                liquor.get_data(),
-            )
+        with self.__connection(write=True) as connection:
+            connection.execute(self.INSERT_SQL, liquor.get_data())
+        self.__notify(liquor.uuid)
+
+    @METRICS.timed("db", "create_many")
+    def create_many(
+        self, liquors: Iterable[Liquor], batch_size: int = 10_000, upsert: bool = False
+    ) -> int:
+        """
+        Inserts a stream of liquors into the 'liquor_store' table, each batch in a
+        single transaction. Only one batch is held in memory at a time.
 
+        Args:
+            liquors (Iterable[Liquor]): The liquors to be inserted, may be a generator.
+            batch_size (int): Liquors inserted per transaction.
+            upsert (bool): Whether liquors already in the database get their stock and
+                price replaced, otherwise they're left untouched.
+
+        Returns:
+            int: The number of liquors inserted or updated.
+        """
+        sql = self.BULK_UPSERT_SQL if upsert else self.BULK_INSERT_SQL
+        rows = (liquor.get_data() for liquor in liquors)
+        changed = 0
+        try:
+            while batch := list(islice(rows, batch_size)):
+                with self.__connection(write=True) as connection:
+                    changed += connection.executemany(sql, batch).rowcount
+        finally:
+            self.__notify(None)
+        return changed
+
+    @METRICS.timed("db", "read")
     def read(
         self, uuid: str = "", read_all: bool = False
     ) -> Liquor | list[Liquor] | None:
@@ -123,26 +382,233 @@ class LiquorDatabase:
         Returns:
             Liquor | None: A Liquor instance if found, or None if the liquor is not found.
         """
-        with sqlite3.connect(self.__db_path) as connection:
-            cursor = connection.cursor()
+        with self.__connection() as connection:
             if not read_all:
-                result = cursor.execute(
-                    """
-                        SELECT * FROM liquor_store WHERE uuid = ?
-                    """,
-                    (uuid,),
-                )
-                liquor = result.fetchone()
+                liquor = connection.execute(self.SELECT_SQL, (uuid,)).fetchone()
                 return Liquor(*liquor) if liquor is not None else liquor
 
-            result = cursor.execute(
-                """
-                    SELECT * FROM liquor_store
-                """
-            )
-            liquors = result.fetchall()
+            liquors = connection.execute(self.SELECT_ALL_SQL).fetchall()
             return [Liquor(*liquor) for liquor in liquors] if liquors != [] else liquors
 
+    @METRICS.timed("db", "read_many")
+    def read_many(self, uuids: list[str]) -> list[Liquor]:
+        """
+        Retrieves several liquors from the 'liquor_store' table with a single query.
+
+        Args:
+            uuids (list[str]): The UUIDs of the liquors to be retrieved.
+
+        Returns:
+            list[Liquor]: The liquors found, UUIDs not found are left out.
+        """
+        if not uuids:
+            return []
+
+        placeholders = ", ".join("?" * len(uuids))
+        with self.__connection() as connection:
+            liquors = connection.execute(
+                f"SELECT * FROM liquor_store WHERE uuid IN ({placeholders})",
+                tuple(uuids),
+            ).fetchall()
+        return [Liquor(*liquor) for liquor in liquors]
+
+    def iter_all(self, batch_size: int = 1_000) -> Iterator[Liquor]:
+        """
+        Streams every liquor of the 'liquor_store' table ordered by UUID, fetching
+        them from a cursor in batches instead of loading the whole table.
+
+        Args:
+            batch_size (int): Rows fetched from the cursor at a time.
+
+        Yields:
+            Liquor: Each liquor of the table.
+        """
+        with self.__connection() as connection:
+            cursor = connection.execute(self.SELECT_ALL_ORDERED_SQL)
+            while rows := cursor.fetchmany(batch_size):
+                for row in rows:
+                    yield Liquor(*row)
+
+    def __page_query(
+        self,
+        after: str,
+        limit: int,
+        country_code: str | None,
+        min_price: float | None,
+        max_price: float | None,
+        in_stock: bool,
+    ) -> tuple[str, tuple]:
+        """
+        Builds the query of a filtered page of liquors ordered by UUID.
+        """
+        conditions = ["uuid > ?"]
+        params: list[str | float | int] = [after]
+        if country_code is not None:
+            conditions.append("country_code = ?")
+            params.append(country_code)
+        if min_price is not None:
+            conditions.append("price >= ?")
+            params.append(min_price)
+        if max_price is not None:
+            conditions.append("price <= ?")
+            params.append(max_price)
+        if in_stock:
+            conditions.append("stock > 0")
+        params.append(limit)
+
+        return (
+            f"SELECT * FROM liquor_store WHERE {' AND '.join(conditions)} "
+            "ORDER BY uuid LIMIT ?",
+            tuple(params),
+        )
+
+    @METRICS.timed("db", "read_page")
+    def read_page(
+        self,
+        after: str = "",
+        limit: int = 100,
+        country_code: str | None = None,
+        min_price: float | None = None,
+        max_price: float | None = None,
+        in_stock: bool = False,
+    ) -> list[Liquor]:
+        """
+        Retrieves a page of liquors ordered by UUID, starting right after a UUID so
+        every page costs the same no matter how deep it is.
+
+        Args:
+            after (str): The last UUID of the previous page, empty for the first page.
+            limit (int): Maximum number of liquors in the page.
+            country_code (str | None): Only liquors from this country.
+            min_price (float | None): Only liquors costing at least this price.
+            max_price (float | None): Only liquors costing at most this price.
+            in_stock (bool): Only liquors with stock left.
+
+        Returns:
+            list[Liquor]: The liquors of the page.
+        """
+        sql, params = self.__page_query(
+            after, limit, country_code, min_price, max_price, in_stock
+        )
+        with self.__connection() as connection:
+            return [Liquor(*row) for row in connection.execute(sql, params).fetchall()]
+
+    def iter_page(
+        self,
+        after: str = "",
+        limit: int = -1,
+        country_code: str | None = None,
+        min_price: float | None = None,
+        max_price: float | None = None,
+        in_stock: bool = False,
+        batch_size: int = 1_000,
+    ) -> Iterator[Liquor]:
+        """
+        Streams the liquors `read_page` would return through a cursor, a negative
+        limit streams every liquor matching the filters.
+
+        Yields:
+            Liquor: Each liquor of the page.
+        """
+        sql, params = self.__page_query(
+            after, limit, country_code, min_price, max_price, in_stock
+        )
+        with self.__connection() as connection:
+            cursor = connection.execute(sql, params)
+            while rows := cursor.fetchmany(batch_size):
+                for row in rows:
+                    yield Liquor(*row)
+
+    @METRICS.timed("db", "update_stocks")
+    def update_stocks(self, deltas: dict[str, int]):
+        """
+        Changes the stock of several liquors in a single transaction, either every
+        change is applied or none is.
+
+        Args:
+            deltas (dict[str, int]): The change in stock for each liquor UUID.
+
+        Raises:
+            NameError: If a liquor is not found.
+            ValueError: If the stock of a liquor would become negative.
+        """
+        with self.__connection(write=True) as connection:
+            for uuid, delta_stock in deltas.items():
+                cursor = connection.execute(
+                    self.UPDATE_STOCK_SQL, (delta_stock, uuid, delta_stock)
+                )
+                if cursor.rowcount == 0:
+                    if connection.execute(self.EXISTS_SQL, (uuid,)).fetchone() is None:
+                        raise NameError(f"Liquor with UUID {uuid} not found.")
+                    raise ValueError("Insufficient stock.")
+        for uuid in deltas:
+            self.__notify(uuid)
+
+    def __apply_each(
+        self, sql: str, items: list[tuple[str, int | float]], relative: bool
+    ) -> list[tuple[int, int | float | None]]:
+        """
+        Runs a single-row update for each item in one transaction, items that can't
+        be applied are skipped and reported.
+        """
+        results: list[tuple[int, int | float | None]] = []
+        changed = []
+        with self.__connection(write=True) as connection:
+            for uuid, value in items:
+                params = (value, uuid, value) if relative else (value, uuid)
+                row = connection.execute(sql, params).fetchone()
+                if row is not None:
+                    results.append((0, row[0]))
+                    changed.append(uuid)
+                elif connection.execute(self.EXISTS_SQL, (uuid,)).fetchone() is None:
+                    results.append((252, None))
+                else:
+                    # Only relative updates are refused, a positive one would overflow
+                    results.append((4, None) if value < 0 else (253, None))
+
+        if len(changed) > self.NOTIFY_EACH_LIMIT:
+            self.__notify(None)
+        else:
+            for uuid in changed:
+                self.__notify(uuid)
+        return results
+
+    @METRICS.timed("db", "restock")
+    def restock(
+        self, deltas: list[tuple[str, int]]
+    ) -> list[tuple[int, int | float | None]]:
+        """
+        Adds to the stock of many liquors in a single transaction, with relative
+        updates so concurrent purchases are never lost. Unlike `update_stocks`,
+        items that can't be applied don't stop the others.
+
+        Args:
+            deltas (list[tuple[str, int]]): The UUID and change in stock of each item.
+
+        Returns:
+            list[tuple[int, int | float | None]]: For each item in order, 0 and the new
+                stock, 252 if the liquor is not found, 4 if the stock would become
+                negative or 253 if it would exceed MAX_INTEGER, with None.
+        """
+        return self.__apply_each(self.RESTOCK_SQL, deltas, relative=True)
+
+    @METRICS.timed("db", "reprice")
+    def reprice(
+        self, prices: list[tuple[str, float]]
+    ) -> list[tuple[int, int | float | None]]:
+        """
+        Sets the price of many liquors in a single transaction.
+
+        Args:
+            prices (list[tuple[str, float]]): The UUID and new price of each item.
+
+        Returns:
+            list[tuple[int, int | float | None]]: For each item in order, 0 and the new
+                price, or 252 and None if the liquor is not found.
+        """
+        return self.__apply_each(self.REPRICE_SQL, prices, relative=False)
+
+    @METRICS.timed("db", "update")
     def update(self, uuid: str, delta_stock: int = 0, price: float = -1):
         """
         Updates liquor information in the 'liquor_store' table.
@@ -154,69 +620,230 @@ class LiquorDatabase:
 
         Raises:
             NameError: If the liquor with the specified UUID is not found.
+            ValueError: If the stock would become negative.
 
         Note:
-            If both 'delta_stock' and 'price' are provided, the function updates both.
-        """
-
-        def __update_stock(uuid: str, delta_stock: int):
-            """
-            Updates the stock for a liquor in the 'liquor_store' table.
-
-            Args:
-                uuid (str): The UUID of the liquor.
-                delta_stock (int): The change in stock for the liquor.
-            """
-            with sqlite3.connect(self.__db_path) as connection:
-                liquor = self.read(uuid)
-                if liquor is None:
-                    raise NameError(f"Liquor with UUID {uuid} not found.")
-                if not isinstance(liquor, Liquor):
-                    return
-                current_stock = liquor.get_data()[3]
-                new_stock = current_stock + delta_stock
-                if new_stock < 0:
+            If both 'delta_stock' and 'price' are provided, the function updates both
+            in the same transaction.
+        """
+        with self.__connection(write=True) as connection:
+            if delta_stock != 0:
+                # Relative update, the stock check and the write are a single statement
+                cursor = connection.execute(
+                    self.UPDATE_STOCK_SQL, (delta_stock, uuid, delta_stock)
+                )
+                if cursor.rowcount == 0:
+                    if connection.execute(self.EXISTS_SQL, (uuid,)).fetchone() is None:
+                        raise NameError(f"Liquor with UUID {uuid} not found.")
                     raise ValueError("Insufficient stock.")
-                else:
-                    connection.execute(
-                        """
-                            UPDATE liquor_store
-                            SET stock = ?
-                            WHERE uuid = ?
-                        """,
-                        (new_stock, uuid),
+
+            if price >= 0.0:
+                connection.execute(self.UPDATE_PRICE_SQL, (price, uuid))
+        self.__notify(uuid)
+
+    @METRICS.timed("db", "delete")
+    def delete(self, uuid: str):
+        with self.__connection(write=True) as connection:
+            connection.execute(self.DELETE_SQL, (uuid,))
+        self.__notify(uuid)
+
+
+def shard_paths(db_path: str, shards: int) -> list[str]:
+    """
+    Names the files of a sharded database after its single-file path, with the
+    shard count in the name so a database is never opened with the wrong routing:
+    db/liquor_store.db split in 4 is db/liquor_store.0-of-4.db to .3-of-4.db.
+    """
+    root, extension = splitext(db_path)
+    return [f"{root}.{index}-of-{shards}{extension}" for index in range(shards)]
+
+
+class ShardedLiquorDatabase:
+    """
+    A liquor database split in several SQLite files by a hash of the UUID, so
+    writes to liquors of different shards commit in parallel instead of queueing
+    behind SQLite's single writer. It has the same methods as LiquorDatabase.
+
+    Point reads and updates go to the shard of their UUID. Scans read every shard
+    and merge the rows by UUID, so pages and streams keep the same stable order as
+    a single file. Each shard is a LiquorDatabase with its own connection pool.
+
+    Attributes:
+        shards (list[LiquorDatabase]): The databases, indexed by `shard_index`.
+
+    Methods:
+        shard_index(uuid: str) -> int: Finds the shard holding a liquor.
+
+    Note:
+        Commercial names are only unique within a shard. `update_stocks` across
+        several shards commits each shard on its own and undoes the shards already
+        committed if a later one fails, so other clients may briefly see part of it.
+    """
+
+    def __init__(
+        self,
+        db_path: str = f"{PROJECT_ROOT}/db/liquor_store.db",
+        shards: int = 4,
+        **options,
+    ):
+        """
+        Opens or creates every shard of a database.
+
+        Args:
+            db_path (str): Path of the single-file database the shards are named after.
+            shards (int): Number of shard files.
+            **options: Passed to the LiquorDatabase of each shard.
+        """
+        if shards < 1:
+            raise ValueError("A database needs at least one shard.")
+        self.shards = [
+            LiquorDatabase(path, **options) for path in shard_paths(db_path, shards)
+        ]
+
+    def shard_index(self, uuid: str) -> int:
+        return crc32(uuid.encode("utf-8")) % len(self.shards)
+
+    def __shard(self, uuid: str) -> LiquorDatabase:
+        return self.shards[self.shard_index(uuid)]
+
+    def __group(self, uuids: Iterable[str]) -> dict[int, list[str]]:
+        groups: dict[int, list[str]] = {}
+        for uuid in uuids:
+            groups.setdefault(self.shard_index(uuid), []).append(uuid)
+        return groups
+
+    def close(self):
+        for shard in self.shards:
+            shard.close()
+
+    def add_listener(self, listener: Callable[[str | None], None]):
+        for shard in self.shards:
+            shard.add_listener(listener)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def stamp(self) -> str:
+        return ",".join(shard.stamp() for shard in self.shards)
+
+    def create(self, liquor: Liquor):
+        self.__shard(liquor.uuid).create(liquor)
+
+    def create_many(
+        self, liquors: Iterable[Liquor], batch_size: int = 10_000, upsert: bool = False
+    ) -> int:
+        """
+        Inserts a stream of liquors, each batch split between the shards and
+        committed as one transaction per shard.
+
+        Returns:
+            int: The number of liquors inserted or updated.
+        """
+        liquors = iter(liquors)
+        changed = 0
+        while batch := list(islice(liquors, batch_size)):
+            groups: dict[int, list[Liquor]] = {}
+            for liquor in batch:
+                groups.setdefault(self.shard_index(liquor.uuid), []).append(liquor)
+            for index, group in groups.items():
+                changed += self.shards[index].create_many(group, batch_size, upsert)
+        return changed
+
+    def read(
+        self, uuid: str = "", read_all: bool = False
+    ) -> Liquor | list[Liquor] | None:
+        if not read_all:
+            return self.__shard(uuid).read(uuid=uuid)
+        return list(self.iter_all())
+
+    def read_many(self, uuids: list[str]) -> list[Liquor]:
+        liquors = []
+        for index, group in self.__group(uuids).items():
+            liquors += self.shards[index].read_many(group)
+        return liquors
+
+    def iter_all(self, batch_size: int = 1_000) -> Iterator[Liquor]:
+        return merge(
+            *(shard.iter_all(batch_size) for shard in self.shards),
+            key=attrgetter("uuid"),
+        )
+
+    def read_page(self, after: str = "", limit: int = 100, **filters) -> list[Liquor]:
+        """
+        Reads a page from every shard and keeps the first `limit` liquors, the page
+        of each shard is already ordered by UUID.
+        """
+        pages = [shard.read_page(after, limit, **filters) for shard in self.shards]
+        return list(islice(merge(*pages, key=attrgetter("uuid")), limit))
+
+    def iter_page(
+        self, after: str = "", limit: int = -1, batch_size: int = 1_000, **filters
+    ) -> Iterator[Liquor]:
+        liquors = merge(
+            *(
+                shard.iter_page(after, limit, batch_size=batch_size, **filters)
+                for shard in self.shards
+            ),
+            key=attrgetter("uuid"),
+        )
+        return liquors if limit < 0 else islice(liquors, limit)
+
+    def update_stocks(self, deltas: dict[str, int]):
+        """
+        Changes the stock of several liquors, a transaction per shard touched.
+
+        Raises:
+            NameError: If a liquor is not found.
+            ValueError: If the stock of a liquor would become negative.
+        """
+        committed: list[tuple[int, dict[str, int]]] = []
+        try:
+            for index, group in self.__group(deltas).items():
+                shard_deltas = {uuid: deltas[uuid] for uuid in group}
+                self.shards[index].update_stocks(shard_deltas)
+                committed.append((index, shard_deltas))
+        except (NameError, ValueError):
+            # Put back what earlier shards took, a failure here must not hide the
+            # original error
+            for index, shard_deltas in committed:
+                try:
+                    self.shards[index].update_stocks(
+                        {uuid: -delta for uuid, delta in shard_deltas.items()}
+                    )
+                except Exception:
+                    LOGGER.exception(
+                        "Could not put back %s in shard %d", shard_deltas, index
                     )
+            raise
 
-        def __update_price(uuid: str, price: float):
-            """
-            Updates the price for a liquor in the 'liquor_store' table.
-
-            Args:
-                uuid (str): The UUID of the liquor.
-                price (float): The change in price for the liquor.
-            """
-            with sqlite3.connect(self.__db_path) as connection:
-                connection.execute(
-                    """
-                        UPDATE liquor_store
-                        SET price = ?
-                        WHERE uuid = ?
-                    """,
-                    (price, uuid),
-                )
+    def __apply_each(self, method: str, items: list[tuple[str, int | float]]) -> list:
+        """
+        Runs a batched change as one transaction per shard, results keep the order of
+        the items.
+        """
+        groups: dict[int, list[int]] = {}
+        for position, (uuid, _) in enumerate(items):
+            groups.setdefault(self.shard_index(uuid), []).append(position)
+
+        results: list = [None] * len(items)
+        for index, positions in groups.items():
+            shard_items = [items[position] for position in positions]
+            shard_results = getattr(self.shards[index], method)(shard_items)
+            for position, result in zip(positions, shard_results):
+                results[position] = result
+        return results
 
-        if delta_stock != 0:
-            __update_stock(uuid, delta_stock)
+    def restock(self, deltas: list[tuple[str, int]]) -> list:
+        return self.__apply_each("restock", deltas)
 
-        if price >= 0.0:
-            __update_price(uuid, price)
+    def reprice(self, prices: list[tuple[str, float]]) -> list:
+        return self.__apply_each("reprice", prices)
+
+    def update(self, uuid: str, delta_stock: int = 0, price: float = -1):
+        self.__shard(uuid).update(uuid, delta_stock, price)
 
     def delete(self, uuid: str):
-        with sqlite3.connect(self.__db_path) as connection:
-            connection.execute(
-                """
-                    DELETE FROM liquor_store 
-                    WHERE uuid = ?;
-                """,
-                (uuid,),
-            )
+        self.__shard(uuid).delete(uuid)
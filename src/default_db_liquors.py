@@ -21,5 +21,5 @@ liquors = [
 database = db.LiquorDatabase()
 
 # Insert default clients
-for liquor in liquors:
-    database.create(liquor)
+database.create_many(liquors)
+database.close()
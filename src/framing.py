@@ -0,0 +1,66 @@
+class LineTooLong(ValueError):
+    """
+    Raised when a client sends more bytes than allowed without ending the line.
+    """
+
+
+class LineBuffer:
+    """
+    Persistent per-connection buffer that splits the TCP byte stream into lines.
+
+    TCP doesn't keep message boundaries, a single `recv` may hold half a command or
+    several pipelined ones, so bytes are accumulated here until a line is complete.
+    Lines end with '\\r\\n', a bare '\\n' is accepted too for hand-typed clients.
+
+    Attributes:
+        max_line_length (int): Maximum bytes of a line, terminator included.
+
+    Methods:
+        feed(data: bytes | memoryview) -> list[bytes]: Adds received bytes and returns
+            the complete lines.
+    """
+
+    def __init__(self, max_line_length: int = 4096):
+        self.max_line_length = max_line_length
+        self.__buffer = bytearray()
+
+    def __len__(self) -> int:
+        return len(self.__buffer)
+
+    def feed(self, data: bytes | memoryview) -> list[bytes]:
+        """
+        Adds bytes received from the client and extracts every complete line.
+
+        Args:
+            data (bytes | memoryview): The bytes received, only read during the call,
+                so it may be a view of a receive buffer that's reused afterwards.
+
+        Returns:
+            list[bytes]: The complete lines in order, terminator included.
+
+        Raises:
+            LineTooLong: If a line is longer than max_line_length.
+        """
+        buffer = self.__buffer
+        # Only the new bytes can hold a terminator the previous call didn't find
+        search_from = len(buffer)
+        buffer += data
+
+        lines = []
+        start = 0
+        # Slicing the view copies each line once, slicing the buffer copies it twice
+        with memoryview(buffer) as view:
+            while True:
+                end = buffer.find(b"\n", search_from)
+                if end == -1:
+                    break
+                end += 1
+                if end - start > self.max_line_length:
+                    raise LineTooLong(f"Line longer than {self.max_line_length} bytes")
+                lines.append(bytes(view[start:end]))
+                start = search_from = end
+
+        del buffer[:start]
+        if len(buffer) > self.max_line_length:
+            raise LineTooLong(f"Line longer than {self.max_line_length} bytes")
+        return lines
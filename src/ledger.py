@@ -0,0 +1,303 @@
+import atexit
+import sqlite3
+from dataclasses import replace
+from threading import Condition, Event, Lock, Thread, get_ident
+from typing import Callable
+from src.db import Liquor, LiquorDatabase
+
+DURABILITIES = ("strict", "group", "relaxed")
+
+
+class StockLedger:
+    """
+    Write-behind ledger of stock decrements.
+
+    Decrements are checked and applied atomically in memory, so two purchases can
+    never take the same bottle, and written to SQLite in batches of one transaction
+    each by a background thread instead of one transaction per purchase.
+
+    The stock of a liquor is loaded the first time it's taken and is the stock in
+    the DB plus the decrements not flushed yet. Changes committed by anyone else,
+    like a restock, make the ledger load the liquor again.
+
+    Only the process owning the ledger may sell from the catalog, other processes
+    writing the same DB would not see the decrements held in memory.
+
+    Attributes:
+        durability (str): When a decrement reaches the DB:
+            'strict' waits for the batch holding it to be committed, purchases
+            arriving together share the transaction.
+            'group' returns right away, batches are committed every flush_interval
+            seconds or every flush_ops decrements.
+            'relaxed' returns right away, batches are only committed every
+            flush_ops decrements and on close.
+        flush_interval (float): Seconds between flushes in 'strict' and 'group'.
+        flush_ops (int): Decrements that trigger a flush right away.
+
+    Methods:
+        take(deltas: dict[str, int]): Takes several liquors out of the stock at once.
+        available(uuid: str) -> int | None: Returns the stock of a loaded liquor.
+        overlay(liquors: list[Liquor]) -> list[Liquor]: Replaces stock read from the
+            DB with the stock held in memory.
+        add_listener(listener: Callable): Registers a callback run after each take.
+        flush() -> int: Writes the pending decrements in one transaction.
+        close(): Flushes everything and stops the background thread.
+        stats() -> dict[str, int]: Returns the ledger counters.
+    """
+
+    def __init__(
+        self,
+        database: LiquorDatabase,
+        durability: str = "group",
+        flush_interval: float = 0.005,
+        flush_ops: int = 256,
+    ):
+        if durability not in DURABILITIES:
+            raise ValueError(f"Unknown durability {durability}")
+
+        self.durability = durability
+        self.flush_interval = flush_interval
+        self.flush_ops = flush_ops
+        self.__database = database
+        # Stock in the DB when loaded, plus every flushed decrement since
+        self.__base: dict[str, int] = {}
+        # Decrements not written yet, and the ones being written
+        self.__pending: dict[str, int] = {}
+        self.__in_flight: dict[str, int] = {}
+        # Liquors changed by someone else while they had unwritten decrements
+        self.__stale: set[str] = set()
+        # Bumped by every change made by someone else, rows read before it may be stale
+        self.__changes = 0
+        self.__lock = Lock()
+        self.__flushed = Condition(self.__lock)
+        self.__flush_lock = Lock()
+        self.__taken_seq = 0
+        self.__flushed_seq = 0
+        self.__flush_thread = 0
+        self.__wake = Event()
+        self.__closed = False
+        self.__counters = {"takes": 0, "flushes": 0, "retries": 0, "failed": 0}
+        self.__listeners: list[Callable[[str | None], None]] = []
+
+        database.add_listener(self.__on_change)
+        self.__thread = Thread(target=self.__run, name="stock-ledger", daemon=True)
+        self.__thread.start()
+        # Flush on shutdown even if close is never called
+        atexit.register(self.close)
+
+    def __on_change(self, uuid: str | None):
+        """
+        Forgets the stock of liquors changed by anyone but the ledger itself.
+        """
+        if get_ident() == self.__flush_thread:
+            return
+        with self.__lock:
+            self.__changes += 1
+            uuids = list(self.__base) if uuid is None else [uuid]
+            for changed in uuids:
+                if changed in self.__pending or changed in self.__in_flight:
+                    self.__stale.add(changed)
+                else:
+                    self.__base.pop(changed, None)
+
+    def __available(self, uuid: str) -> int:
+        return (
+            self.__base[uuid]
+            + self.__in_flight.get(uuid, 0)
+            + self.__pending.get(uuid, 0)
+        )
+
+    def available(self, uuid: str) -> int | None:
+        """
+        Returns the stock of a liquor counting the unwritten decrements, or None
+        if the ledger didn't load it, in which case the DB is up to date.
+        """
+        with self.__lock:
+            if uuid not in self.__base:
+                return None
+            return self.__available(uuid)
+
+    def overlay(self, liquors: list[Liquor]) -> list[Liquor]:
+        """
+        Returns the liquors read from the DB with the stock of the loaded ones
+        replaced by their stock counting the unwritten decrements.
+        """
+        with self.__lock:
+            return [
+                replace(liquor, stock=self.__available(liquor.uuid))
+                if liquor.uuid in self.__base
+                else liquor
+                for liquor in liquors
+            ]
+
+    def add_listener(self, listener: Callable[[str | None], None]):
+        """
+        Registers a callback run after every take, with the UUID of each liquor
+        taken, as `LiquorDatabase.add_listener` does after every commit. Takes are
+        in memory, the DB only hears about them when they're flushed.
+        """
+        self.__listeners.append(listener)
+
+    def __preload(self, uuids):
+        """
+        Loads the stock of the liquors not loaded yet, reading the DB without
+        holding the lock so buyers of loaded liquors never wait on it.
+        """
+        with self.__lock:
+            missing = [uuid for uuid in uuids if uuid not in self.__base]
+            changes = self.__changes
+        if not missing:
+            return
+        liquors = self.__database.read_many(missing)
+        with self.__lock:
+            # Read before a change, take reads them again under the lock
+            if self.__changes != changes:
+                return
+            for liquor in liquors:
+                self.__base.setdefault(liquor.uuid, liquor.stock)
+
+    def take(self, deltas: dict[str, int]):
+        """
+        Changes the stock of several liquors at once, either every change is
+        applied or none is.
+
+        Args:
+            deltas (dict[str, int]): The change in stock for each liquor UUID.
+
+        Raises:
+            NameError: If a liquor is not found.
+            ValueError: If the stock of a liquor would become negative.
+        """
+        self.__preload(deltas)
+        with self.__lock:
+            # Not found, or changed by someone else since preloaded
+            missing = [uuid for uuid in deltas if uuid not in self.__base]
+            if missing:
+                for liquor in self.__database.read_many(missing):
+                    self.__base[liquor.uuid] = liquor.stock
+            for uuid, delta in deltas.items():
+                if uuid not in self.__base:
+                    raise NameError(f"Liquor with UUID {uuid} not found.")
+                if self.__available(uuid) + delta < 0:
+                    raise ValueError("Insufficient stock.")
+
+            for uuid, delta in deltas.items():
+                self.__pending[uuid] = self.__pending.get(uuid, 0) + delta
+            self.__counters["takes"] += 1
+            self.__taken_seq += 1
+            seq = self.__taken_seq
+            if self.durability == "strict" or seq - self.__flushed_seq >= self.flush_ops:
+                self.__wake.set()
+
+            if self.durability == "strict":
+                self.__flushed.wait_for(
+                    lambda: self.__flushed_seq >= seq or self.__closed
+                )
+
+        # Nothing flushes in the background after close
+        if self.__closed:
+            self.flush()
+
+        for listener in self.__listeners:
+            for uuid in deltas:
+                listener(uuid)
+
+    def flush(self) -> int:
+        """
+        Writes every pending decrement to the DB in a single transaction.
+
+        Returns:
+            int: The number of liquors written.
+        """
+        with self.__flush_lock:
+            with self.__lock:
+                batch = self.__pending
+                if not batch:
+                    return 0
+                self.__pending = {}
+                self.__in_flight = batch
+                seq = self.__taken_seq
+
+            self.__flush_thread = get_ident()
+            try:
+                failed = self.__write(batch)
+            except sqlite3.Error:
+                # Locked or unavailable DB, the batch is tried again next flush
+                with self.__lock:
+                    for uuid, delta in batch.items():
+                        self.__pending[uuid] = self.__pending.get(uuid, 0) + delta
+                    self.__in_flight = {}
+                    self.__counters["retries"] += 1
+                return 0
+            finally:
+                self.__flush_thread = 0
+
+            with self.__lock:
+                for uuid, delta in batch.items():
+                    if uuid in self.__stale and uuid not in self.__pending:
+                        self.__stale.discard(uuid)
+                        self.__base.pop(uuid, None)
+                    # A decrement that wasn't written leaves the DB as it was
+                    elif uuid in self.__base and uuid not in failed:
+                        self.__base[uuid] += delta
+                self.__in_flight = {}
+                self.__flushed_seq = max(self.__flushed_seq, seq)
+                self.__counters["flushes"] += 1
+                self.__flushed.notify_all()
+            return len(batch)
+
+    def __write(self, batch: dict[str, int]) -> set[str]:
+        """
+        Writes a batch of decrements.
+
+        Returns:
+            set[str]: The liquors whose decrement couldn't be written.
+        """
+        try:
+            self.__database.update_stocks(batch)
+            return set()
+        except (NameError, ValueError):
+            # Someone else deleted a liquor or took its stock, write the rest
+            pass
+
+        failed = set()
+        for uuid, delta in batch.items():
+            try:
+                self.__database.update(uuid=uuid, delta_stock=delta)
+            except (NameError, ValueError):
+                failed.add(uuid)
+                with self.__lock:
+                    self.__counters["failed"] += 1
+                    self.__stale.add(uuid)
+        return failed
+
+    def __run(self):
+        while not self.__closed:
+            if self.durability == "relaxed":
+                self.__wake.wait()
+            else:
+                self.__wake.wait(self.flush_interval)
+            self.__wake.clear()
+            self.flush()
+
+    def close(self):
+        """
+        Writes every pending decrement and stops the background thread, closing
+        twice is harmless.
+        """
+        if self.__closed:
+            return
+        self.__closed = True
+        self.__wake.set()
+        self.__thread.join()
+        self.flush()
+        with self.__lock:
+            self.__flushed.notify_all()
+        atexit.unregister(self.close)
+
+    def stats(self) -> dict[str, int]:
+        with self.__lock:
+            return self.__counters | {
+                "pending": len(self.__pending),
+                "loaded": len(self.__base),
+            }
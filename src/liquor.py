@@ -1,42 +1,580 @@
-from src.db import Liquor, LiquorDatabase
+from collections import OrderedDict
+from itertools import count
+from math import isfinite
+from src.db import MAX_INTEGER, Liquor, LiquorDatabase
+from src.ledger import StockLedger
+from src.reservations import Reservation, ReservationBook
+from src import wire
+from threading import Lock
+from time import monotonic
 import json
 
+# Most distinct liquors a single cart can hold
+MAX_CART_ITEMS = 100
+
+# Most units of a single liquor a cart can hold
+MAX_CART_QUANTITY = 1_000_000
+
+# Liquors per LIST page, when the client doesn't ask for a limit and at most
+DEFAULT_PAGE_LIMIT = 100
+MAX_PAGE_LIMIT = 1_000
+
+
+class LiquorCache:
+    """
+    Bounded in-memory cache of Liquor rows, least recently used entries are evicted
+    first and every entry expires after a time to live.
+
+    Attributes:
+        max_size (int): Maximum number of liquors kept in memory.
+        ttl (float): Seconds an entry is served before it's read again from the DB.
+
+    Methods:
+        get(uuid: str) -> Liquor | None: Returns a cached liquor, counting the hit or miss.
+        put(uuid: str, liquor: Liquor, generation: int): Caches a liquor read from the DB.
+        invalidate(uuid: str | None): Drops a liquor, or every liquor if uuid is None.
+        stats() -> dict[str, int]: Returns the hit, miss and eviction counters.
+    """
+
+    def __init__(self, max_size: int = 4096, ttl: float = 60.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.__entries: OrderedDict[str, tuple[float, Liquor]] = OrderedDict()
+        self.__lock = Lock()
+        self.__generation = 0
+        self.__hits = 0
+        self.__misses = 0
+        self.__evictions = 0
+
+    @property
+    def generation(self) -> int:
+        """
+        Counter bumped by every invalidation, a reader takes it before going to the
+        DB so a value read before a concurrent write is never cached after it.
+        """
+        return self.__generation
+
+    def get(self, uuid: str) -> Liquor | None:
+        with self.__lock:
+            entry = self.__entries.get(uuid)
+            if entry is None or entry[0] < monotonic():
+                self.__misses += 1
+                return None
+            self.__entries.move_to_end(uuid)
+            self.__hits += 1
+            return entry[1]
+
+    def put(self, uuid: str, liquor: Liquor, generation: int):
+        with self.__lock:
+            if generation != self.__generation:
+                return
+            self.__entries[uuid] = (monotonic() + self.ttl, liquor)
+            self.__entries.move_to_end(uuid)
+            if len(self.__entries) > self.max_size:
+                self.__entries.popitem(last=False)
+                self.__evictions += 1
+
+    def invalidate(self, uuid: str | None = None):
+        with self.__lock:
+            self.__generation += 1
+            if uuid is None:
+                self.__entries.clear()
+            else:
+                self.__entries.pop(uuid, None)
+
+    def stats(self) -> dict[str, int]:
+        with self.__lock:
+            return {
+                "hits": self.__hits,
+                "misses": self.__misses,
+                "evictions": self.__evictions,
+                "size": len(self.__entries),
+            }
+
 
 class LiquorStore:
-    def __init__(self, database: LiquorDatabase = LiquorDatabase()):
-        self.__database = database
+    def __init__(
+        self,
+        database: LiquorDatabase | None = None,
+        cache: LiquorCache | None = None,
+        ledger: StockLedger | None = None,
+        reservations: ReservationBook | None = None,
+    ):
+        # Opened here rather than at import, the default path is only created if used
+        self.__database = database if database is not None else LiquorDatabase()
+        # Stock decrements go through the ledger when given, straight to the DB if not
+        self.__ledger = ledger
+        # Units held for buyers waiting on the bank, None if quotes hold nothing
+        self.__reservations = reservations
+        self.__cache = cache if cache is not None else LiquorCache()
+        # Catalog version, bumped by every committed stock or price change
+        self.__versions = count(1)
+        self.__catalog_version = next(self.__versions)
+        # Serialized catalog as (version, JSON, JSON bytes without the closing bracket)
+        self.__list_cache: tuple[int, str, bytes] = (0, "", b"")
+        # Catalog encoded as a binary page, as (version, page)
+        self.__binary_cache: tuple[int, bytes] = (0, b"")
+        self.__database.add_listener(self.invalidate)
+        if ledger is not None:
+            ledger.add_listener(self.__stock_taken)
+
+    def invalidate(self, uuid: str | None = None):
+        """
+        Drops the stale row from the cache and invalidates the serialized catalog.
+        Called after every commit, and by other processes sharing the database.
+
+        Args:
+            uuid (str | None): The liquor that changed, None for the whole catalog.
+        """
+        self.__cache.invalidate(uuid)
+        self.__catalog_version = next(self.__versions)
+
+    def __stock_taken(self, uuid: str | None):
+        # The cached rows keep the stock in the DB, only the listings show the
+        # ledger's, so they're the only thing taking stock invalidates
+        self.__catalog_version = next(self.__versions)
+
+    @property
+    def catalog_version(self) -> int:
+        return self.__catalog_version
+
+    def __read(self, uuid: str) -> Liquor | None:
+        """
+        Reads a liquor through the cache, going to the DB only on a miss.
+        """
+        liquor = self.__cache.get(uuid)
+        if liquor is not None:
+            return liquor
+
+        generation = self.__cache.generation
+        liquor = self.__database.read(uuid=uuid, read_all=False)
+        if isinstance(liquor, Liquor):
+            self.__cache.put(uuid, liquor, generation)
+            return liquor
+        return None
+
+    def cache_stats(self) -> dict[str, int]:
+        return self.__cache.stats()
 
     def check_liquor(self, uuid: str = "") -> tuple[int, str]:
         if uuid == "":
             return 253, ""
 
-        liquor = self.__database.read(uuid=uuid, read_all=False)
+        liquor = self.__read(uuid)
         if isinstance(liquor, Liquor):
-            liquor_data = liquor.get_data()
-            if liquor_data[3] == 0:
+            if self.__available(liquor) <= 0:
                 return 4, ""
             return 0, ""
         return 252, ""
 
+    def __stock(self, liquor: Liquor) -> int:
+        """
+        Returns the stock of a liquor, counting the decrements the ledger didn't
+        write to the DB yet.
+        """
+        if self.__ledger is not None:
+            stock = self.__ledger.available(liquor.uuid)
+            if stock is not None:
+                return stock
+        return liquor.stock
+
+    def __overlay(self, liquors: list[Liquor]) -> list[Liquor]:
+        """
+        Returns liquors read from the DB with the stock counting the decrements the
+        ledger didn't write yet, as listed to clients.
+        """
+        if self.__ledger is not None:
+            return self.__ledger.overlay(liquors)
+        return liquors
+
+    def __available(self, liquor: Liquor) -> int:
+        """
+        Returns the stock of a liquor left for new buyers, without the units held
+        for the ones waiting on the bank.
+        """
+        if self.__reservations is not None:
+            return self.__stock(liquor) - self.__reservations.held(liquor.uuid)
+        return self.__stock(liquor)
+
+    def __current_stock(self, uuid: str) -> int | None:
+        liquor = self.__read(uuid)
+        return self.__stock(liquor) if liquor is not None else None
+
+    def reserve(self, cart: dict[str, int]) -> tuple[int, Reservation | None]:
+        """
+        Holds the liquors of a quoted cart until it's paid, the whole cart is
+        rejected if any liquor runs short once the other holds are counted.
+
+        Returns:
+            tuple[int, Reservation | None]: The error code and the reservation, None
+                when the store doesn't hold stock.
+        """
+        if self.__reservations is None:
+            return 0, None
+        try:
+            return 0, self.__reservations.hold(cart, self.__current_stock)
+        except NameError:
+            return 252, None
+        except ValueError:
+            return 4, None
+
+    def release(self, reservation: Reservation | None):
+        """
+        Gives back the units of an unpaid reservation, once paid it's a no-op.
+        """
+        if self.__reservations is not None:
+            self.__reservations.release(reservation)
+
+    def check_liquors(self, *uuids: str) -> tuple[int, str]:
+        """
+        Checks that every liquor exists with a single DB query.
+        """
+        unique = list(set(uuids))
+        if len(self.__database.read_many(unique)) != len(unique):
+            return 252, ""
+        return 0, ""
+
     def substract_stock(self, uuid: str = "") -> tuple[int, str]:
         if uuid == "":
             return 253, ""
 
-        self.__database.update(uuid=uuid, delta_stock=-1)
+        if self.__ledger is not None:
+            self.__ledger.take({uuid: -1})
+        else:
+            self.__database.update(uuid=uuid, delta_stock=-1)
         return 0, ""
 
-    def list(self) -> tuple[int, str]:
+    def __serialized_list(self) -> tuple[int, str, bytes]:
+        """
+        Returns the serialized catalog, serializing it again only if the catalog
+        changed since the last call.
+        """
+        list_cache = self.__list_cache
+        version = self.__catalog_version
+        if list_cache[0] == version:
+            return list_cache
+
         liquors = self.__database.read(read_all=True)
         liquors_list = []
         if isinstance(liquors, list):
-            liquors_list = [liquor.get_data() for liquor in liquors]
-        return 0, json.dumps(liquors_list)
+            liquors_list = [liquor.get_data() for liquor in self.__overlay(liquors)]
+        liquors_json = json.dumps(liquors_list)
+
+        # Leave the array open, ready to splice more items at the end
+        prefix = liquors_json[:-1] + (", " if liquors_list else "")
+        # A change racing the read leaves an older version, so it's redone next call
+        list_cache = (version, liquors_json, prefix.encode("utf-8"))
+        self.__list_cache = list_cache
+        return list_cache
+
+    def parse_changes(self, items: tuple[str, ...], cast: type) -> list | None:
+        """
+        Parses the items of an admin command, each one formatted as UUID:value.
+
+        Returns:
+            list | None: The UUID and value of each item, cast to int or float, or
+                None if an item is malformed or its value is beyond what SQLite stores.
+        """
+        changes = []
+        for item in items:
+            uuid, _, value = item.partition(":")
+            try:
+                value = cast(value)
+            except ValueError:
+                return None
+            # Checked before isfinite, which overflows on huge ints
+            if uuid == "" or abs(value) > MAX_INTEGER or not isfinite(value):
+                return None
+            changes.append((uuid, value))
+        return changes
+
+    def restock(self, *items: str) -> tuple[int, str]:
+        """
+        Adds to the stock of many liquors in a single transaction.
+
+        Args:
+            items (str): Each one formatted as UUID:delta, the delta may be negative.
+
+        Returns:
+            tuple[int, str]: The error code and, for each item, a JSON array with its
+                UUID, its own error code and the new stock, null if not applied.
+        """
+        changes = self.parse_changes(items, int)
+        if changes is None:
+            return 253, ""
+        results = self.__database.restock(changes)
+        return 0, json.dumps(
+            [[uuid, *result] for (uuid, _), result in zip(changes, results)]
+        )
+
+    def reprice(self, *items: str) -> tuple[int, str]:
+        """
+        Sets the price of many liquors in a single transaction, like `restock` with
+        items formatted as UUID:price.
+        """
+        changes = self.parse_changes(items, float)
+        if changes is None or any(price < 0 for _, price in changes):
+            return 253, ""
+        results = self.__database.reprice(changes)
+        return 0, json.dumps(
+            [[uuid, *result] for (uuid, _), result in zip(changes, results)]
+        )
+
+    def parse_cart(self, *items: str) -> dict[str, int] | None:
+        """
+        Parses the items of a cart, each one formatted as UUID[:quantity].
+
+        Returns:
+            dict[str, int] | None: The quantity for each liquor UUID, repeated UUIDs
+                are added up, or None if an item is malformed or holds more than
+                MAX_CART_QUANTITY units of a liquor.
+        """
+        cart: dict[str, int] = {}
+        for item in items:
+            uuid, _, quantity = item.partition(":")
+            # str.isdigit also accepts digits like '²', which int rejects
+            if uuid == "" or (
+                quantity != "" and not (quantity.isascii() and quantity.isdigit())
+            ):
+                return None
+            try:
+                units = int(quantity) if quantity else 1
+            except ValueError:
+                # Past int's limit of digits
+                return None
+            cart[uuid] = cart.get(uuid, 0) + units
+
+        if not cart or len(cart) > MAX_CART_ITEMS or 0 in cart.values():
+            return None
+        if max(cart.values()) > MAX_CART_QUANTITY:
+            return None
+        return cart
+
+    def check_cart(self, *items: str) -> tuple[int, str]:
+        """
+        Checks that every liquor of a cart is in stock with a single DB query and
+        quotes its total price.
+
+        Args:
+            items (str): The items of the cart, each one formatted as UUID[:quantity].
+
+        Returns:
+            tuple[int, str]: The error code and the total price of the cart.
+        """
+        cart = self.parse_cart(*items)
+        if cart is None:
+            return 253, ""
+
+        liquors = self.__database.read_many(list(cart))
+        if len(liquors) != len(cart):
+            return 252, ""
+
+        total = 0.0
+        for liquor in liquors:
+            if self.__available(liquor) < cart[liquor.uuid]:
+                return 4, ""
+            total += liquor.price * cart[liquor.uuid]
+        return 0, str(total)
+
+    def substract_cart(
+        self, cart: dict[str, int], reservation: Reservation | None = None
+    ) -> tuple[int, str]:
+        """
+        Takes every liquor of a cart out of the stock in a single transaction, the
+        whole cart is rejected if any liquor ran short. The units held by the
+        cart's reservation are sold, a failed sale keeps them held until released.
+        """
+        if not cart:
+            return 253, ""
+
+        deltas = {uuid: -quantity for uuid, quantity in cart.items()}
+
+        def take():
+            if self.__ledger is not None:
+                self.__ledger.take(deltas)
+            else:
+                self.__database.update_stocks(deltas)
+
+        try:
+            if self.__reservations is not None:
+                self.__reservations.commit(
+                    reservation, cart, take, self.__current_stock
+                )
+            else:
+                take()
+        except NameError:
+            return 252, ""
+        except ValueError:
+            return 4, ""
+        return 0, ""
+
+    def __read_page(self, parsed: dict) -> tuple[list[Liquor], str | None]:
+        """
+        Reads a page of liquors and the cursor of the next one, None on the last.
+        """
+        # One extra liquor tells if there's a next page
+        limit = parsed["limit"]
+        liquors = self.__database.read_page(**(parsed | {"limit": limit + 1}))
+        next_cursor = liquors[limit - 1].uuid if len(liquors) > limit else None
+        return self.__overlay(liquors[:limit]), next_cursor
+
+    @staticmethod
+    def __dump_chunk(liquors: list[Liquor]) -> str:
+        return json.dumps([liquor.get_data() for liquor in liquors])
+
+    def snapshot(self) -> tuple[str, bytes]:
+        """
+        Returns the serialized catalog as JSON and as a binary page, the forms
+        LIST serves, to be saved with `src.snapshot`.
+        """
+        return self.__serialized_list()[1], self.list_binary()[1]
+
+    def warm(self, liquors_json: str, page: bytes):
+        """
+        Loads a serialized catalog saved by `snapshot`, served by LIST until the
+        catalog changes. Only valid if the catalog didn't change since it was saved.
+        """
+        version = self.__catalog_version
+        prefix = liquors_json[:-1] + (", " if liquors_json != "[]" else "")
+        self.__list_cache = (version, liquors_json, prefix.encode("utf-8"))
+        self.__binary_cache = (version, page)
+
+    def list(self) -> tuple[int, str]:
+        return 0, self.__serialized_list()[1]
+
+    def list_binary(self) -> tuple[int, bytes]:
+        """
+        Lists the catalog as a binary page, encoded again only if the catalog
+        changed since the last call.
+        """
+        binary_cache = self.__binary_cache
+        version = self.__catalog_version
+        if binary_cache[0] != version:
+            liquors = self.__database.read(read_all=True)
+            page = wire.encode_page(
+                self.__overlay(liquors) if isinstance(liquors, list) else []
+            )
+            binary_cache = (version, page)
+            self.__binary_cache = binary_cache
+        return 0, binary_cache[1]
+
+    def parse_list_options(self, *options: str) -> dict | None:
+        """
+        Parses the options of a LIST, each one formatted as key=value.
+
+        Options:
+            after (str): The last UUID of the previous page.
+            limit (int): Maximum number of liquors listed, at most MAX_PAGE_LIMIT
+                unless streamed.
+            country (str): Only liquors from this country code.
+            min_price, max_price (float): Only liquors in this price range.
+            in_stock (0 | 1): Only liquors with stock left.
+            stream (0 | 1): Send the listing in chunks instead of a single page.
+
+        Returns:
+            dict | None: Keyword arguments for `LiquorDatabase.iter_page` plus 'stream',
+                or None if an option is malformed.
+        """
+        parsed: dict = {"after": "", "stream": False}
+        try:
+            for option in options:
+                key, _, value = option.partition("=")
+                match key:
+                    case "after":
+                        parsed["after"] = value
+                    case "limit":
+                        parsed["limit"] = int(value)
+                        # Streams have no page limit, but SQLite must bind it
+                        if not 0 < parsed["limit"] <= MAX_INTEGER:
+                            return None
+                    case "country":
+                        parsed["country_code"] = value
+                    case "min_price":
+                        parsed["min_price"] = float(value)
+                    case "max_price":
+                        parsed["max_price"] = float(value)
+                    case "in_stock" | "stream":
+                        if value not in ("0", "1"):
+                            return None
+                        parsed[key] = value == "1"
+                    case _:
+                        return None
+        except ValueError:
+            return None
+
+        if not parsed["stream"]:
+            parsed["limit"] = min(parsed.get("limit", DEFAULT_PAGE_LIMIT), MAX_PAGE_LIMIT)
+        return parsed
+
+    def list_page(self, *options: str) -> tuple[int, str]:
+        """
+        Lists a filtered page of the catalog.
+
+        Returns:
+            tuple[int, str]: The error code and the page as a JSON object with the
+                liquors and the cursor for the next page, null on the last page.
+                Streamed listings are only validated, see `iter_list_chunks`.
+        """
+        parsed = self.parse_list_options(*options)
+        if parsed is None:
+            return 253, ""
+        if parsed.pop("stream"):
+            return 0, ""
+
+        liquors, next_cursor = self.__read_page(parsed)
+        return 0, json.dumps(
+            {
+                "liquors": [liquor.get_data() for liquor in liquors],
+                "next": next_cursor,
+            }
+        )
+
+    def list_page_binary(self, *options: str) -> tuple[int, bytes]:
+        """
+        Same as `list_page`, with the page encoded in the binary wire format.
+        """
+        parsed = self.parse_list_options(*options)
+        if parsed is None:
+            return 253, b""
+        if parsed.pop("stream"):
+            return 0, b""
+
+        return 0, wire.encode_page(*self.__read_page(parsed))
+
+    def iter_list_chunks(
+        self, *options: str, chunk_size: int = 500, binary: bool = False
+    ):
+        """
+        Streams a filtered listing of the catalog.
+
+        Yields:
+            str | bytes: JSON arrays with up to chunk_size liquors each, or binary
+                pages when binary is set.
+        """
+        parsed = self.parse_list_options(*options) or {}
+        parsed.pop("stream", None)
+        encode = wire.encode_page if binary else self.__dump_chunk
+        chunk = []
+        for liquor in self.__database.iter_page(**parsed, batch_size=chunk_size):
+            chunk.append(liquor)
+            if len(chunk) == chunk_size:
+                yield encode(self.__overlay(chunk))
+                chunk = []
+        if chunk:
+            yield encode(self.__overlay(chunk))
+
+    def list_prefix(self) -> bytes:
+        """
+        Returns the serialized catalog as a JSON array still open for more items,
+        ending with a separator when it's not empty, e.g. b'[["uuid", ...], '.
+        """
+        return self.__serialized_list()[2]
 
     def get_liquor_name(self, uuid: str = "") -> tuple[int, str]:
         if uuid == "":
             return 253, ""
 
-        liquor = self.__database.read(uuid=uuid, read_all=False)
+        liquor = self.__read(uuid)
         if isinstance(liquor, Liquor):
             liquor_name = liquor.get_data()[1]
             return 0, liquor_name
@@ -46,7 +584,7 @@ class LiquorStore:
         if uuid == "":
             return 253, ""
 
-        liquor = self.__database.read(uuid=uuid, read_all=False)
+        liquor = self.__read(uuid)
         if isinstance(liquor, Liquor):
             liquor_price = liquor.get_data()[4]
             return 0, str(liquor_price)
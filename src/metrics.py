@@ -0,0 +1,209 @@
+from bisect import bisect_left
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from time import perf_counter
+
+# Upper bounds of the latency buckets in seconds, from 1 us to ~190 s, each one
+# 19% wider than the previous so percentiles are off by less than that
+BUCKETS = tuple(1e-6 * 2 ** (i / 4) for i in range(110))
+
+
+class Histogram:
+    """
+    Latency histogram with logarithmic buckets, recording is a binary search and
+    a few increments no matter how many values were recorded.
+
+    Methods:
+        record(seconds: float, error_code: int): Records a latency and its outcome.
+        percentile(q: float) -> float: Estimates a latency percentile.
+        snapshot() -> dict: Returns the count, errors and main percentiles.
+    """
+
+    def __init__(self):
+        self.__lock = Lock()
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.errors: dict[int, int] = {}
+
+    def record(self, seconds: float, error_code: int = 0):
+        index = bisect_left(BUCKETS, seconds)
+        with self.__lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+            if error_code:
+                self.errors[error_code] = self.errors.get(error_code, 0) + 1
+
+    def percentile(self, q: float) -> float:
+        """
+        Estimates a latency percentile as the upper bound of the bucket holding it.
+
+        Args:
+            q (float): The percentile, between 0 and 1.
+
+        Returns:
+            float: The latency in seconds, 0 if nothing was recorded.
+        """
+        with self.__lock:
+            counts, count, maximum = list(self.counts), self.count, self.max
+        if count == 0:
+            return 0.0
+
+        target = q * count
+        seen = 0
+        for index, bucket_count in enumerate(counts):
+            seen += bucket_count
+            if seen >= target and bucket_count:
+                return min(BUCKETS[index], maximum) if index < len(BUCKETS) else maximum
+        return maximum
+
+    def snapshot(self) -> dict:
+        with self.__lock:
+            count, total, maximum = self.count, self.total, self.max
+            errors = dict(self.errors)
+        return {
+            "count": count,
+            "errors": errors,
+            "avg": total / count if count else 0.0,
+            "p50": self.percentile(0.50),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+            "max": maximum,
+        }
+
+
+class Metrics:
+    """
+    Registry of latency histograms grouped in families, like one histogram per
+    command in the 'command' family.
+
+    Methods:
+        record(family: str, name: str, seconds: float, error_code: int): Records a latency.
+        timed(family: str, name: str): Decorator recording the latency of a function.
+        snapshot() -> dict: Returns every histogram snapshot by family and name.
+        prometheus() -> str: Renders every histogram in Prometheus text format.
+    """
+
+    def __init__(self, namespace: str = "liquor_store"):
+        self.namespace = namespace
+        self.__histograms: dict[tuple[str, str], Histogram] = {}
+        self.__lock = Lock()
+
+    def histogram(self, family: str, name: str) -> Histogram:
+        key = (family, name)
+        histogram = self.__histograms.get(key)
+        if histogram is None:
+            with self.__lock:
+                histogram = self.__histograms.setdefault(key, Histogram())
+        return histogram
+
+    def record(self, family: str, name: str, seconds: float, error_code: int = 0):
+        self.histogram(family, name).record(seconds, error_code)
+
+    def timed(self, family: str, name: str):
+        """
+        Decorator recording how long every call takes, calls raising an exception
+        are recorded with error code 255.
+        """
+
+        def decorator(fn):
+            histogram = self.histogram(family, name)
+
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                start = perf_counter()
+                try:
+                    result = fn(*args, **kwargs)
+                except BaseException:
+                    histogram.record(perf_counter() - start, 255)
+                    raise
+                histogram.record(perf_counter() - start)
+                return result
+
+            return wrapper
+
+        return decorator
+
+    def snapshot(self) -> dict[str, dict[str, dict]]:
+        families: dict[str, dict[str, dict]] = {}
+        for (family, name), histogram in sorted(self.__histograms.items()):
+            families.setdefault(family, {})[name] = histogram.snapshot()
+        return families
+
+    def prometheus(self) -> str:
+        """
+        Renders every histogram in Prometheus text exposition format, with one
+        bucket per power of two to keep the output short.
+        """
+        lines = []
+        by_family: dict[str, list[tuple[str, Histogram]]] = {}
+        for (family, name), histogram in sorted(self.__histograms.items()):
+            by_family.setdefault(family, []).append((name, histogram))
+
+        for family, histograms in by_family.items():
+            metric = f"{self.namespace}_{family}_seconds"
+            errors_metric = f"{self.namespace}_{family}_errors_total"
+            lines.append(f"# TYPE {metric} histogram")
+            for name, histogram in histograms:
+                snapshot = histogram.snapshot()
+                counts = list(histogram.counts)
+                cumulative = 0
+                for index, bound in enumerate(BUCKETS):
+                    cumulative += counts[index]
+                    if index % 4 == 0:
+                        lines.append(
+                            f'{metric}_bucket{{{family}="{name}",le="{bound:.6g}"}} {cumulative}'
+                        )
+                lines.append(
+                    f'{metric}_bucket{{{family}="{name}",le="+Inf"}} {snapshot["count"]}'
+                )
+                lines.append(
+                    f'{metric}_sum{{{family}="{name}"}} {snapshot["avg"] * snapshot["count"]:.9f}'
+                )
+                lines.append(f'{metric}_count{{{family}="{name}"}} {snapshot["count"]}')
+
+            lines.append(f"# TYPE {errors_metric} counter")
+            for name, histogram in histograms:
+                for code, count in sorted(histogram.snapshot()["errors"].items()):
+                    lines.append(
+                        f'{errors_metric}{{{family}="{name}",code="{code}"}} {count}'
+                    )
+
+        return "\n".join(lines) + "\n"
+
+
+# Registry shared by the whole server
+METRICS = Metrics()
+
+
+def start_metrics_server(host: str, port: int, metrics: Metrics = METRICS):
+    """
+    Serves the metrics in Prometheus text format at /metrics on a daemon thread.
+
+    Returns:
+        ThreadingHTTPServer: The running server, call `shutdown` to stop it.
+    """
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *_):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
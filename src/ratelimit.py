@@ -0,0 +1,165 @@
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+from typing import Callable
+
+# Budget of the commands without one of their own
+ANY_COMMAND = "*"
+
+
+def parse_limits(specs: list[str]) -> dict[str, tuple[float, float]]:
+    """
+    Parses rate limits written as COMMAND=RATE[/BURST], like LIST=20/40 for 20
+    LISTs a second with bursts of 40. The command `*` sets the budget of every
+    command without its own, the burst defaults to the rate.
+
+    Returns:
+        dict[str, tuple[float, float]]: The rate and burst of each command.
+
+    Raises:
+        ValueError: If a limit is malformed or not positive.
+    """
+    limits = {}
+    for spec in specs:
+        command, _, budget = spec.partition("=")
+        rate, _, burst = budget.partition("/")
+        if not command or not rate:
+            raise ValueError(f"Rate limit '{spec}' is not COMMAND=RATE[/BURST]")
+        rate_value = float(rate)
+        burst_value = float(burst) if burst else max(rate_value, 1.0)
+        if rate_value <= 0 or burst_value < 1:
+            raise ValueError(f"Rate limit '{spec}' must allow at least one request")
+        limits[command.upper()] = (rate_value, burst_value)
+    return limits
+
+
+class TokenBucket:
+    """
+    Allows `rate` requests a second on average and up to `burst` at once. Tokens
+    are refilled lazily from the time elapsed, so idle buckets cost nothing.
+
+    Not thread-safe on its own, RateLimiter guards its buckets with a lock.
+    """
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def refill(self, now: float) -> float:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return self.tokens
+
+
+class RateLimiter:
+    """
+    Token-bucket admission control with a budget per client IP and command, and a
+    global budget per command shared by every client.
+
+    A request is only admitted if both its client bucket and the global bucket
+    have a token, and takes one from each, so a client turned away never eats the
+    global budget of the others. Client buckets are kept in least recently used
+    order, once max_clients are kept a new client evicts the idlest one.
+
+    Methods:
+        allow(host: str, command: str) -> bool: Admits or throttles a request.
+        stats() -> dict: Returns the throttled counters.
+    """
+
+    def __init__(
+        self,
+        per_client: dict[str, tuple[float, float]] | None = None,
+        global_limits: dict[str, tuple[float, float]] | None = None,
+        max_clients: int = 100_000,
+        clock: Callable[[], float] = monotonic,
+    ):
+        """
+        Args:
+            per_client (dict | None): Rate and burst of each command for each client IP.
+            global_limits (dict | None): Rate and burst of each command for the server.
+            max_clients (int): Client buckets kept, the least recently used is
+                dropped to make room for a new one.
+            clock (Callable[[], float]): Monotonic time in seconds.
+        """
+        self.__per_client = per_client or {}
+        self.__global_limits = global_limits or {}
+        self.__max_clients = max_clients
+        self.__clock = clock
+        self.__clients: OrderedDict[tuple[str, str], TokenBucket] = OrderedDict()
+        self.__global: dict[str, TokenBucket] = {}
+        self.__lock = Lock()
+        self.__throttled: dict[str, int] = {}
+        self.__throttled_global = 0
+
+    @staticmethod
+    def __limit(
+        limits: dict[str, tuple[float, float]], command: str
+    ) -> tuple[float, float] | None:
+        return limits.get(command) or limits.get(ANY_COMMAND)
+
+    def allow(self, host: str, command: str) -> bool:
+        """
+        Takes a token for a request of a client.
+
+        Args:
+            host (str): The client IP.
+            command (str): The command requested.
+
+        Returns:
+            bool: Whether the request is admitted, otherwise it must be answered
+                with error 249 without doing any work.
+        """
+        client_limit = self.__limit(self.__per_client, command)
+        global_limit = self.__limit(self.__global_limits, command)
+        if client_limit is None and global_limit is None:
+            return True
+
+        # Commands sharing the `*` budget share its buckets and counter too
+        client_key = (host, command if command in self.__per_client else ANY_COMMAND)
+        global_key = command if command in self.__global_limits else ANY_COMMAND
+        if command not in self.__per_client and command not in self.__global_limits:
+            command = ANY_COMMAND
+        with self.__lock:
+            now = self.__clock()
+            client_bucket = global_bucket = None
+            if client_limit is not None:
+                client_bucket = self.__clients.get(client_key)
+                if client_bucket is None:
+                    # Constant time even under a spray of new IPs, the idlest
+                    # client is likely refilled already, if not it's forgiven
+                    if len(self.__clients) >= self.__max_clients:
+                        self.__clients.popitem(last=False)
+                    client_bucket = TokenBucket(*client_limit, now)
+                    self.__clients[client_key] = client_bucket
+                else:
+                    self.__clients.move_to_end(client_key)
+                if client_bucket.refill(now) < 1:
+                    self.__throttled[command] = self.__throttled.get(command, 0) + 1
+                    return False
+
+            if global_limit is not None:
+                global_bucket = self.__global.get(global_key)
+                if global_bucket is None:
+                    global_bucket = TokenBucket(*global_limit, now)
+                    self.__global[global_key] = global_bucket
+                if global_bucket.refill(now) < 1:
+                    self.__throttled[command] = self.__throttled.get(command, 0) + 1
+                    self.__throttled_global += 1
+                    return False
+                global_bucket.tokens -= 1
+
+            if client_bucket is not None:
+                client_bucket.tokens -= 1
+            return True
+
+    def stats(self) -> dict:
+        with self.__lock:
+            return {
+                "throttled": dict(self.__throttled),
+                "throttled_global": self.__throttled_global,
+                "clients": len(self.__clients),
+            }
@@ -0,0 +1,227 @@
+import atexit
+from heapq import heappop, heappush
+from itertools import count
+from threading import Event, Lock, Thread
+from time import monotonic
+from typing import Callable
+from zlib import crc32
+
+
+class Reservation:
+    """
+    Units of several liquors held for a client between the quote and the bank's
+    answer.
+
+    Attributes:
+        id (int): Unique number of the reservation.
+        items (dict[str, int]): The quantity held of each liquor UUID.
+        expires (float): Monotonic time the hold is swept at.
+        active (bool): Whether the units are still held.
+    """
+
+    __slots__ = ("id", "items", "expires", "active")
+
+    def __init__(self, id: int, items: dict[str, int], expires: float):
+        self.id = id
+        self.items = items
+        self.expires = expires
+        self.active = True
+
+
+class ReservationBook:
+    """
+    Holds units of stock for the buyers waiting on the bank, so the last bottle is
+    only quoted to one of them.
+
+    A liquor is available to a new buyer if its stock minus the units held for
+    others covers the quantity. Holds are checked and taken under one lock per
+    stripe of UUIDs, carts lock their stripes in order, so buyers of different
+    liquors never wait on each other. Commits run the stock decrement under the
+    same locks before dropping the hold, so no buyer sees the units twice.
+
+    Holds expire after ttl seconds, a background thread sweeps them so a client
+    that never pays doesn't keep the stock forever.
+
+    Attributes:
+        ttl (float): Seconds a hold lasts.
+
+    Methods:
+        hold(items: dict[str, int], stock: Callable) -> Reservation: Holds units.
+        commit(reservation: Reservation, items: dict, apply: Callable, stock: Callable):
+            Sells the held units.
+        release(reservation: Reservation): Gives the units back.
+        held(uuid: str) -> int: Returns the units held of a liquor.
+        close(): Stops the sweeper.
+        stats() -> dict[str, int]: Returns the reservation counters.
+    """
+
+    def __init__(
+        self, ttl: float = 30.0, sweep_interval: float = 1.0, stripes: int = 64
+    ):
+        self.ttl = ttl
+        self.__sweep_interval = sweep_interval
+        self.__stripes = [Lock() for _ in range(stripes)]
+        # Units held of each liquor, only changed under the liquor's stripe
+        self.__held: dict[str, int] = {}
+        # Active reservations by deadline, for the sweeper
+        self.__deadlines: list[tuple[float, int, Reservation]] = []
+        self.__lock = Lock()
+        self.__ids = count(1)
+        self.__counters = {"held": 0, "committed": 0, "released": 0, "expired": 0}
+        self.__stop = Event()
+        self.__thread = Thread(target=self.__run, name="reservations", daemon=True)
+        self.__thread.start()
+        atexit.register(self.close)
+
+    def __locks(self, uuids) -> list[Lock]:
+        # Always taken in the same order, so carts sharing stripes never deadlock
+        stripes = len(self.__stripes)
+        indexes = sorted({crc32(uuid.encode("utf-8")) % stripes for uuid in uuids})
+        return [self.__stripes[index] for index in indexes]
+
+    def __count(self, counter: str):
+        with self.__lock:
+            self.__counters[counter] += 1
+
+    def held(self, uuid: str) -> int:
+        return self.__held.get(uuid, 0)
+
+    def __check(self, items: dict[str, int], stock: Callable[[str], int | None]):
+        for uuid, quantity in items.items():
+            available = stock(uuid)
+            if available is None:
+                raise NameError(f"Liquor with UUID {uuid} not found.")
+            if available - self.__held.get(uuid, 0) < quantity:
+                raise ValueError("Insufficient stock.")
+
+    def __drop(self, reservation: Reservation):
+        """
+        Gives the units back, the caller holds the stripes of the reservation.
+        """
+        reservation.active = False
+        for uuid, quantity in reservation.items.items():
+            left = self.__held[uuid] - quantity
+            if left:
+                self.__held[uuid] = left
+            else:
+                del self.__held[uuid]
+
+    def hold(
+        self, items: dict[str, int], stock: Callable[[str], int | None]
+    ) -> Reservation:
+        """
+        Holds units of several liquors, either every one is held or none is.
+
+        Args:
+            items (dict[str, int]): The quantity to hold of each liquor UUID.
+            stock (Callable[[str], int | None]): Returns the current stock of a
+                liquor, None if it doesn't exist. Called with the stripe locked.
+
+        Raises:
+            NameError: If a liquor is not found.
+            ValueError: If a liquor doesn't have enough units left unheld.
+        """
+        locks = self.__locks(items)
+        for lock in locks:
+            lock.acquire()
+        try:
+            self.__check(items, stock)
+            for uuid, quantity in items.items():
+                self.__held[uuid] = self.__held.get(uuid, 0) + quantity
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+        reservation = Reservation(next(self.__ids), dict(items), monotonic() + self.ttl)
+        with self.__lock:
+            heappush(
+                self.__deadlines, (reservation.expires, reservation.id, reservation)
+            )
+            self.__counters["held"] += 1
+        return reservation
+
+    def commit(
+        self,
+        reservation: Reservation | None,
+        items: dict[str, int],
+        apply: Callable[[], None],
+        stock: Callable[[str], int | None],
+    ):
+        """
+        Takes the held units out of the stock with `apply` and drops the hold. A
+        reservation that expired, or None, has to find the units free again first.
+
+        Raises:
+            NameError: If a liquor is not found.
+            ValueError: If an expired reservation's units were held by someone else,
+                or `apply` found the stock short.
+        """
+        locks = self.__locks(items)
+        for lock in locks:
+            lock.acquire()
+        try:
+            if reservation is None or not reservation.active:
+                self.__check(items, stock)
+                apply()
+            else:
+                # The hold is kept if the decrement fails, release drops it
+                apply()
+                self.__drop(reservation)
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+        self.__count("committed")
+
+    def release(self, reservation: Reservation | None, counter: str = "released"):
+        """
+        Gives the units of a reservation back, releasing it twice is harmless.
+        """
+        if reservation is None or not reservation.active:
+            return
+        locks = self.__locks(reservation.items)
+        for lock in locks:
+            lock.acquire()
+        try:
+            if not reservation.active:
+                return
+            self.__drop(reservation)
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+        self.__count(counter)
+
+    def sweep(self, now: float | None = None) -> int:
+        """
+        Releases the reservations past their deadline.
+
+        Returns:
+            int: The number of reservations expired.
+        """
+        now = monotonic() if now is None else now
+        expired = []
+        with self.__lock:
+            while self.__deadlines and self.__deadlines[0][0] <= now:
+                expired.append(heappop(self.__deadlines)[2])
+
+        released = 0
+        for reservation in expired:
+            if reservation.active:
+                self.release(reservation, "expired")
+                released += 1
+        return released
+
+    def __run(self):
+        while not self.__stop.wait(self.__sweep_interval):
+            self.sweep()
+
+    def close(self):
+        self.__stop.set()
+
+    def stats(self) -> dict[str, int]:
+        with self.__lock:
+            return self.__counters | {
+                "active": sum(
+                    reservation.active for _, _, reservation in self.__deadlines
+                ),
+                "units": sum(list(self.__held.values())),
+            }
@@ -1,12 +1,85 @@
 #!/usr/bin/env python
-from json import loads, dumps
-from socket import AF_INET, SOCK_DGRAM, socket
+import asyncio
+from argparse import ArgumentParser, Namespace
+from hmac import compare_digest
+import os
+import socket
+from select import select
+from json import dumps
+from signal import SIG_DFL, SIGINT, SIGTERM, default_int_handler, signal
+from socket import SHUT_RD, SHUT_RDWR, SOL_SOCKET
 from socketserver import ThreadingTCPServer, BaseRequestHandler
+from src import cipher, wire
+from src.analytics import SalesAggregator, parse_report_options
+from src.bank import BankGateway
+from src.framing import LineBuffer, LineTooLong
+from src.ledger import DURABILITIES, StockLedger
+from src.db import LiquorDatabase, ShardedLiquorDatabase
 from src.liquor import LiquorStore
-from src.utils import setup_logger
+from src.metrics import METRICS, start_metrics_server
+from src.ratelimit import RateLimiter, parse_limits
+from src.reservations import Reservation, ReservationBook
+from src.sessions import SessionRegistry
+from src.snapshot import SnapshotError, load_snapshot, save_snapshot
+from src.utils import SAMPLED, get_project_root, setup_logger
+from src.watch import Subscription, WatchHub
+from src.workers import WorkerPool
 from sys import argv, exit
+from threading import Thread
+from time import perf_counter
+from typing import Callable
 
-connected_users = []
+# Connected clients, configured by __main__
+SESSIONS = SessionRegistry()
+
+# Worker processes sharing the port, None when running a single process
+WORKERS: WorkerPool | None = None
+
+# Write-behind stock ledger, None when every purchase is committed on its own
+LEDGER: StockLedger | None = None
+
+# Pushes catalog changes to the clients that sent WATCH, set up by __main__
+HUB: WatchHub | None = None
+
+# Token buckets of the clients, None when requests are never throttled
+LIMITER: RateLimiter | None = None
+
+# Stock held between a quote and its payment, None when quotes hold nothing
+RESERVATIONS: ReservationBook | None = None
+
+# Counts every paid order for TOP and SALES, set up by __main__
+SALES: SalesAggregator | None = None
+
+# Token unlocking RESTOCK and REPRICE after AUTH, None disables them
+ADMIN_TOKEN: str | None = None
+
+# Pending connections queued by the kernel
+LISTEN_BACKLOG = 4096
+
+# Maximum bytes of a client line, terminator included
+MAX_LINE_LENGTH = 4096
+
+# Liquors per line of a streamed LIST
+LIST_CHUNK_SIZE = 500
+
+# Bytes read from a client at once, into a buffer reused by the connection
+RECV_BUFFER_SIZE = 4096
+
+# Replies that never change, encoded once instead of on every request
+ERROR_REPLIES = [f"ERR {error_code}\r\n".encode() for error_code in range(256)]
+BINARY_ERROR_REPLIES = [wire.encode_error(error_code) for error_code in range(256)]
+OK_REPLIES = {
+    data: f"OK {data}\r\n".encode() for data in ["", "*", "admin", *range(16)]
+}
+
+
+def connected_users() -> int:
+    """
+    Clients connected to the server, across every worker in worker mode.
+    """
+    if WORKERS is not None:
+        return WORKERS.users()
+    return len(SESSIONS)
 
 
 class Command:
@@ -24,6 +97,7 @@ class Command:
         no_fn(_: None) -> tuple[int, str]: Default function for commands without an associated function.
         wrong_args(_: None) -> tuple[int, str]: Function for commands with incorrect arguments.
         __check_args(args_number: int = 0, fn: callable = no_fn): Checks and sets the associated function based on the command.
+        __check_min_args(args_number: int = 1, fn: callable = no_fn): Same as __check_args for commands taking a variable number of arguments.
         fn() -> tuple[int, str]: Executes the associated function and returns the result.
     """
 
@@ -32,9 +106,9 @@ class Command:
         Outputs additional information to the logger.
         """
         if self.fn != self.no_fn:
-            LOGGER.debug(
-                f"{self.__command}:{self.__arguments} executed",
-            )
+            # Never log the admin token
+            arguments = ["***"] if self.__command == "AUTH" else self.__arguments
+            LOGGER.debug("%s:%s executed", self.__command, arguments, extra=SAMPLED)
 
     def no_fn(self, _=None) -> tuple[int, str]:
         """
@@ -54,6 +128,64 @@ class Command:
         """
         return 0, "liquor_store"
 
+    def unauthorized(self, *_) -> tuple[int, str]:
+        """
+        Function for admin commands sent before a successful AUTH.
+        """
+        return 251, ""
+
+    def auth(self, token: str) -> tuple[int, str]:
+        """
+        Function that checks the admin token, in constant time.
+        """
+        if ADMIN_TOKEN and compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+            return 0, "admin"
+        return 251, ""
+
+    def top(self, *options: str) -> tuple[int, str]:
+        """
+        Function that lists the best sellers of a window.
+        """
+        parsed = parse_report_options(*options)
+        if parsed is None or "uuid" in parsed:
+            return 253, ""
+        return 0, dumps(SALES.top(parsed.get("limit", 10), parsed["window"]))
+
+    def sales(self, *options: str) -> tuple[int, str]:
+        """
+        Function that reports the orders, units and revenue of a window.
+        """
+        parsed = parse_report_options(*options)
+        if parsed is None or "limit" in parsed:
+            return 253, ""
+        return 0, dumps(SALES.sales(parsed["window"], parsed.get("uuid")))
+
+    def ok(self, *_) -> tuple[int, str]:
+        """
+        Function for commands that can't fail, answered by the session itself.
+        """
+        return 0, ""
+
+    def stats(self, _=None) -> tuple[int, str]:
+        """
+        Function that reports the server's counters and latency percentiles.
+        """
+        return 0, dumps(
+            {
+                "metrics": METRICS.snapshot(),
+                "cache": STORE.cache_stats(),
+                "bank": BANK.stats(),
+                "sessions": SESSIONS.stats(),
+                "ledger": LEDGER.stats() if LEDGER is not None else None,
+                "watch": HUB.stats() if HUB is not None else None,
+                "rate_limit": LIMITER.stats() if LIMITER is not None else None,
+                "reservations": (
+                    RESERVATIONS.stats() if RESERVATIONS is not None else None
+                ),
+                "sales": SALES.stats() if SALES is not None else None,
+            }
+        )
+
     def __check_args(self, args_number: int = 0, fn=no_fn):
         """
         Checks if the number of arguments supplied is correct.
@@ -64,21 +196,73 @@ class Command:
         else:
             self.__fn = fn
 
-    def __init__(self, command: str, arguments: list):
+    def __check_min_args(self, args_number: int = 1, fn=no_fn):
+        """
+        Checks if at least the number of arguments required was supplied.
+        """
+        if len(self.__arguments) < args_number:
+            self.__arguments = []
+            self.__fn = self.wrong_args
+        else:
+            self.__fn = fn
+
+    def __init__(
+        self, command: str, arguments: list, binary: bool = False, admin: bool = False
+    ):
         self.__command = command
         self.__arguments = arguments
         self.__fn = self.no_fn
 
         match self.__command:
             case "HI":
-                self.__check_args(args_number=0, fn=self.hi)
+                if self.__arguments == ["BIN"]:
+                    self.__fn = self.hi
+                else:
+                    self.__check_args(args_number=0, fn=self.hi)
 
             case "LIST":
-                self.__check_args(args_number=0, fn=STORE.list)
+                if self.__arguments:
+                    self.__fn = STORE.list_page_binary if binary else STORE.list_page
+                else:
+                    self.__check_args(
+                        args_number=0, fn=STORE.list_binary if binary else STORE.list
+                    )
 
             case "BUY":
                 self.__check_args(args_number=1, fn=STORE.check_liquor)
 
+            case "CART":
+                self.__check_min_args(args_number=1, fn=STORE.check_cart)
+
+            case "STATS":
+                self.__check_args(args_number=0, fn=self.stats)
+
+            # Each worker only counts its own sales, they're only saved together
+            case "TOP" if WORKERS is None:
+                self.__fn = self.top
+
+            case "SALES" if WORKERS is None:
+                self.__fn = self.sales
+
+            case "WATCH":
+                self.__fn = STORE.check_liquors
+
+            case "UNWATCH":
+                self.__fn = self.ok
+
+            case "AUTH":
+                self.__check_args(args_number=1, fn=self.auth)
+
+            case "RESTOCK":
+                self.__check_min_args(
+                    args_number=1, fn=STORE.restock if admin else self.unauthorized
+                )
+
+            case "REPRICE":
+                self.__check_min_args(
+                    args_number=1, fn=STORE.reprice if admin else self.unauthorized
+                )
+
             case _:
                 self.__arguments = []
 
@@ -86,13 +270,70 @@ class Command:
         """
         Executes the binded function of the command and returns the error code.
         """
+        start = perf_counter()
         self.__error_code, data = self.__fn(*self.__arguments)
+        # Unknown commands share a single histogram, whatever the client sent
+        METRICS.record(
+            "command",
+            self.__command if self.__fn != self.no_fn else "UNKNOWN",
+            perf_counter() - start,
+            self.__error_code,
+        )
         if self.__error_code == 0:
             return 0, data
         return self.__error_code, ""
 
 
-class LiquorStoreTCPServerHandler(BaseRequestHandler):
+class LiquorStoreSession:
+    """
+    Protocol state of a single client connection, independent of the I/O engine
+    serving it.
+
+    Both the threaded and the asyncio engines split the bytes received from the
+    client into lines with `frame`, run them with `process_lines` and send back
+    whatever it returns, so the HI/LIST/BUY protocol is implemented only once.
+
+    Attributes:
+        client_address (tuple): The address of the connected client.
+        buffer (LineBuffer): Bytes received that don't make a complete line yet.
+        pending_order (dict[str, int] | None): Quantity of each liquor quoted by the
+            last BUY or CART, the next message from the client is the encrypted
+            payment for it.
+        reservation (Reservation | None): Stock held for the pending order.
+        closed (bool): Whether the connection must be closed after the reply.
+        binary (bool): Whether the client negotiated binary replies with `HI BIN`,
+            see `src.wire`.
+        admin (bool): Whether the client sent the admin token with `AUTH`.
+        write (Callable[[bytes], None] | None): Set by the engine to send bytes right
+            away, without it streamed replies are batched like any other.
+        wake (Callable[[], None] | None): Set by the engine, called from any thread
+            when updates for a WATCH are waiting to be sent with `pushes`.
+        subscription (Subscription | None): Liquors watched, None before any WATCH.
+        watching (bool): Whether the client watches any liquor.
+
+    Methods:
+        frame(data: bytes | memoryview) -> list[bytes] | None: Splits received
+            bytes into lines.
+        process_lines(lines: list[bytes]) -> bytes: Runs pipelined lines in order.
+        process(data: bytes) -> bytes: Runs a client message and returns the reply.
+        is_blocking(data: bytes) -> bool: Tells if a message touches the DB or bank.
+        pushes() -> bytes: Takes the updates waiting for a WATCH.
+        release(): Drops the subscription and reservation of a finished connection.
+    """
+
+    def __init__(self, client_address):
+        self.client_address = client_address
+        self.buffer = LineBuffer(MAX_LINE_LENGTH)
+        self.pending_order: dict[str, int] | None = None
+        self.reservation: Reservation | None = None
+        self.closed = False
+        self.binary = False
+        self.admin = False
+        self.write: Callable[[bytes], None] | None = None
+        self.wake: Callable[[], None] | None = None
+        self.subscription: Subscription | None = None
+        self.__replies: list[bytes] = []
+
     def handle_error(self, error_code: int):
         error_msg = f"Error {error_code}: "
         match error_code:
@@ -104,6 +345,8 @@ class LiquorStoreTCPServerHandler(BaseRequestHandler):
                 error_msg += "Insufficient funds"
             case 4:
                 error_msg += "Insufficient liquor"
+            case 250:
+                error_msg += "Server busy"
             case 251:
                 error_msg += "Unauthorized access"
             case 252:
@@ -117,162 +360,981 @@ class LiquorStoreTCPServerHandler(BaseRequestHandler):
 
         LOGGER.error(error_msg)
 
-    def send_error_code(self, error_code=255):
-        self.request.sendall(f"ERR {error_code}\r\n".encode("utf-8"))
+    def error_reply(self, error_code=255) -> bytes:
+        if self.binary:
+            return BINARY_ERROR_REPLIES[error_code]
+        return ERROR_REPLIES[error_code]
 
-    def send_ok_data(self, ok_data=""):
-        self.request.sendall(f"OK {ok_data}\r\n".encode("utf-8"))
+    def ok_reply(self, ok_data="") -> bytes:
+        line = OK_REPLIES.get(ok_data)
+        if line is None:
+            line = f"OK {ok_data}\r\n".encode("utf-8")
+        return self.text_reply(line)
 
-    def encrypt(self, msg: str, n: int):
-        result = ""
-        for char in msg:
-            if char.isalpha():
-                # Shift letters
-                if char.islower():
-                    result += chr((ord(char) - ord("a") + n) % 26 + ord("a"))
-                else:
-                    result += chr((ord(char) - ord("A") + n) % 26 + ord("A"))
-            elif char.isdigit():
-                # Shift numbers
-                result += chr((ord(char) - ord("0") + n) % 10 + ord("0"))
-            else:
-                # Keep spaces unchanged
-                result += char
-        return result
+    def text_reply(self, line: bytes) -> bytes:
+        """
+        Wraps a text reply line in a frame for binary clients.
+        """
+        if self.binary:
+            return wire.encode_text(line)
+        return line
+
+    def encrypt(self, msg: str, n: int) -> str:
+        return cipher.encrypt(msg, n)
 
     def decrypt(self, msg: str, n: int) -> str:
-        return self.encrypt(msg, -n)
+        return cipher.decrypt(msg, n)
 
     def send_encrypted_data(self, conn, to, n: int, encrypted_msg: str):
         conn.sendto(self.encrypt(f"{encrypted_msg} {n}\r\n", n).encode("utf-8"), to)
 
+    def is_blocking(self, data: bytes) -> bool:
+        """
+        Tells if processing the message may block on the database or the bank,
+        HI is the only command answered without touching either of them.
+        """
+        if self.pending_order is not None:
+            return True
+        return data.split()[:1] != [b"HI"]
+
+    def frame(self, data: bytes | memoryview) -> list[bytes] | None:
+        """
+        Adds bytes received from the client to the buffer.
+
+        Args:
+            data (bytes | memoryview): The bytes received, copied before returning.
+
+        Returns:
+            list[bytes] | None: The complete lines, or None if the client sent a line
+                longer than the limit, which must be answered with `error_reply(253)`
+                before closing the connection.
+        """
+        try:
+            return self.buffer.feed(data)
+        except LineTooLong:
+            self.handle_error(253)
+            self.closed = True
+            return None
+
+    def process_lines(self, lines: list[bytes]) -> bytes:
+        """
+        Runs pipelined lines back to back.
+
+        Returns:
+            bytes: The replies of every line joined, to be sent at once.
+        """
+        # Another worker changed the catalog, cached rows may be stale
+        if WORKERS is not None and WORKERS.poll_changes():
+            STORE.invalidate()
+            HUB.on_change(None)
+
+        replies = self.__replies
+        for line in lines:
+            replies.append(self.process(line))
+            if self.closed:
+                break
+        reply = b"".join(replies)
+        replies.clear()
+        return reply
+
+    def __wake(self):
+        if self.wake is not None:
+            self.wake()
+
+    @property
+    def watching(self) -> bool:
+        subscription = self.subscription
+        return subscription is not None and (
+            subscription.everything or bool(subscription.uuids)
+        )
+
+    def pushes(self) -> bytes:
+        """
+        Takes the updates queued for the liquors this client watches.
+
+        Returns:
+            bytes: 'UPDATE [uuid, stock, price]' or 'RELOAD' lines, may be empty.
+        """
+        if self.subscription is None:
+            return b""
+        return b"".join(self.text_reply(line) for line in self.subscription.drain())
+
+    def release(self):
+        # Disconnected between the quote and the payment
+        STORE.release(self.reservation)
+        self.reservation = None
+        if self.subscription is not None:
+            HUB.close(self.subscription)
+            self.subscription = None
+
+    def stream(self, data: bytes):
+        """
+        Sends part of a reply right away, after the replies batched before it.
+        """
+        self.__replies.append(data)
+        if self.write is None:
+            return
+
+        pending = b"".join(self.__replies)
+        self.__replies.clear()
+        self.write(pending)
+
+    def process(self, data: bytes) -> bytes:
+        """
+        Runs a message received from the client.
+
+        Args:
+            data (bytes): The raw message received from the client.
+
+        Returns:
+            bytes: The reply to send back to the client, may be empty.
+        """
+        # The message after a quoted BUY or CART is the payment for it
+        if self.pending_order is not None:
+            order, self.pending_order = self.pending_order, None
+            reservation, self.reservation = self.reservation, None
+            try:
+                return self.pay(order, data, reservation)
+            finally:
+                # Unpaid, the held stock goes back on sale, a no-op once sold
+                STORE.release(reservation)
+
+        # Extracts command and data from input
+        message = data.decode("utf-8")
+
+        # Checks non-empty message
+        if len(message) <= 2:
+            LOGGER.warning("Empty message")
+            return b""
+
+        command, *arguments = message.split()
+
+        # Turned away before doing any work, throttled requests are only counted
+        if LIMITER is not None and not LIMITER.allow(self.client_address[0], command):
+            return self.error_reply(249)
+
+        cmd = Command(command, arguments, self.binary, self.admin)
+        cmd.debug()
+        LOGGER.info(
+            "Command %s issued by %s", command, self.client_address, extra=SAMPLED
+        )
+
+        error_code, cmd_return = cmd.fn()
+
+        if error_code != 0:
+            self.handle_error(error_code)
+            return self.error_reply(error_code)
+
+        match command:
+            case "HI" if arguments:
+                # Acknowledged in text, every reply after this one is a frame, so a
+                # client already in binary mode gets the acknowledgement framed
+                reply = self.text_reply(b"OK BIN\r\n")
+                self.binary = True
+                return reply
+
+            case "LIST" if self.binary:
+                if "stream=1" in arguments:
+                    return self.stream_list(arguments)
+                return wire.encode_list(cmd_return, connected_users(), OWNER_UUID)
+
+            case "LIST" if arguments:
+                if "stream=1" in arguments:
+                    return self.stream_list(arguments)
+
+                # Splice connected users and owner's bank account's UUID at the end
+                # of the page
+                return b"".join(
+                    (
+                        b"OK ",
+                        cmd_return[:-1].encode("utf-8"),
+                        f', "users": {connected_users()}, "owner": {OWNER_UUID_JSON}}}\r\n'.encode(),
+                    )
+                )
+
+            case "LIST":
+                # Splice connected users and owner's bank account's UUID after the
+                # already serialized catalog
+                return b"".join(
+                    (
+                        b"OK ",
+                        STORE.list_prefix(),
+                        f"{connected_users()}, {OWNER_UUID_JSON}]\r\n".encode(),
+                    )
+                )
+
+            case "BUY":
+                uuid = arguments[0]
+                error_code, price = STORE.get_liquor_price(uuid)
+                # The bottle is held until paid, so it's never quoted to two buyers
+                error_code, self.reservation = STORE.reserve({uuid: 1})
+                if error_code != 0:
+                    self.handle_error(error_code)
+                    return self.error_reply(error_code)
+                self.pending_order = {uuid: 1}
+                if self.binary:
+                    return wire.encode_quote(float(price))
+                return self.ok_reply(f"{cmd_return}{price}")
+
+            case "CART":
+                # Quoted the total price of the whole cart
+                cart = STORE.parse_cart(*arguments)
+                error_code, self.reservation = STORE.reserve(cart)
+                if error_code != 0:
+                    self.handle_error(error_code)
+                    return self.error_reply(error_code)
+                self.pending_order = cart
+                if self.binary:
+                    return wire.encode_quote(float(cmd_return))
+                return self.ok_reply(cmd_return)
+
+            case "STATS" | "TOP" | "SALES":
+                return self.ok_reply(cmd_return)
+
+            case "AUTH":
+                self.admin = True
+                return self.ok_reply(cmd_return)
+
+            case "RESTOCK" | "REPRICE":
+                return self.ok_reply(cmd_return)
+
+            case "WATCH":
+                if self.subscription is None:
+                    self.subscription = HUB.subscribe(self.__wake)
+                HUB.watch(self.subscription, arguments)
+                if self.subscription.everything:
+                    return self.ok_reply("*")
+                return self.ok_reply(len(self.subscription.uuids))
+
+            case "UNWATCH":
+                if self.subscription is not None:
+                    HUB.unwatch(self.subscription, arguments)
+                    if self.subscription.everything:
+                        return self.ok_reply("*")
+                    return self.ok_reply(len(self.subscription.uuids))
+                return self.ok_reply(0)
+
+        return b""
+
+    def stream_list(self, options: list[str]) -> bytes:
+        """
+        Sends a filtered listing in chunks as they're read from the DB, one
+        'MORE <JSON array>' line each, and returns the closing line with the
+        connected users and the owner's bank account's UUID.
+
+        Binary clients get a LIST frame flagged MORE per chunk instead, and a last
+        one without liquors.
+        """
+        if self.binary:
+            for page in STORE.iter_list_chunks(
+                *options, chunk_size=LIST_CHUNK_SIZE, binary=True
+            ):
+                self.stream(
+                    wire.encode_list(page, connected_users(), OWNER_UUID, more=True)
+                )
+            return wire.encode_list(wire.encode_page([]), connected_users(), OWNER_UUID)
+
+        for chunk in STORE.iter_list_chunks(*options, chunk_size=LIST_CHUNK_SIZE):
+            self.stream(f"MORE {chunk}\r\n".encode("utf-8"))
+        return f"OK [{connected_users()}, {OWNER_UUID_JSON}]\r\n".encode()
+
+    def pay(
+        self, order: dict[str, int], data: bytes, reservation: Reservation | None = None
+    ) -> bytes:
+        """
+        Forwards the encrypted payment of a quoted BUY or CART to the bank, relays
+        its answer to the client and hands over the liquors if the bank approved it.
+
+        Args:
+            order (dict[str, int]): The quantity of each liquor being bought.
+            data (bytes): The encrypted payment message sent by the client.
+            reservation (Reservation | None): The stock held for the order.
+
+        Returns:
+            bytes: The reply to send back to the client, may be empty.
+        """
+        # Forwards message to bank (encrypted)
+        start = perf_counter()
+        try:
+            data = BANK.request(data)
+        except OSError as error:
+            # Timed out or unreachable
+            METRICS.record("bank", "request", perf_counter() - start, 255)
+            LOGGER.warning("Bank request failed: %s", error)
+            self.handle_error(255)
+            return self.error_reply(255)
+        bank_latency = perf_counter() - start
+
+        # Decrypt the data straight from the received bytes
+        LOGGER.debug("Encrypted message: %r", data, extra=SAMPLED)
+
+        # The shift number is the last word, found without splitting the message
+        end = len(data)
+        while end and data[end - 1] in b" \t\r\n":
+            end -= 1
+        if not end:
+            LOGGER.warning("Empty message")
+            self.closed = True
+            return b""
+
+        start = data.rfind(b" ", 0, end) + 1
+        n = data[start:end]
+
+        # Handle bad cypher decode number
+        if not n.isdigit():
+            LOGGER.warning("Bad cypher")
+            self.closed = True
+            return b""
+
+        # Decrypt the message before it using the decode number
+        message_end = max(start - 1, 0)
+        while message_end and data[message_end - 1] in b" \t":
+            message_end -= 1
+        processed_data = cipher.decrypt_bytes(data[:message_end], int(n))
+        LOGGER.debug("Decrypted message: %r", processed_data, extra=SAMPLED)
+
+        # Record the bank's error code, if any
+        bank_error = processed_data.split()[1:2] if processed_data.startswith(b"ERR") else []
+        METRICS.record(
+            "bank",
+            "request",
+            bank_latency,
+            int(bank_error[0]) if bank_error and bank_error[0].isdigit() else 0,
+        )
+
+        # Tell the user the response
+        reply = self.text_reply(processed_data + b"\r\n")
+
+        if processed_data.startswith(b"OK"):
+            # Decrement stock of the whole order at once
+            error_code, _ = STORE.substract_cart(order, reservation)
+            if error_code != 0:
+                self.handle_error(error_code)
+                return reply + self.error_reply(error_code)
+
+            liquor_names = []
+            for uuid, quantity in order.items():
+                error_code, liquor_name = STORE.get_liquor_name(uuid)
+                liquor_names.append(
+                    liquor_name if quantity == 1 else f"{quantity} {liquor_name}"
+                )
+            if SALES is not None:
+                # The price quoted, unless a REPRICE landed while paying
+                prices = {
+                    uuid: float(STORE.get_liquor_price(uuid)[1] or 0) for uuid in order
+                }
+                SALES.record(order, prices)
+            reply += self.text_reply(
+                f"Here, enjoy your {', '.join(liquor_names)}\r\n".encode("utf-8")
+            )
+
+        return reply
+
+
+class LiquorStoreTCPServerHandler(BaseRequestHandler):
+    """
+    Threaded engine, serves each connection on its own OS thread blocking on `recv`.
+    """
+
+    def setup(self):
+        # Every recv lands in the same buffer, lines are copied out of a view of it
+        self.buffer = bytearray(RECV_BUFFER_SIZE)
+        self.view = memoryview(self.buffer)
+        self.session = LiquorStoreSession(self.client_address)
+        self.session.write = self.request.sendall
+        self.session.wake = self.wake
+        # Created on the first WATCH, wakes the thread waiting in select
+        self.wakeup: tuple[socket.socket, socket.socket] | None = None
+        # Shutting the socket down wakes the thread blocked on recv
+        self.info = SESSIONS.open(
+            self.client_address,
+            lambda: self.request.shutdown(SHUT_RDWR),
+            # Replies can still be sent, recv returns nothing once they are
+            drain=lambda: self.request.shutdown(SHUT_RD),
+            watching=lambda: self.session.watching,
+        )
+
     def handle(self):
-        LOGGER.info(f"Accepted connection from {self.client_address}")
-        connected_users.append(self.client_address)
+        if self.info is None:
+            LOGGER.warning("Rejected connection from %s", self.client_address)
+            self.request.sendall(self.session.error_reply(250))
+            return
+
+        LOGGER.info("Accepted connection from %s", self.client_address, extra=SAMPLED)
+
+        while not self.session.closed:
+            if self.session.subscription is not None:
+                # Watching, wait for the client or for updates to push
+                if self.wakeup is None:
+                    self.wakeup = socket.socketpair()
+                    self.wakeup[1].setblocking(False)
+                pushes = self.session.pushes()
+                if pushes:
+                    self.request.sendall(pushes)
+                ready, _, _ = select([self.request, self.wakeup[0]], [], [])
+                if self.wakeup[0] in ready:
+                    self.wakeup[0].recv_into(self.buffer)
+                if self.request not in ready:
+                    continue
+
+            try:
+                size = self.request.recv_into(self.buffer)
+            except OSError:
+                # Closed by the reaper or the drain while waiting
+                break
+
+            # Check if client disconnected
+            if not size:
+                break
+
+            lines = self.session.frame(self.view[:size])
+            if lines is None:
+                self.request.sendall(self.session.error_reply(253))
+                break
+
+            SESSIONS.touch(self.info, len(lines))
+            reply = self.session.process_lines(lines)
+            if reply:
+                self.request.sendall(reply)
+            SESSIONS.touch(self.info)
+
+        LOGGER.info("Finished connection from %s", self.client_address, extra=SAMPLED)
+
+    def wake(self):
+        wakeup = self.wakeup
+        if wakeup is None:
+            # Not waiting yet, the updates are sent before the first select
+            return
+        try:
+            wakeup[1].send(b"\0")
+        except OSError:
+            # Buffer full, the thread is already awake
+            pass
+
+    def finish(self):
+        # Runs even if handle crashed, so sessions never leak
+        if self.info is not None:
+            SESSIONS.close(self.info)
+        self.session.release()
+        self.view.release()
+        if self.wakeup is not None:
+            for end in self.wakeup:
+                end.close()
+
+
+class LiquorStoreTCPServer(ThreadingTCPServer):
+    """
+    Threaded engine server, rejects connections over the limit before spawning a
+    thread for them.
+    """
+
+    request_queue_size = LISTEN_BACKLOG
+
+    # A thread stuck on a dead socket must not hang the exit, __main__ waits for
+    # the connections through SESSIONS.drain, which gives up after its timeout
+    daemon_threads = True
+
+    # Set by __main__ in worker mode, so every worker can bind the same port
+    reuse_port = False
+
+    def server_bind(self):
+        if self.reuse_port:
+            self.socket.setsockopt(SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+
+    def verify_request(self, request, client_address) -> bool:
+        if SESSIONS.max_connections and len(SESSIONS) >= SESSIONS.max_connections:
+            try:
+                request.sendall(ERROR_REPLIES[250])
+            except OSError:
+                pass
+            return False
+        return True
+
+
+async def handle_async_connection(
+    reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+):
+    """
+    Asyncio engine, serves a connection as a coroutine on the event loop.
 
+    Idle connections only cost a coroutine and its buffers, messages that touch
+    SQLite or the bank are processed on the default executor so they never block
+    the event loop.
+    """
+    client_address = writer.get_extra_info("peername")
+    session = LiquorStoreSession(client_address)
+    loop = asyncio.get_running_loop()
+
+    async def write_and_drain(data: bytes):
+        writer.write(data)
+        await writer.drain()
+
+    # Streamed replies are written from the executor, waiting for the buffer to
+    # drain so a slow client doesn't pile the whole listing up in memory
+    session.write = lambda data: asyncio.run_coroutine_threadsafe(
+        write_and_drain(data), loop
+    ).result()
+
+    # Updates for a WATCH are written by their own task, started on the first one
+    pushed = asyncio.Event()
+    pusher: asyncio.Task | None = None
+    session.wake = lambda: loop.call_soon_threadsafe(pushed.set)
+
+    async def push():
         while True:
-            # Extracts command and data from input
-            data = self.request.recv(4096).decode("utf-8")
+            await pushed.wait()
+            pushed.clear()
+            data = session.pushes()
+            if data:
+                writer.write(data)
+                await writer.drain()
+
+    info = SESSIONS.open(
+        client_address,
+        lambda: loop.call_soon_threadsafe(writer.close),
+        # Lines already received are processed, then the read loop ends
+        drain=lambda: loop.call_soon_threadsafe(reader.feed_eof),
+        watching=lambda: session.watching,
+    )
+    if info is None:
+        LOGGER.warning("Rejected connection from %s", client_address)
+        writer.write(session.error_reply(250))
+        writer.close()
+        return
+
+    LOGGER.info("Accepted connection from %s", client_address, extra=SAMPLED)
+
+    try:
+        while not session.closed:
+            data = await reader.read(4096)
 
             # Check if client disconnected
             if not data:
-                LOGGER.info(f"Finished connection from {self.client_address}")
-                connected_users.remove(self.client_address)
                 break
 
-            # Checks non-empty message
-            if len(data) <= 2:
-                LOGGER.warning("Empty message")
-                continue
+            lines = session.frame(data)
+            if lines is None:
+                writer.write(session.error_reply(253))
+                await writer.drain()
+                break
 
-            command, *arguments = data.split()
-            cmd = Command(command, arguments)
-            cmd.debug()
-            LOGGER.info(f"Command {command} issued by {self.client_address}")
+            SESSIONS.touch(info, len(lines))
+            if any(session.is_blocking(line) for line in lines):
+                reply = await loop.run_in_executor(None, session.process_lines, lines)
+            else:
+                reply = session.process_lines(lines)
 
-            error_code, cmd_return = cmd.fn()
+            if reply:
+                writer.write(reply)
+                await writer.drain()
+            SESSIONS.touch(info)
 
-            if error_code != 0:
-                self.handle_error(error_code)
-                self.send_error_code(error_code)
-                continue
-
-            if command == "LIST":
-                # Talk to client
-                parsed_json = loads(cmd_return)
-                # Add connected users
-                parsed_json.append(len(connected_users))
-                # Add owner's bank account's UUID
-                parsed_json.append(OWNER_UUID)
-                self.send_ok_data(dumps(parsed_json))
-
-            elif command == "BUY":
-                uuid = arguments[0]
-                error_code, price = STORE.get_liquor_price(uuid)
-                self.send_ok_data(f"{cmd_return}{price}")
+            if session.subscription is not None and pusher is None:
+                pusher = asyncio.create_task(push())
+                # Updates queued before the task existed
+                pushed.set()
 
-                # Extracts command and data from input
-                data = self.request.recv(4096)
+    except ConnectionError:
+        pass
 
-                # Forwards message to bank (encrypted)
-                UDP_SOCKET.sendto(data, (BANK_IP, int(BANK_PORT)))
+    finally:
+        LOGGER.info("Finished connection from %s", client_address, extra=SAMPLED)
+        if pusher is not None:
+            pusher.cancel()
+        session.release()
+        SESSIONS.close(info)
+        writer.close()
 
-                data, _ = UDP_SOCKET.recvfrom(4096)
 
-                # Decode the data and decrypt it
-                decoded_data = data.decode("utf-8")
-                LOGGER.debug(f"Encrypted message: {decoded_data}")
+async def serve_asyncio(
+    host: str, port: int, reuse_port: bool = False, drain_timeout: float = 5.0
+):
+    """
+    Runs the asyncio engine until SIGINT or SIGTERM, then drains the connections.
+    """
+    server = await asyncio.start_server(
+        handle_async_connection,
+        host,
+        port,
+        backlog=LISTEN_BACKLOG,
+        reuse_port=reuse_port or None,
+    )
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    for signum in (SIGINT, SIGTERM):
+        try:
+            loop.add_signal_handler(signum, stop.set)
+        except NotImplementedError:
+            # Windows, Ctrl+C raises KeyboardInterrupt instead
+            pass
 
-                if len(decoded_data) <= 1:
-                    LOGGER.warning("Empty message")
-                    self.finish()
-                    return
+    async with server:
+        await stop.wait()
+        LOGGER.warning("Stopping server, please wait...")
+        server.close()
+        await loop.run_in_executor(None, SESSIONS.drain, drain_timeout)
 
-                n = decoded_data.split()[-1]
 
-                # Handle bad cypher decode number
-                if not n.isdigit():
-                    LOGGER.warning("Bad cypher")
-                    self.finish()
-                    return
+def stop_on_signal(server: LiquorStoreTCPServer):
+    """
+    Makes SIGINT and SIGTERM return `server` from serve_forever.
 
-                # Decrypt using the decode number
-                decrypted_data = self.decrypt(decoded_data, int(n))
-                processed_data = " ".join(decrypted_data.split()[:-1])
-                LOGGER.debug(f"Decrypted message: {processed_data}")
+    shutdown waits for serve_forever, so it's called from a helper thread, and the
+    handler never raises inside serve_forever, where an exception could close the
+    socket of a connection just handed to its thread. A second signal gets the
+    default handling and ends the process.
+    """
 
-                # Tell the user the response
-                self.request.sendall(f"{processed_data}\r\n".encode("utf-8"))
+    def stop(signum, frame):
+        signal(SIGINT, SIG_DFL)
+        signal(SIGTERM, SIG_DFL)
+        Thread(target=server.shutdown, name="shutdown", daemon=True).start()
 
-                if processed_data.startswith("OK"):
-                    error_code, liquor_name = STORE.get_liquor_name(uuid)
-                    self.request.sendall(
-                        f"Here, enjoy your {liquor_name}\r\n".encode("utf-8")
-                    )
-                    # Decrement stock
-                    STORE.substract_stock(uuid)
+    for signum in (SIGINT, SIGTERM):
+        signal(signum, stop)
 
-                # Answer to client
 
-        # connected_users.remove(self.client_address)
-        self.finish()
+def close_store(snapshot_path: str | None):
+    """
+    Commits the stock and sales since the last flush and saves the catalog snapshot,
+    once no connection is left.
+    """
+    if LEDGER is not None:
+        LEDGER.close()
+    if SALES is not None:
+        SALES.close()
+    # Workers share the catalog, the first one saves it
+    if snapshot_path and (WORKERS is None or WORKERS.index == 0):
+        try:
+            size = save_snapshot(snapshot_path, STORE, DATABASE)
+            LOGGER.info("Saved a catalog snapshot of %d bytes", size)
+        except (OSError, SnapshotError) as error:
+            LOGGER.warning("Catalog snapshot not saved: %s", error)
+
+
+def raise_open_files_limit():
+    """
+    Raises the soft limit of open file descriptors to the hard limit, every
+    connection of the asyncio engine holds one.
+    """
+    try:
+        from resource import RLIMIT_NOFILE, getrlimit, setrlimit
+
+        soft, hard = getrlimit(RLIMIT_NOFILE)
+        if soft < hard:
+            setrlimit(RLIMIT_NOFILE, (hard, hard))
+    except (ImportError, ValueError, OSError):
+        pass
+
+
+def parse_args(args: list[str]) -> Namespace:
+    parser = ArgumentParser(prog="server.py")
+    parser.add_argument("liquor_store_server_IP")
+    parser.add_argument("liquor_store_port", type=int)
+    parser.add_argument("bank_IP")
+    parser.add_argument("bank_port", type=int)
+    parser.add_argument(
+        "--engine",
+        choices=["threaded", "asyncio"],
+        default="threaded",
+        help="I/O engine serving the connections (default: threaded)",
+    )
+    parser.add_argument(
+        "--bank-timeout",
+        type=float,
+        default=5.0,
+        help="seconds to wait for each bank reply (default: 5)",
+    )
+    parser.add_argument(
+        "--bank-retries",
+        type=int,
+        default=0,
+        help="times a payment is sent again after a bank timeout (default: 0)",
+    )
+    parser.add_argument(
+        "--max-line-length",
+        type=int,
+        default=MAX_LINE_LENGTH,
+        help=f"maximum bytes of a client line (default: {MAX_LINE_LENGTH})",
+    )
+    parser.add_argument(
+        "--max-connections",
+        type=int,
+        default=0,
+        help="connections served at once, 0 for no limit (default: 0)",
+    )
+    parser.add_argument(
+        "--idle-timeout",
+        type=float,
+        default=0,
+        help="seconds before an idle connection is closed, 0 to never (default: 0)",
+    )
+    parser.add_argument(
+        "--db-path",
+        default=f"{get_project_root()}/db/liquor_store.db",
+        help="SQLite database of the catalog (default: db/liquor_store.db)",
+    )
+    parser.add_argument(
+        "--catalog-snapshot",
+        metavar="PATH",
+        help="file the catalog is saved to on shutdown and loaded from on start, "
+        "if the database didn't change meanwhile",
+    )
+    parser.add_argument(
+        "--db-shards",
+        type=int,
+        default=1,
+        help="SQLite files the catalog is split in by UUID (default: 1)",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=0,
+        help="port serving Prometheus metrics at /metrics, 0 to disable (default: 0)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="processes serving the port, each with its own listener (default: 1)",
+    )
+    parser.add_argument(
+        "--drain-timeout",
+        type=float,
+        default=5.0,
+        help="seconds connections get to finish when stopping (default: 5)",
+    )
+    parser.add_argument(
+        "--stock-ledger",
+        choices=DURABILITIES,
+        help="batch stock decrements in memory and commit them in groups, "
+        "strict waits for the commit, group and relaxed don't (default: disabled)",
+    )
+    parser.add_argument(
+        "--ledger-flush-ms",
+        type=float,
+        default=5.0,
+        help="milliseconds between ledger commits in strict and group (default: 5)",
+    )
+    parser.add_argument(
+        "--ledger-flush-ops",
+        type=int,
+        default=256,
+        help="purchases that trigger a ledger commit right away (default: 256)",
+    )
+    parser.add_argument(
+        "--log-level",
+        type=str.upper,
+        choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"],
+        help="minimum level logged (default: $LIQUOR_STORE_LOG_LEVEL or DEBUG)",
+    )
+    parser.add_argument(
+        "--log-sample",
+        type=int,
+        help="log one in every N per-connection and per-command lines "
+        "(default: $LIQUOR_STORE_LOG_SAMPLE or 1)",
+    )
+    parser.add_argument(
+        "--admin-token",
+        default=os.environ.get("LIQUOR_STORE_ADMIN_TOKEN"),
+        help="token clients send with AUTH to use RESTOCK and REPRICE "
+        "(default: $LIQUOR_STORE_ADMIN_TOKEN, disabled if unset)",
+    )
+    parser.add_argument(
+        "--reservation-ttl",
+        type=float,
+        help="seconds the stock quoted by BUY or CART is held waiting for the "
+        "payment, 0 to hold nothing (default: 30, 0 with --workers)",
+    )
+    parser.add_argument(
+        "--rate-limit",
+        action="append",
+        default=[],
+        metavar="COMMAND=RATE[/BURST]",
+        help="requests a second each client IP may send of a command, * for any "
+        "command without its own limit, over-limit requests get ERR 249",
+    )
+    parser.add_argument(
+        "--global-rate-limit",
+        action="append",
+        default=[],
+        metavar="COMMAND=RATE[/BURST]",
+        help="requests a second of a command the server accepts from every client",
+    )
+    parser.add_argument(
+        "--sales-db",
+        help="SQLite file the sales reported by TOP and SALES are saved to, empty to "
+        "keep them in memory (default: sales.db next to --db-path)",
+    )
+    parser.add_argument(
+        "--sales-flush-seconds",
+        type=float,
+        default=10.0,
+        help="seconds between writes of the sales to --sales-db (default: 10)",
+    )
+    parsed = parser.parse_args(args)
+    if parsed.workers > 1 and not (
+        hasattr(os, "fork") and hasattr(socket, "SO_REUSEPORT")
+    ):
+        parser.error("--workers needs a platform with fork and SO_REUSEPORT")
+    if parsed.workers > 1 and parsed.stock_ledger:
+        parser.error("--stock-ledger holds stock in memory, it needs a single worker")
+    # Each worker would hold the last bottle for a different buyer
+    if parsed.reservation_ttl is None:
+        parsed.reservation_ttl = 0.0 if parsed.workers > 1 else 30.0
+    if parsed.workers > 1 and parsed.reservation_ttl > 0:
+        parser.error(
+            "--reservation-ttl holds stock in memory, it needs a single worker"
+        )
+    if parsed.db_shards < 1:
+        parser.error("--db-shards must be at least 1")
+    # Sales belong to the catalog they were made from, not to the project
+    if parsed.sales_db is None:
+        parsed.sales_db = os.path.join(os.path.dirname(parsed.db_path), "sales.db")
+    try:
+        parsed.rate_limit = parse_limits(parsed.rate_limit)
+        parsed.global_rate_limit = parse_limits(parsed.global_rate_limit)
+    except ValueError as error:
+        parser.error(str(error))
+    return parsed
 
 
 if __name__ == "__main__":
+    # Extract arguments
+    ARGS = parse_args(argv[1:])
+    LIQUOR_STORE_SERVER_IP = ARGS.liquor_store_server_IP
+    LIQUOR_STORE_PORT = ARGS.liquor_store_port
+    BANK_IP = ARGS.bank_IP
+    BANK_PORT = ARGS.bank_port
+    MAX_LINE_LENGTH = ARGS.max_line_length
+
+    # Fork the workers before any thread is started
+    if ARGS.workers > 1:
+        WORKERS = WorkerPool(ARGS.workers)
+        if WORKERS.fork() is None:
+            LOGGER = setup_logger(ARGS.log_level, ARGS.log_sample)
+            LOGGER.info(
+                "Started %d workers on %s:%d",
+                ARGS.workers,
+                LIQUOR_STORE_SERVER_IP,
+                LIQUOR_STORE_PORT,
+            )
+            exit_code = WORKERS.wait()
+            LOGGER.warning("Every worker stopped")
+            exit(exit_code)
+
+        SESSIONS.on_change = WORKERS.set_users
+        LiquorStoreTCPServer.reuse_port = True
+
     # Enable logger and configure it
-    LOGGER = setup_logger()
+    LOGGER = setup_logger(ARGS.log_level, ARGS.log_sample)
+
+    # SIGTERM stops the server like Ctrl+C
+    signal(SIGTERM, default_int_handler)
 
-    # Check correct number or arguments
-    if len(argv) != 5:
+    SESSIONS.max_connections = ARGS.max_connections
+    SESSIONS.idle_timeout = ARGS.idle_timeout
+    SESSIONS.start_reaper()
+
+    if ARGS.metrics_port:
+        # Each worker serves its own metrics on the next port
+        metrics_port = ARGS.metrics_port + (WORKERS.index if WORKERS else 0)
+        start_metrics_server(LIQUOR_STORE_SERVER_IP, metrics_port)
         LOGGER.info(
-            "Usage: server.py <liquor_store_server_IP> <liquor_store_port> <bank_IP> <bank_port>"
+            "Metrics served on http://%s:%d/metrics",
+            LIQUOR_STORE_SERVER_IP,
+            metrics_port,
         )
-        exit(1)
-
-    # Extract arguments
-    LIQUOR_STORE_SERVER_IP, LIQUOR_STORE_PORT, BANK_IP, BANK_PORT = argv[1:]
 
     # Declare global variables and initialize them
     global STORE, OWNER_UUID
-    STORE = LiquorStore()
+    if ARGS.db_shards > 1:
+        DATABASE = ShardedLiquorDatabase(ARGS.db_path, ARGS.db_shards)
+    else:
+        DATABASE = LiquorDatabase(ARGS.db_path)
+    if ARGS.stock_ledger:
+        LEDGER = StockLedger(
+            DATABASE,
+            durability=ARGS.stock_ledger,
+            flush_interval=ARGS.ledger_flush_ms / 1000,
+            flush_ops=ARGS.ledger_flush_ops,
+        )
+    if ARGS.reservation_ttl > 0:
+        RESERVATIONS = ReservationBook(ttl=ARGS.reservation_ttl)
+    STORE = LiquorStore(DATABASE, ledger=LEDGER, reservations=RESERVATIONS)
+    HUB = WatchHub(DATABASE, ledger=LEDGER)
+    if ARGS.catalog_snapshot:
+        start = perf_counter()
+        try:
+            size = load_snapshot(ARGS.catalog_snapshot, STORE, DATABASE)
+            LOGGER.info(
+                "Loaded a catalog snapshot of %d bytes in %.1f ms",
+                size,
+                (perf_counter() - start) * 1000,
+            )
+        except (OSError, SnapshotError) as error:
+            LOGGER.warning("Catalog snapshot not loaded: %s", error)
+    if ARGS.rate_limit or ARGS.global_rate_limit:
+        LIMITER = RateLimiter(ARGS.rate_limit, ARGS.global_rate_limit)
+    ADMIN_TOKEN = ARGS.admin_token
+    SALES = SalesAggregator(
+        ARGS.sales_db or None, flush_interval=ARGS.sales_flush_seconds
+    )
     OWNER_UUID = "4e0d3bbc-fac8-4a28-909a-752f65cf9c6c"
+    OWNER_UUID_JSON = dumps(OWNER_UUID)
+
+    # Stock decrements are checked by SQLite across processes, only the caches
+    # need to hear about changes committed by other workers
+    if WORKERS is not None:
+        DATABASE.add_listener(WORKERS.record_change)
+
+    BANK = BankGateway(
+        (BANK_IP, BANK_PORT), timeout=ARGS.bank_timeout, retries=ARGS.bank_retries
+    )
+
+    if ARGS.engine == "asyncio":
+        raise_open_files_limit()
+        try:
+            LOGGER.info(
+                "Asyncio TCP Server listening on %s:%d",
+                LIQUOR_STORE_SERVER_IP,
+                LIQUOR_STORE_PORT,
+            )
+            asyncio.run(
+                serve_asyncio(
+                    LIQUOR_STORE_SERVER_IP,
+                    LIQUOR_STORE_PORT,
+                    reuse_port=WORKERS is not None,
+                    drain_timeout=ARGS.drain_timeout,
+                )
+            )
+
+        except KeyboardInterrupt:
+            # Empty print to not have the ^C in the same line as the warn
+            print("")
+            LOGGER.warning("Stopping server, please wait...")
+
+        close_store(ARGS.catalog_snapshot)
+        exit(0)
 
     # Create servers
-    TCP_SERVER = ThreadingTCPServer(
-        (LIQUOR_STORE_SERVER_IP, int(LIQUOR_STORE_PORT)), LiquorStoreTCPServerHandler
+    TCP_SERVER = LiquorStoreTCPServer(
+        (LIQUOR_STORE_SERVER_IP, LIQUOR_STORE_PORT), LiquorStoreTCPServerHandler
     )
-    UDP_SOCKET = socket(AF_INET, SOCK_DGRAM)
 
-    try:
-        LOGGER.info(
-            f"TCP Server listening on {LIQUOR_STORE_SERVER_IP}:{LIQUOR_STORE_PORT}"
-        )
-        TCP_SERVER.serve_forever()
+    stop_on_signal(TCP_SERVER)
+    LOGGER.info(
+        "TCP Server listening on %s:%d", LIQUOR_STORE_SERVER_IP, LIQUOR_STORE_PORT
+    )
+    TCP_SERVER.serve_forever()
 
-    except KeyboardInterrupt:
-        # Empty print to not have the ^C in the same line as the warn
-        print("")
-        LOGGER.warning("Stopping server, please wait...")
+    # Empty print to not have the ^C in the same line as the warn
+    print("")
+    LOGGER.warning("Stopping server, please wait...")
+
+    # Let connections finish their commands, the ones left are closed
+    SESSIONS.drain(ARGS.drain_timeout)
+    TCP_SERVER.server_close()
 
-        # Shutdown server
-        TCP_SERVER.shutdown()
+    close_store(ARGS.catalog_snapshot)
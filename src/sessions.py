@@ -0,0 +1,214 @@
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from threading import Event, Lock, Thread
+from time import monotonic, sleep, time
+from typing import Callable
+
+
+@dataclass
+class SessionInfo:
+    """
+    Metadata of a connected client.
+
+    Attributes:
+        client_address (tuple): The address of the client.
+        close (Callable[[], None]): Closes the connection from any thread, making the
+            engine serving it finish the session.
+        connected_at (float): Epoch seconds when the client connected.
+        last_activity (float): Monotonic seconds of the last message received.
+        commands (int): Number of commands issued.
+        drain (Callable[[], None] | None): Makes the engine finish the session after
+            the command in progress is answered, from any thread. Defaults to close.
+        watching (Callable[[], bool] | None): Tells if the client waits for WATCH
+            updates, such a client is never reaped as idle.
+    """
+
+    client_address: tuple
+    close: Callable[[], None] = field(repr=False)
+    connected_at: float = field(default_factory=time)
+    last_activity: float = field(default_factory=monotonic)
+    commands: int = 0
+    drain: Callable[[], None] | None = field(default=None, repr=False)
+    watching: Callable[[], bool] | None = field(default=None, repr=False)
+
+
+class SessionRegistry:
+    """
+    Thread-safe registry of the connected clients.
+
+    Sessions are kept ordered by last activity, so counting them is constant time
+    and reaping the idle ones only visits the sessions that timed out.
+
+    Attributes:
+        max_connections (int): Connections accepted at once, 0 for no limit.
+        idle_timeout (float): Seconds without messages before a connection is
+            closed, 0 to never close them.
+        on_change (Callable[[int], None] | None): Called with the number of
+            connected clients whenever it changes.
+
+    Methods:
+        open(client_address: tuple, close: Callable) -> SessionInfo | None: Registers a client.
+        touch(info: SessionInfo, commands: int): Records activity of a client.
+        close(info: SessionInfo): Unregisters a client.
+        reap() -> int: Closes the idle connections.
+        start_reaper(): Reaps idle connections periodically on a background thread.
+        drain(timeout: float) -> int: Finishes every session for a graceful shutdown.
+    """
+
+    def __init__(self, max_connections: int = 0, idle_timeout: float = 0):
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+        self.on_change: Callable[[int], None] | None = None
+        self.__sessions: OrderedDict[int, SessionInfo] = OrderedDict()
+        self.__lock = Lock()
+        self.__rejected = 0
+        self.__reaped = 0
+        self.__stop = Event()
+
+    def __len__(self) -> int:
+        return len(self.__sessions)
+
+    def open(
+        self,
+        client_address: tuple,
+        close: Callable[[], None],
+        drain: Callable[[], None] | None = None,
+        watching: Callable[[], bool] | None = None,
+    ) -> SessionInfo | None:
+        """
+        Registers a new client.
+
+        Returns:
+            SessionInfo | None: The session of the client, or None if the server is
+                full and the connection must be rejected.
+        """
+        with self.__lock:
+            if self.max_connections and len(self.__sessions) >= self.max_connections:
+                self.__rejected += 1
+                return None
+            info = SessionInfo(client_address, close, drain=drain, watching=watching)
+            self.__sessions[id(info)] = info
+            self.__changed()
+            return info
+
+    def touch(self, info: SessionInfo, commands: int = 0):
+        with self.__lock:
+            info.last_activity = monotonic()
+            info.commands += commands
+            if id(info) in self.__sessions:
+                self.__sessions.move_to_end(id(info))
+
+    def close(self, info: SessionInfo):
+        """
+        Unregisters a client, closing a session twice is harmless.
+        """
+        with self.__lock:
+            if self.__sessions.pop(id(info), None) is not None:
+                self.__changed()
+
+    def __changed(self):
+        # Called holding the lock, so counts are reported in order
+        if self.on_change is not None:
+            self.on_change(len(self.__sessions))
+
+    def sessions(self) -> list[SessionInfo]:
+        with self.__lock:
+            return list(self.__sessions.values())
+
+    def reap(self) -> int:
+        """
+        Closes every connection idle for longer than idle_timeout, except the ones
+        waiting for WATCH updates, which are idle by design.
+
+        Returns:
+            int: The number of connections closed.
+        """
+        if not self.idle_timeout:
+            return 0
+
+        now = monotonic()
+        deadline = now - self.idle_timeout
+        idle = []
+        watching = []
+        with self.__lock:
+            # Least recently active first, stop at the first active one
+            for key, info in self.__sessions.items():
+                if info.last_activity > deadline:
+                    break
+                if info.watching is not None and info.watching():
+                    watching.append(key)
+                else:
+                    idle.append(key)
+            # Checked again a timeout later, so they're not visited on every reap
+            for key in watching:
+                self.__sessions[key].last_activity = now
+                self.__sessions.move_to_end(key)
+            idle_sessions = [self.__sessions.pop(key) for key in idle]
+            self.__reaped += len(idle_sessions)
+            if idle_sessions:
+                self.__changed()
+
+        for info in idle_sessions:
+            try:
+                info.close()
+            except OSError:
+                pass
+        return len(idle_sessions)
+
+    def start_reaper(self):
+        """
+        Reaps idle connections on a daemon thread until `stop_reaper` is called.
+        """
+        if not self.idle_timeout:
+            return
+
+        interval = min(1.0, self.idle_timeout / 2)
+
+        def reaper():
+            while not self.__stop.wait(interval):
+                self.reap()
+
+        Thread(target=reaper, name="session-reaper", daemon=True).start()
+
+    def stop_reaper(self):
+        self.__stop.set()
+
+    def drain(self, timeout: float = 5.0) -> int:
+        """
+        Asks every session to finish once its command in progress is answered,
+        waits for them up to `timeout` seconds and closes the ones left, then waits
+        up to `timeout` seconds again for those to unregister.
+
+        Returns:
+            int: The number of sessions closed after the timeout.
+        """
+        for info in self.sessions():
+            try:
+                (info.drain or info.close)()
+            except OSError:
+                pass
+
+        self.__wait(timeout)
+
+        left = self.sessions()
+        for info in left:
+            try:
+                info.close()
+            except OSError:
+                pass
+        if left:
+            self.__wait(timeout)
+        return len(left)
+
+    def __wait(self, timeout: float):
+        deadline = monotonic() + timeout
+        while self.__sessions and monotonic() < deadline:
+            sleep(0.01)
+
+    def stats(self) -> dict[str, int]:
+        with self.__lock:
+            return {
+                "active": len(self.__sessions),
+                "rejected": self.__rejected,
+                "reaped": self.__reaped,
+            }
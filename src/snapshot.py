@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+"""
+On-disk copy of the serialized catalog, so a restarted server serves LIST right
+away instead of reading and serializing the whole catalog again.
+
+A snapshot holds the catalog in the two forms LIST serves, JSON for text clients
+and a binary page for binary ones, stamped with the `stamp` of the database it
+was read from:
+
+    magic | u16 stamp length | u32 JSON length | u32 page length | stamp | JSON | page
+
+It's read in one go when loaded and only used if the database still has the same
+stamp, any write made since through LiquorDatabase makes it stale.
+"""
+import os
+from argparse import ArgumentParser
+from struct import Struct
+from src.db import LiquorDatabase, ShardedLiquorDatabase
+from src.liquor import LiquorStore
+from src.utils import get_project_root
+
+# Bumped whenever the encoding of the page changes, older snapshots are ignored
+MAGIC = b"LQSNAP02"
+HEADER = Struct("!8sHII")
+
+
+class SnapshotError(ValueError):
+    """
+    Raised when a snapshot is corrupt or doesn't match the database anymore.
+    """
+
+
+def save_snapshot(
+    path: str,
+    store: LiquorStore,
+    database: LiquorDatabase | ShardedLiquorDatabase,
+    attempts: int = 3,
+) -> int:
+    """
+    Writes the catalog of a store to a snapshot, replacing the previous one at
+    once so a crash never leaves half a file behind.
+
+    Args:
+        path (str): The snapshot file.
+        store (LiquorStore): The store serving the catalog.
+        database (LiquorDatabase | ShardedLiquorDatabase): The database of the store.
+        attempts (int): Times the catalog is read again if it changed meanwhile.
+
+    Returns:
+        int: The size of the snapshot in bytes.
+
+    Raises:
+        SnapshotError: If the catalog kept changing while it was read.
+    """
+    for _ in range(attempts):
+        stamp = database.stamp()
+        liquors_json, page = store.snapshot()
+        # The stamp is only right if nothing was written while serializing
+        if database.stamp() != stamp:
+            store.invalidate()
+            continue
+
+        encoded_stamp = stamp.encode("utf-8")
+        encoded_json = liquors_json.encode("utf-8")
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as file:
+            file.write(
+                HEADER.pack(MAGIC, len(encoded_stamp), len(encoded_json), len(page))
+            )
+            file.write(encoded_stamp)
+            file.write(encoded_json)
+            file.write(page)
+        os.replace(temporary, path)
+        return HEADER.size + len(encoded_stamp) + len(encoded_json) + len(page)
+    raise SnapshotError("The catalog kept changing while saving the snapshot")
+
+
+def load_snapshot(
+    path: str, store: LiquorStore, database: LiquorDatabase | ShardedLiquorDatabase
+) -> int:
+    """
+    Loads a snapshot into a store, if it was taken from the database as it is now.
+
+    Returns:
+        int: The size of the snapshot in bytes.
+
+    Raises:
+        OSError: If the snapshot can't be read, like when it doesn't exist.
+        SnapshotError: If the snapshot is corrupt or stale.
+    """
+    # The JSON and the page are copied into the store's caches anyway, a single
+    # read is all the I/O a warm start needs
+    with open(path, "rb") as file:
+        data = file.read()
+
+    if len(data) < HEADER.size:
+        raise SnapshotError("Snapshot is truncated")
+    magic, stamp_length, json_length, page_length = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise SnapshotError("Not a catalog snapshot")
+    end = HEADER.size + stamp_length + json_length + page_length
+    if len(data) != end:
+        raise SnapshotError("Snapshot is truncated")
+
+    start = HEADER.size + stamp_length
+    with memoryview(data) as view:
+        stamp = str(view[HEADER.size : start], "utf-8")
+        if stamp != database.stamp():
+            raise SnapshotError("Snapshot is stale, the catalog changed since")
+        liquors_json = str(view[start : start + json_length], "utf-8")
+    store.warm(liquors_json, data[start + json_length :])
+    return end
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(
+        prog="python -m src.snapshot", description="Saves a catalog snapshot"
+    )
+    parser.add_argument("file", help="snapshot to write")
+    parser.add_argument(
+        "--db-path", default=f"{get_project_root()}/db/liquor_store.db"
+    )
+    parser.add_argument("--db-shards", type=int, default=1)
+    args = parser.parse_args()
+
+    with (
+        ShardedLiquorDatabase(args.db_path, args.db_shards)
+        if args.db_shards > 1
+        else LiquorDatabase(args.db_path)
+    ) as database:
+        size = save_snapshot(args.file, LiquorStore(database), database)
+    print(f"Saved a snapshot of {size} bytes")
@@ -1,5 +1,18 @@
+import atexit
 import logging
+import os
+from itertools import count
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
+from queue import SimpleQueue
+
+# Environment variables read when the level or sample rate aren't given
+LOG_LEVEL_ENV = "LIQUOR_STORE_LOG_LEVEL"
+LOG_SAMPLE_ENV = "LIQUOR_STORE_LOG_SAMPLE"
+
+# Pass as `extra` to the high-volume per-connection and per-command lines, only
+# one in every `sample` of them is logged
+SAMPLED = {"sampled": True}
 
 
 def get_project_root() -> Path:
@@ -29,6 +42,14 @@ class Formatter(logging.Formatter):
 
     DATEFMT = "%d-%m-%Y %H:%M:%S"
 
+    def __init__(self):
+        super().__init__(datefmt=self.DATEFMT)
+        # One formatter per level built upfront instead of one per record
+        self.__formatters = {
+            level: logging.Formatter(log_format, datefmt=self.DATEFMT)
+            for level, log_format in self.FORMATS.items()
+        }
+
     def format(self, record) -> str:
         """
         Formats a log record into a string.
@@ -42,18 +63,95 @@ class Formatter(logging.Formatter):
         Notes:
             This method overrides the format method in the logging.Formatter class.
         """
-        log_format = self.FORMATS.get(record.levelno)
-        formatter = logging.Formatter(log_format, datefmt=self.DATEFMT)
+        formatter = self.__formatters.get(record.levelno)
+        if formatter is None:
+            return super().format(record)
         return formatter.format(record)
 
 
-def setup_logger():
+class SamplingFilter(logging.Filter):
+    """
+    Lets through one in every `rate` records logged with `extra=SAMPLED`, every
+    other record always passes.
+
+    Attributes:
+        rate (int): Sampling rate, 1 logs every record.
+    """
+
+    def __init__(self, rate: int = 1):
+        super().__init__()
+        self.rate = max(1, rate)
+        # next() on a count is atomic in CPython, no lock needed
+        self.__counter = count()
+
+    def filter(self, record) -> bool:
+        if self.rate == 1 or not getattr(record, "sampled", False):
+            return True
+        return next(self.__counter) % self.rate == 0
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    Queue handler that enqueues records as they are, so merging the arguments into
+    the message happens on the listener thread too and not on the thread serving a
+    client. Arguments must not be mutated after logging them.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+def resolve_level(level: str | int | None = None) -> int:
+    """
+    Resolves a log level given by name or number, falling back to the
+    LIQUOR_STORE_LOG_LEVEL environment variable and then to DEBUG.
+
+    Raises:
+        ValueError: If the level is unknown.
+    """
+    if level is None:
+        level = os.environ.get(LOG_LEVEL_ENV, logging.DEBUG)
+    if isinstance(level, str):
+        name = level.upper()
+        if name.isdigit():
+            return int(name)
+        resolved = logging.getLevelName(name)
+        if not isinstance(resolved, int):
+            raise ValueError(f"Unknown log level {level}")
+        return resolved
+    return level
+
+
+def setup_logger(level: str | int | None = None, sample: int | None = None):
+    """
+    Configures the server logger.
+
+    Records are put in a queue and written by a background listener thread, so
+    threads serving clients never block on the console. The listener is flushed
+    and stopped when the interpreter exits.
+
+    Args:
+        level (str | int | None): Minimum level logged, defaults to the
+            LIQUOR_STORE_LOG_LEVEL environment variable or DEBUG.
+        sample (int | None): Log one in every `sample` high-volume lines, defaults
+            to the LIQUOR_STORE_LOG_SAMPLE environment variable or 1.
+
+    Returns:
+        Logger: The configured logger.
+    """
     logger = logging.getLogger(__name__)
-    logger.setLevel(logging.DEBUG)
+    logger.setLevel(resolve_level(level))
+    if sample is None:
+        sample = int(os.environ.get(LOG_SAMPLE_ENV, 1))
+
+    # Calling it again only changes the level and sampling
+    for log_filter in logger.filters:
+        if isinstance(log_filter, SamplingFilter):
+            log_filter.rate = max(1, sample)
+            return logger
 
-    # Create console handler and set the level to DEBUG
+    # Create console handler, written to from the listener thread
     ch = logging.StreamHandler()
-    ch.setLevel(logging.DEBUG)
 
     # Create a formatter
     formatter = Formatter()
@@ -61,7 +159,14 @@ def setup_logger():
     # Add the formatter to the handler
     ch.setFormatter(formatter)
 
-    # Add the handler to the logger
-    logger.addHandler(ch)
+    # Hand records to the console handler through a queue
+    log_queue = SimpleQueue()
+    listener = QueueListener(log_queue, ch)
+    listener.start()
+    atexit.register(listener.stop)
+
+    # Filter on the logger so dropped records are never enqueued
+    logger.addFilter(SamplingFilter(sample))
+    logger.addHandler(DeferredQueueHandler(log_queue))
 
     return logger
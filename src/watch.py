@@ -0,0 +1,275 @@
+import sqlite3
+from json import dumps
+from threading import Event, Lock, Thread
+from typing import Callable
+from src.db import Liquor, LiquorDatabase
+from src.ledger import StockLedger
+
+# Pushed when updates were dropped, the client must LIST again to catch up
+RELOAD_LINE = b"RELOAD\r\n"
+
+# Most changed liquors read in a single query by the hub thread
+RESOLVE_BATCH = 500
+
+
+class Subscription:
+    """
+    Updates waiting to be pushed to a watching client.
+
+    Updates are coalesced, a liquor changing many times before the client is
+    written to only sends its latest state. The queue is bounded, if more liquors
+    than max_pending are waiting every update is dropped for a single RELOAD line.
+
+    Attributes:
+        uuids (set[str]): Liquors watched, empty when watching the whole catalog.
+        everything (bool): Whether the whole catalog is watched.
+        max_pending (int): Liquors waiting before the updates turn into a RELOAD.
+
+    Methods:
+        put(uuid: str, line: bytes): Queues the latest update of a liquor.
+        reload(): Replaces every queued update with a RELOAD line.
+        drain() -> list[bytes]: Takes the queued lines.
+    """
+
+    def __init__(self, wake: Callable[[], None], max_pending: int = 1024):
+        self.uuids: set[str] = set()
+        self.everything = False
+        self.max_pending = max_pending
+        self.__wake = wake
+        self.__pending: dict[str, bytes] = {}
+        self.__reload = False
+        self.__lock = Lock()
+
+    def put(self, uuid: str, line: bytes):
+        with self.__lock:
+            if self.__reload:
+                return
+            was_empty = not self.__pending
+            # Keep the order of the latest changes
+            self.__pending.pop(uuid, None)
+            self.__pending[uuid] = line
+            if len(self.__pending) > self.max_pending:
+                self.__pending.clear()
+                self.__reload = True
+        # The engine is only woken when the queue stops being empty
+        if was_empty:
+            self.__wake()
+
+    def reload(self):
+        with self.__lock:
+            was_waiting = self.__reload or self.__pending
+            self.__pending.clear()
+            self.__reload = True
+        if not was_waiting:
+            self.__wake()
+
+    def drain(self) -> list[bytes]:
+        with self.__lock:
+            if self.__reload:
+                self.__reload = False
+                return [RELOAD_LINE]
+            lines = list(self.__pending.values())
+            self.__pending.clear()
+            return lines
+
+
+class WatchHub:
+    """
+    Fans changes of the catalog out to the watching clients.
+
+    Each committed change is read and serialized once, whatever the number of
+    clients watching it, and handed to their subscriptions without blocking on
+    any of them. With a stock ledger, takes not written to the DB yet are pushed
+    too, with the stock the ledger holds.
+
+    Changes are only queued by the thread committing them, a background thread
+    reads the changed liquors in batches, so WATCH traffic never slows down the
+    purchases and restocks making the changes.
+
+    Methods:
+        subscribe(wake: Callable) -> Subscription: Registers a watching client.
+        watch(subscription: Subscription, uuids: list[str]): Watches more liquors.
+        unwatch(subscription: Subscription, uuids: list[str]): Stops watching liquors.
+        on_change(uuid: str | None): Database listener queueing a change.
+        flush() -> int: Reads the queued changes and pushes them.
+        stop(): Pushes the queued changes and stops the background thread.
+        stats() -> dict[str, int]: Returns the subscription counters.
+    """
+
+    def __init__(
+        self,
+        database: LiquorDatabase,
+        max_pending: int = 1024,
+        ledger: StockLedger | None = None,
+    ):
+        self.max_pending = max_pending
+        self.__database = database
+        self.__ledger = ledger
+        self.__by_uuid: dict[str, set[Subscription]] = {}
+        self.__everything: set[Subscription] = set()
+        self.__subscriptions: set[Subscription] = set()
+        self.__lock = Lock()
+        self.__pushed = 0
+        # Changed liquors waiting to be read, in the order they changed
+        self.__queued: dict[str, None] = {}
+        self.__flush_lock = Lock()
+        self.__wake = Event()
+        self.__closed = False
+        database.add_listener(self.on_change)
+        if ledger is not None:
+            ledger.add_listener(self.on_change)
+        self.__thread = Thread(target=self.__run, name="watch-hub", daemon=True)
+        self.__thread.start()
+
+    def subscribe(self, wake: Callable[[], None]) -> Subscription:
+        """
+        Registers a client, it doesn't watch anything until `watch` is called.
+
+        Args:
+            wake (Callable[[], None]): Called from any thread when updates are
+                queued for the client, must not block.
+        """
+        subscription = Subscription(wake, self.max_pending)
+        with self.__lock:
+            self.__subscriptions.add(subscription)
+        return subscription
+
+    def watch(self, subscription: Subscription, uuids: list[str]):
+        """
+        Watches more liquors, or the whole catalog if no UUID is given.
+        """
+        with self.__lock:
+            if not uuids:
+                subscription.everything = True
+                self.__everything.add(subscription)
+            for uuid in uuids:
+                subscription.uuids.add(uuid)
+                self.__by_uuid.setdefault(uuid, set()).add(subscription)
+
+    def unwatch(self, subscription: Subscription, uuids: list[str] | None = None):
+        """
+        Stops watching some liquors, or everything if no UUID is given.
+        """
+        with self.__lock:
+            if not uuids:
+                uuids = list(subscription.uuids)
+                subscription.everything = False
+                self.__everything.discard(subscription)
+            for uuid in uuids:
+                subscription.uuids.discard(uuid)
+                watchers = self.__by_uuid.get(uuid)
+                if watchers is not None:
+                    watchers.discard(subscription)
+                    if not watchers:
+                        del self.__by_uuid[uuid]
+
+    def close(self, subscription: Subscription):
+        """
+        Unregisters a client, closing a subscription twice is harmless.
+        """
+        self.unwatch(subscription)
+        with self.__lock:
+            self.__subscriptions.discard(subscription)
+
+    def on_change(self, uuid: str | None):
+        """
+        Queues a changed liquor to push its new state to the clients watching it.
+        Bulk changes, with no UUID, make every watching client reload right away.
+        """
+        if uuid is None:
+            with self.__lock:
+                watchers = [
+                    subscription
+                    for subscription in self.__subscriptions
+                    if subscription.everything or subscription.uuids
+                ]
+            for subscription in watchers:
+                subscription.reload()
+            return
+
+        with self.__lock:
+            if uuid not in self.__by_uuid and not self.__everything:
+                return
+            self.__queued[uuid] = None
+        self.__wake.set()
+
+    def flush(self) -> int:
+        """
+        Reads the queued liquors and pushes their state to the clients watching
+        them, on the background thread or on the caller's.
+
+        Returns:
+            int: The number of liquors pushed.
+        """
+        with self.__flush_lock:
+            with self.__lock:
+                uuids = list(self.__queued)
+                self.__queued.clear()
+
+            for start in range(0, len(uuids), RESOLVE_BATCH):
+                self.__push(uuids[start : start + RESOLVE_BATCH])
+            return len(uuids)
+
+    def __push(self, uuids: list[str]):
+        try:
+            liquors = self.__database.read_many(uuids)
+        except sqlite3.Error:
+            # The state can't be read, the watching clients must LIST again
+            for uuid in uuids:
+                for subscription in self.__watchers(uuid):
+                    subscription.reload()
+            return
+        if self.__ledger is not None:
+            liquors = self.__ledger.overlay(liquors)
+
+        # Liquors left out were deleted
+        by_uuid = {liquor.uuid: liquor for liquor in liquors}
+        pushed = 0
+        for uuid in uuids:
+            watchers = self.__watchers(uuid)
+            line = self.update_line(uuid, by_uuid.get(uuid))
+            for subscription in watchers:
+                subscription.put(uuid, line)
+            pushed += len(watchers)
+        with self.__lock:
+            self.__pushed += pushed
+
+    def __watchers(self, uuid: str) -> list[Subscription]:
+        with self.__lock:
+            return list(self.__by_uuid.get(uuid, ())) + list(self.__everything)
+
+    def __run(self):
+        while not self.__closed:
+            self.__wake.wait()
+            self.__wake.clear()
+            self.flush()
+
+    def stop(self):
+        """
+        Pushes the queued changes and stops the background thread, stopping twice
+        is harmless.
+        """
+        if self.__closed:
+            return
+        self.__closed = True
+        self.__wake.set()
+        self.__thread.join()
+        self.flush()
+
+    @staticmethod
+    def update_line(uuid: str, liquor: Liquor | None) -> bytes:
+        """
+        Serializes a change as 'UPDATE [uuid, stock, price]', stock and price are
+        null if the liquor was deleted.
+        """
+        if liquor is None:
+            return f"UPDATE {dumps([uuid, None, None])}\r\n".encode("utf-8")
+        return f"UPDATE {dumps([uuid, liquor.stock, liquor.price])}\r\n".encode("utf-8")
+
+    def stats(self) -> dict[str, int]:
+        with self.__lock:
+            return {
+                "subscriptions": len(self.__subscriptions),
+                "watched": len(self.__by_uuid),
+                "pushed": self.__pushed,
+            }
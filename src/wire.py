@@ -0,0 +1,263 @@
+"""
+Compact binary encoding of the replies, negotiated by a client sending `HI BIN`.
+
+Commands are still text lines, every reply after `OK BIN` is a frame:
+
+    u32 payload length | u8 kind | payload
+
+Kinds:
+    TEXT: A text reply line, for replies without a binary form like STATS or the
+        bank's answer.
+    ERROR: u8 error code.
+    QUOTE: f64 price quoted by BUY or CART.
+    LIST: u8 flags | u32 users | owner UUID | page, where a page is
+        u8 has_next | [next UUID] | liquors.
+
+Liquors are a string table followed by fixed-width records:
+
+    u8 mode | u32 strings | strings as (u16 length | UTF-8) | u32 liquors |
+    records as (UUID | index name | index country code | i64 stock | f64 price)
+
+Names and country codes are indexes into the string table, u16 unless the table
+holds more than 65535 strings and the WIDE_INDEXES mode bit is set, then u32.
+Record UUIDs are 16 raw bytes when every UUID of the page is canonical, or
+indexes into the string table with the TABLE_UUIDS mode bit set. Standalone UUIDs
+are u8 0 followed by 16 bytes, or u8 1 followed by a u16 length and UTF-8 string.
+Integers are big-endian.
+"""
+from struct import Struct
+from typing import Iterable
+from src.db import Liquor
+
+# Frame kinds
+TEXT = 0
+ERROR = 1
+QUOTE = 2
+LIST = 3
+
+# Flags of a LIST frame
+MORE = 1
+
+# Mode bits of a page, UUIDs as indexes into the string table instead of raw 16
+# bytes, and u32 instead of u16 indexes
+TABLE_UUIDS = 1
+WIDE_INDEXES = 2
+
+HEADER = Struct("!IB")
+U8 = Struct("!B")
+U16 = Struct("!H")
+U32 = Struct("!I")
+F64 = Struct("!d")
+LIST_HEADER = Struct("!BI")
+# Stock is as wide as a SQLite integer, RESTOCK can take it past u32
+RECORDS = {
+    0: Struct("!16sHHqd"),
+    TABLE_UUIDS: Struct("!HHHqd"),
+    WIDE_INDEXES: Struct("!16sIIqd"),
+    TABLE_UUIDS | WIDE_INDEXES: Struct("!IIIqd"),
+}
+
+
+class IncompleteFrame(ValueError):
+    """
+    Raised when decoding a payload that ends before its declared content.
+    """
+
+
+def frame(kind: int, payload: bytes) -> bytes:
+    return HEADER.pack(len(payload), kind) + payload
+
+
+def encode_text(line: bytes) -> bytes:
+    return frame(TEXT, line)
+
+
+def encode_error(error_code: int) -> bytes:
+    return frame(ERROR, U8.pack(error_code))
+
+
+def encode_quote(price: float) -> bytes:
+    return frame(QUOTE, F64.pack(price))
+
+
+def uuid_string(packed: bytes) -> str:
+    digits = packed.hex()
+    return (
+        f"{digits[:8]}-{digits[8:12]}-{digits[12:16]}-{digits[16:20]}-{digits[20:]}"
+    )
+
+
+def uuid_bytes(uuid: str) -> bytes | None:
+    """
+    Packs a canonical UUID string in 16 bytes, None if it isn't canonical and
+    wouldn't survive the round trip.
+    """
+    if len(uuid) != 36:
+        return None
+    try:
+        packed = bytes.fromhex(uuid.replace("-", ""))
+    except ValueError:
+        return None
+    return packed if len(packed) == 16 and uuid_string(packed) == uuid else None
+
+
+def encode_uuid(uuid: str) -> bytes:
+    packed = uuid_bytes(uuid)
+    if packed is not None:
+        return b"\x00" + packed
+    encoded = uuid.encode("utf-8")
+    return b"\x01" + U16.pack(len(encoded)) + encoded
+
+
+def encode_liquors(liquors: Iterable[Liquor]) -> bytes:
+    """
+    Encodes liquors with a string table for their names and country codes.
+    """
+    liquors = list(liquors)
+    uuids = [uuid_bytes(liquor.uuid) for liquor in liquors]
+    mode = 0
+    if None in uuids:
+        mode |= TABLE_UUIDS
+
+    strings: dict[str, int] = {}
+
+    def index(string: str) -> int:
+        position = strings.get(string)
+        if position is None:
+            position = strings[string] = len(strings)
+        return position
+
+    fields = [
+        (
+            index(liquor.uuid) if mode & TABLE_UUIDS else uuid,
+            index(liquor.commercial_name),
+            index(liquor.country_code),
+            liquor.stock,
+            liquor.price,
+        )
+        for liquor, uuid in zip(liquors, uuids)
+    ]
+    if len(strings) > 0xFFFF:
+        mode |= WIDE_INDEXES
+    pack = RECORDS[mode].pack
+    records = [pack(*record) for record in fields]
+
+    table = [U8.pack(mode), U32.pack(len(strings))]
+    for string in strings:
+        encoded = string.encode("utf-8")
+        table.append(U16.pack(len(encoded)))
+        table.append(encoded)
+    table.append(U32.pack(len(records)))
+    return b"".join(table + records)
+
+
+def encode_page(liquors: Iterable[Liquor], next_cursor: str | None = None) -> bytes:
+    if next_cursor is None:
+        return b"\x00" + encode_liquors(liquors)
+    return b"\x01" + encode_uuid(next_cursor) + encode_liquors(liquors)
+
+
+def encode_list(page: bytes, users: int, owner: str, more: bool = False) -> bytes:
+    """
+    Builds a LIST frame around an encoded page, so pages can be cached and sent
+    with the current users.
+    """
+    head = LIST_HEADER.pack(MORE if more else 0, users) + encode_uuid(owner)
+    return HEADER.pack(len(head) + len(page), LIST) + head + page
+
+
+def split_frames(buffer: bytearray) -> list[tuple[int, bytes]]:
+    """
+    Extracts every complete frame from a receive buffer, leaving any partial
+    frame in it.
+
+    Returns:
+        list[tuple[int, bytes]]: The kind and payload of each frame.
+    """
+    frames = []
+    start = 0
+    while len(buffer) - start >= HEADER.size:
+        length, kind = HEADER.unpack_from(buffer, start)
+        end = start + HEADER.size + length
+        if end > len(buffer):
+            break
+        frames.append((kind, bytes(buffer[start + HEADER.size : end])))
+        start = end
+    del buffer[:start]
+    return frames
+
+
+class _Reader:
+    def __init__(self, payload: bytes):
+        self.payload = payload
+        self.offset = 0
+
+    def unpack(self, layout: Struct) -> tuple:
+        if self.offset + layout.size > len(self.payload):
+            raise IncompleteFrame("Payload ends before its content")
+        values = layout.unpack_from(self.payload, self.offset)
+        self.offset += layout.size
+        return values
+
+    def take(self, size: int) -> bytes:
+        if self.offset + size > len(self.payload):
+            raise IncompleteFrame("Payload ends before its content")
+        data = self.payload[self.offset : self.offset + size]
+        self.offset += size
+        return data
+
+    def uuid(self) -> str:
+        (mode,) = self.unpack(U8)
+        if mode == 0:
+            return uuid_string(self.take(16))
+        (length,) = self.unpack(U16)
+        return self.take(length).decode("utf-8")
+
+
+def decode_error(payload: bytes) -> int:
+    return _Reader(payload).unpack(U8)[0]
+
+
+def decode_quote(payload: bytes) -> float:
+    return _Reader(payload).unpack(F64)[0]
+
+
+def decode_liquors(reader: _Reader) -> list[tuple[str, str, str, int, float]]:
+    (mode,) = reader.unpack(U8)
+    (string_count,) = reader.unpack(U32)
+    strings = []
+    for _ in range(string_count):
+        (length,) = reader.unpack(U16)
+        strings.append(reader.take(length).decode("utf-8"))
+
+    (liquor_count,) = reader.unpack(U32)
+    record = RECORDS[mode & (TABLE_UUIDS | WIDE_INDEXES)]
+    records = record.iter_unpack(reader.take(liquor_count * record.size))
+    uuid = strings.__getitem__ if mode & TABLE_UUIDS else uuid_string
+    return [
+        (uuid(packed), strings[name], strings[country_code], stock, price)
+        for packed, name, country_code, stock, price in records
+    ]
+
+
+def decode_list(payload: bytes) -> dict:
+    """
+    Decodes a LIST frame.
+
+    Returns:
+        dict: The 'liquors' as (uuid, name, country code, stock, price) tuples like
+            the text protocol, the 'next' cursor or None, the connected 'users',
+            the 'owner' account and whether 'more' frames follow.
+    """
+    reader = _Reader(payload)
+    flags, users = reader.unpack(LIST_HEADER)
+    owner = reader.uuid()
+    (has_next,) = reader.unpack(U8)
+    next_cursor = reader.uuid() if has_next else None
+    return {
+        "liquors": decode_liquors(reader),
+        "next": next_cursor,
+        "users": users,
+        "owner": owner,
+        "more": bool(flags & MORE),
+    }
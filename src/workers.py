@@ -0,0 +1,108 @@
+import os
+import signal
+from multiprocessing.sharedctypes import RawArray
+from threading import Lock
+
+
+class WorkerPool:
+    """
+    Forks worker processes that serve the same port, each with its own listener
+    bound with SO_REUSEPORT so the kernel balances connections between them.
+
+    Counters shared by the workers live in anonymous shared memory created before
+    forking, with one slot per worker so each slot has a single writing process.
+
+    Attributes:
+        workers (int): Number of worker processes.
+        index (int | None): Index of the current worker, None in the parent.
+
+    Methods:
+        fork() -> int | None: Forks the workers.
+        wait() -> int: Waits for the workers, forwarding shutdown signals to them.
+        set_users(count: int): Publishes the clients connected to this worker.
+        users() -> int: Returns the clients connected to every worker.
+        record_change(uuid: str | None): Tells the other workers the catalog changed.
+        poll_changes() -> bool: Checks if another worker changed the catalog.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.index: int | None = None
+        self.__users = RawArray("q", workers)
+        self.__changes = RawArray("Q", workers)
+        self.__changes_lock = Lock()
+        self.__seen_changes = 0
+        self.__pids: list[int] = []
+
+    def fork(self) -> int | None:
+        """
+        Forks the workers, must be called before starting any thread.
+
+        Returns:
+            int | None: The index of the worker in the children, None in the parent.
+        """
+        for index in range(self.workers):
+            pid = os.fork()
+            if pid == 0:
+                self.index = index
+                self.__pids = []
+                return index
+            self.__pids.append(pid)
+        return None
+
+    def wait(self) -> int:
+        """
+        Waits for every worker to exit. SIGINT and SIGTERM are forwarded to the
+        workers as SIGTERM, which makes them drain their connections and exit.
+
+        Returns:
+            int: 0 if every worker exited cleanly, 1 otherwise.
+        """
+        alive = set(self.__pids)
+
+        def forward(signum, _frame):
+            for pid in alive:
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    pass
+
+        previous = {
+            signum: signal.signal(signum, forward)
+            for signum in (signal.SIGINT, signal.SIGTERM)
+        }
+
+        failed = False
+        try:
+            while alive:
+                pid, status = os.wait()
+                alive.discard(pid)
+                failed = failed or os.waitstatus_to_exitcode(status) != 0
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+        return 1 if failed else 0
+
+    def set_users(self, count: int):
+        self.__users[self.index] = count
+
+    def users(self) -> int:
+        return sum(self.__users)
+
+    def record_change(self, _uuid: str | None = None):
+        """
+        Database listener counting the catalog changes committed by this worker.
+        """
+        with self.__changes_lock:
+            self.__changes[self.index] += 1
+
+    def poll_changes(self) -> bool:
+        """
+        Checks if other workers committed catalog changes since the last call, so
+        the caches of this worker can be dropped.
+        """
+        others = sum(self.__changes) - self.__changes[self.index]
+        if others == self.__seen_changes:
+            return False
+        self.__seen_changes = others
+        return True
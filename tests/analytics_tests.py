@@ -0,0 +1,107 @@
+import sqlite3
+import unittest
+from tempfile import TemporaryDirectory
+from src.analytics import SalesAggregator, parse_report_options
+
+
+class FakeClock:
+    def __init__(self, now: float = 1_700_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestSalesAggregator(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.sales = SalesAggregator(top_k=2, clock=self.clock)
+        self.prices = {"vodka": 10.0, "soju": 5.0, "rum": 20.0}
+
+    def test_record(self):
+        self.sales.record({"vodka": 2, "soju": 1}, self.prices)
+        self.sales.record({"vodka": 1}, self.prices)
+
+        self.assertEqual(
+            self.sales.sales(), {"orders": 2, "units": 4, "revenue": 35.0}
+        )
+        self.assertEqual(
+            self.sales.sales(uuid="vodka"), {"orders": 2, "units": 3, "revenue": 30.0}
+        )
+        # Liquors never sold have nothing to report
+        self.assertEqual(
+            self.sales.sales(uuid="rum"), {"orders": 0, "units": 0, "revenue": 0.0}
+        )
+
+    def test_windows(self):
+        self.sales.record({"vodka": 1}, self.prices)
+        self.clock.now += 120
+        self.sales.record({"soju": 2}, self.prices)
+
+        self.assertEqual(self.sales.sales("minute")["units"], 2)
+        self.assertEqual(self.sales.sales("hour")["units"], 3)
+        self.assertEqual(self.sales.top(window="minute"), [["soju", 2, 10.0]])
+
+        # A day later only the all-time counters remember
+        self.clock.now += 86_400
+        self.assertEqual(self.sales.sales("day")["orders"], 0)
+        self.assertEqual(self.sales.top(window="day"), [])
+        self.assertEqual(self.sales.sales()["orders"], 2)
+
+        # Buckets are reused as time goes by
+        self.sales.record({"rum": 1}, self.prices)
+        self.assertEqual(self.sales.top(window="hour"), [["rum", 1, 20.0]])
+
+    def test_top(self):
+        self.sales.record({"vodka": 3}, self.prices)
+        self.sales.record({"soju": 2}, self.prices)
+        self.assertEqual(self.sales.top(), [["vodka", 3, 30.0], ["soju", 2, 10.0]])
+
+        # Rum only enters the ranking once it passes the last one
+        self.sales.record({"rum": 2}, self.prices)
+        self.assertEqual(self.sales.top(), [["vodka", 3, 30.0], ["soju", 2, 10.0]])
+        self.sales.record({"rum": 2}, self.prices)
+        self.assertEqual(self.sales.top(), [["rum", 4, 80.0], ["vodka", 3, 30.0]])
+        self.sales.record({"soju": 3}, self.prices)
+        self.assertEqual(self.sales.top(limit=1), [["soju", 5, 25.0]])
+
+        # Windows rank every liquor sold in them
+        self.assertEqual(len(self.sales.top(limit=10, window="minute")), 3)
+
+    def test_persistence(self):
+        with TemporaryDirectory() as tmp_dir:
+            path = f"{tmp_dir}/sales.db"
+            sales = SalesAggregator(path, flush_interval=60, clock=self.clock)
+            sales.record({"vodka": 2, "soju": 1}, self.prices)
+            self.clock.now += 60
+            sales.record({"vodka": 1}, self.prices)
+            self.assertEqual(sales.flush(), 5)
+            self.assertEqual(sales.flush(), 0)
+            sales.record({"rum": 1}, self.prices)
+            sales.close()
+
+            # One row per minute and liquor, orders under '*'
+            with sqlite3.connect(path) as connection:
+                rows = connection.execute(
+                    "SELECT uuid, SUM(units) FROM sales GROUP BY uuid ORDER BY uuid"
+                ).fetchall()
+            self.assertEqual(rows, [("*", 5), ("rum", 1), ("soju", 1), ("vodka", 3)])
+
+            # Loaded back on start
+            restarted = SalesAggregator(path, clock=self.clock)
+            self.assertEqual(restarted.sales()["orders"], 3)
+            self.assertEqual(restarted.sales("hour")["units"], 5)
+            self.assertEqual(restarted.top(limit=1), [["vodka", 3, 30.0]])
+            restarted.close()
+
+    def test_parse_report_options(self):
+        self.assertEqual(parse_report_options(), {"window": "all"})
+        self.assertEqual(
+            parse_report_options("window=day", "limit=5"), {"window": "day", "limit": 5}
+        )
+        for malformed in ["window=week", "limit=-1", "limit=x", "uuid=", "after=1"]:
+            self.assertIsNone(parse_report_options(malformed))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from random import random
+from socket import AF_INET, SOCK_DGRAM, socket
+from threading import Thread
+from time import sleep
+from src.bank import BankGateway
+
+
+class StandInBank:
+    """
+    Local UDP bank echoing every datagram back after a random delay, so replies to
+    concurrent requests arrive out of order, or after the given delays in turn.
+    """
+
+    def __init__(self, drop_first: int = 0, delays: list[float] | None = None):
+        self.socket = socket(AF_INET, SOCK_DGRAM)
+        self.socket.bind(("127.0.0.1", 0))
+        self.address = self.socket.getsockname()
+        self.drop_first = drop_first
+        self.delays = delays
+        self.received = 0
+        Thread(target=self.serve, daemon=True).start()
+
+    def serve(self):
+        while True:
+            try:
+                data, client = self.socket.recvfrom(4096)
+            except OSError:
+                return
+            self.received += 1
+            if self.received <= self.drop_first:
+                continue
+            delay = self.delays.pop(0) if self.delays else random() / 50
+            Thread(target=self.reply, args=(data, client, delay), daemon=True).start()
+
+    def reply(self, data: bytes, client, delay: float):
+        sleep(delay)
+        self.socket.sendto(b"ACK " + data, client)
+
+    def close(self):
+        self.socket.close()
+
+
+class TestBankGateway(unittest.TestCase):
+    def test_replies_reach_their_buyer(self):
+        bank = StandInBank()
+        gateway = BankGateway(bank.address, timeout=2)
+
+        with ThreadPoolExecutor(max_workers=32) as executor:
+            replies = list(
+                executor.map(lambda i: gateway.request(f"{i}".encode()), range(200))
+            )
+
+        self.assertEqual(replies, [f"ACK {i}".encode() for i in range(200)])
+        stats = gateway.stats()
+        self.assertEqual(stats["requests"], 200)
+        self.assertEqual(stats["replies"], 200)
+        self.assertEqual(stats["in_flight"], 0)
+        gateway.close()
+        bank.close()
+
+    def test_timeout_and_retries(self):
+        bank = StandInBank(drop_first=1)
+        gateway = BankGateway(bank.address, timeout=0.1)
+        with self.assertRaises(TimeoutError):
+            gateway.request(b"lost")
+        self.assertEqual(gateway.stats()["timeouts"], 1)
+
+        # The first datagram is dropped, the retry gets through
+        bank.drop_first = bank.received + 1
+        retrying_gateway = BankGateway(bank.address, timeout=0.1, retries=2)
+        self.assertEqual(retrying_gateway.request(b"pay"), b"ACK pay")
+        self.assertEqual(retrying_gateway.stats()["retries"], 1)
+
+        gateway.close()
+        retrying_gateway.close()
+        bank.close()
+
+    def test_late_reply_never_reaches_the_next_buyer(self):
+        # The first attempt is answered after the retry's reply was read
+        bank = StandInBank(delays=[0.15, 0.01, 0.0])
+        gateway = BankGateway(bank.address, timeout=0.1, retries=1)
+        self.assertEqual(gateway.request(b"reply-to-buyerA"), b"ACK reply-to-buyerA")
+        sleep(0.1)
+        self.assertEqual(gateway.request(b"reply-to-buyerB"), b"ACK reply-to-buyerB")
+        gateway.close()
+        bank.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import io
+import unittest
+from tempfile import TemporaryDirectory
+from src.bulk import export_liquors, import_liquors, split_database
+from src.db import Liquor, LiquorDatabase, ShardedLiquorDatabase
+
+
+class TestBulkImportExport(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        self.liquor_db = LiquorDatabase(f"{self.tmp_dir.name}/liquor_store.db")
+
+    def test_round_trip(self):
+        liquors = [
+            Liquor(f"{i:04}-uuid", f"liquor {i}", "co", i, i * 1.5) for i in range(2500)
+        ]
+        for file_format in ["csv", "jsonl"]:
+            source = LiquorDatabase(f"{self.tmp_dir.name}/{file_format}.db")
+            self.assertEqual(source.create_many(iter(liquors), batch_size=1000), 2500)
+
+            exported = io.StringIO()
+            self.assertEqual(export_liquors(source, exported, file_format, batch_size=7), 2500)
+
+            exported.seek(0)
+            target = LiquorDatabase(f"{self.tmp_dir.name}/{file_format}_copy.db")
+            self.assertEqual(import_liquors(target, exported, file_format, batch_size=999), 2500)
+            self.assertEqual(list(target.iter_all()), liquors)
+
+            source.close()
+            target.close()
+
+    def test_split(self):
+        liquors = [Liquor(f"{i:04}-uuid", f"liquor {i}", "co", i, 1.0) for i in range(300)]
+        self.liquor_db.create_many(liquors)
+        sharded = ShardedLiquorDatabase(f"{self.tmp_dir.name}/liquor_store.db", 3)
+        self.assertEqual(split_database(self.liquor_db, sharded, batch_size=50), 300)
+        self.assertEqual(list(sharded.iter_all()), liquors)
+        sharded.close()
+
+    def test_upsert(self):
+        self.liquor_db.create(Liquor("aaaa", "Vodka", "ru", 1, 10))
+        csv_file = "uuid,commercial_name,country_code,stock,price\naaaa,Vodka,ru,5,20\nbbbb,Soju,kr,3,30\n"
+
+        # Without upsert existing liquors are left untouched
+        self.assertEqual(import_liquors(self.liquor_db, io.StringIO(csv_file)), 1)
+        self.assertEqual(self.liquor_db.read("aaaa").stock, 1)
+
+        self.assertEqual(import_liquors(self.liquor_db, io.StringIO(csv_file), upsert=True), 2)
+        self.assertEqual(self.liquor_db.read("aaaa").get_data(), ("aaaa", "Vodka", "ru", 5, 20.0))
+
+    def tearDown(self):
+        self.liquor_db.close()
+        self.tmp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+from random import Random
+from src import cipher
+
+
+def reference_encrypt(msg: str, n: int) -> str:
+    """
+    Character by character implementation the cypher module replaced.
+    """
+    result = ""
+    for char in msg:
+        if char.isalpha():
+            if char.islower():
+                result += chr((ord(char) - ord("a") + n) % 26 + ord("a"))
+            else:
+                result += chr((ord(char) - ord("A") + n) % 26 + ord("A"))
+        elif char.isdigit():
+            result += chr((ord(char) - ord("0") + n) % 10 + ord("0"))
+        else:
+            result += char
+    return result
+
+
+# Printable ASCII plus non-ASCII letters, digits and symbols, including titlecase,
+# uncased letters and digits that aren't decimal
+ALPHABET = [chr(code) for code in range(32, 127)] + list("\r\n\tñÉßªǅΩж中٣²€😀")
+
+
+class TestCipher(unittest.TestCase):
+    def test_matches_reference(self):
+        rng = Random(2023)
+        for _ in range(2000):
+            msg = "".join(rng.choices(ALPHABET, k=rng.randrange(0, 40)))
+            n = rng.randrange(-400, 400)
+
+            expected = reference_encrypt(msg, n)
+            self.assertEqual(cipher.encrypt(msg, n), expected)
+            self.assertEqual(cipher.decrypt(msg, -n), expected)
+            self.assertEqual(
+                cipher.encrypt_bytes(msg.encode("utf-8"), n), expected.encode("utf-8")
+            )
+            self.assertEqual(
+                cipher.decrypt_bytes(msg.encode("utf-8"), -n), expected.encode("utf-8")
+            )
+
+    def test_round_trip_ascii(self):
+        msg = "OK Transfer 4e0d3bbc-fac8 done 3\r\n"
+        for n in range(-30, 30):
+            self.assertEqual(cipher.decrypt(cipher.encrypt(msg, n), n), msg)
+
+
+if __name__ == "__main__":
+    unittest.main()
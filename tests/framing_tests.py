@@ -0,0 +1,37 @@
+import unittest
+from src.framing import LineBuffer, LineTooLong
+
+
+class TestLineBuffer(unittest.TestCase):
+    def test_partial_and_coalesced_lines(self):
+        buffer = LineBuffer()
+        self.assertEqual(buffer.feed(b"LI"), [])
+        self.assertEqual(buffer.feed(b"ST\r"), [])
+        self.assertEqual(buffer.feed(b"\nHI\r\nBUY a"), [b"LIST\r\n", b"HI\r\n"])
+        self.assertEqual(len(buffer), 5)
+        self.assertEqual(buffer.feed(b"aaa\n"), [b"BUY aaaa\n"])
+        self.assertEqual(len(buffer), 0)
+
+    def test_reused_receive_buffer(self):
+        # Like the threaded engine, every recv lands in the same bytearray
+        received = bytearray(16)
+        view = memoryview(received)
+        buffer = LineBuffer()
+        received[:9] = b"HI\r\nLIST\r"
+        lines = buffer.feed(view[:9])
+        received[:7] = b"\nBUY a\n"
+        lines += buffer.feed(view[:7])
+        self.assertEqual(lines, [b"HI\r\n", b"LIST\r\n", b"BUY a\n"])
+        self.assertTrue(all(type(line) is bytes for line in lines))
+
+    def test_max_line_length(self):
+        buffer = LineBuffer(max_line_length=8)
+        self.assertEqual(buffer.feed(b"LIST\r\n1234567\n"), [b"LIST\r\n", b"1234567\n"])
+        with self.assertRaises(LineTooLong):
+            buffer.feed(b"12345678\n")
+        with self.assertRaises(LineTooLong):
+            LineBuffer(max_line_length=8).feed(b"123456789")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,167 @@
+import unittest
+from tempfile import TemporaryDirectory
+from threading import Thread
+from src.db import Liquor, LiquorDatabase
+from src.ledger import StockLedger
+from src.liquor import LiquorStore
+from src.watch import WatchHub
+
+
+class TestStockLedger(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        self.liquor_db = LiquorDatabase(f"{self.tmp_dir.name}/liquor_store.db")
+        self.liquor_db.create(Liquor("aaaa-aaaa-aaaa-aaaa", "test_liquor1", "co", 50, 1000))
+        self.liquor_db.create(Liquor("bbbb-bbbb-bbbb-bbbb", "test_liquor2", "co", 1, 2000))
+
+    def tearDown(self):
+        self.liquor_db.close()
+        self.tmp_dir.cleanup()
+
+    def stock(self, uuid: str) -> int:
+        return self.liquor_db.read(uuid=uuid, read_all=False).stock
+
+    def test_no_oversell(self):
+        ledger = StockLedger(self.liquor_db, durability="group", flush_ops=8)
+        sold = []
+
+        def buy():
+            for _ in range(10):
+                try:
+                    ledger.take({"aaaa-aaaa-aaaa-aaaa": -1})
+                    sold.append(1)
+                except ValueError:
+                    pass
+
+        threads = [Thread(target=buy) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        ledger.close()
+
+        self.assertEqual(len(sold), 50)
+        self.assertEqual(self.stock("aaaa-aaaa-aaaa-aaaa"), 0)
+        # Purchases were written in batches, not one transaction each
+        self.assertLess(ledger.stats()["flushes"], 50)
+
+    def test_cart_is_atomic(self):
+        ledger = StockLedger(self.liquor_db, durability="strict")
+        with self.assertRaises(ValueError):
+            ledger.take({"aaaa-aaaa-aaaa-aaaa": -1, "bbbb-bbbb-bbbb-bbbb": -2})
+        with self.assertRaises(NameError):
+            ledger.take({"aaaa-aaaa-aaaa-aaaa": -1, "cccc-cccc-cccc-cccc": -1})
+        self.assertEqual(ledger.available("aaaa-aaaa-aaaa-aaaa"), 50)
+
+        # Strict returns once the decrement is committed
+        ledger.take({"aaaa-aaaa-aaaa-aaaa": -3, "bbbb-bbbb-bbbb-bbbb": -1})
+        self.assertEqual(self.stock("aaaa-aaaa-aaaa-aaaa"), 47)
+        self.assertEqual(self.stock("bbbb-bbbb-bbbb-bbbb"), 0)
+        ledger.close()
+
+    def test_relaxed_flushes_on_close(self):
+        ledger = StockLedger(self.liquor_db, durability="relaxed", flush_ops=100)
+        for _ in range(5):
+            ledger.take({"aaaa-aaaa-aaaa-aaaa": -1})
+        self.assertEqual(self.stock("aaaa-aaaa-aaaa-aaaa"), 50)
+        self.assertEqual(ledger.available("aaaa-aaaa-aaaa-aaaa"), 45)
+
+        ledger.close()
+        ledger.close()
+        self.assertEqual(self.stock("aaaa-aaaa-aaaa-aaaa"), 45)
+
+    def test_external_changes_are_reloaded(self):
+        ledger = StockLedger(self.liquor_db, durability="strict")
+        ledger.take({"bbbb-bbbb-bbbb-bbbb": -1})
+        with self.assertRaises(ValueError):
+            ledger.take({"bbbb-bbbb-bbbb-bbbb": -1})
+
+        # Restocked by someone else
+        self.liquor_db.update("bbbb-bbbb-bbbb-bbbb", delta_stock=5)
+        ledger.take({"bbbb-bbbb-bbbb-bbbb": -1})
+        self.assertEqual(self.stock("bbbb-bbbb-bbbb-bbbb"), 4)
+        ledger.close()
+
+    def test_loads_never_block_other_buyers(self):
+        ledger = StockLedger(self.liquor_db, durability="relaxed")
+        ledger.take({"aaaa-aaaa-aaaa-aaaa": -1})
+        read_many = self.liquor_db.read_many
+        blocked = []
+
+        def read_slowly(uuids):
+            # A buyer of a loaded liquor goes on while the DB is read
+            buyer = Thread(target=ledger.take, args=({"aaaa-aaaa-aaaa-aaaa": -1},))
+            buyer.start()
+            buyer.join(1)
+            blocked.append(buyer.is_alive())
+            return read_many(uuids)
+
+        self.liquor_db.read_many = read_slowly
+        ledger.take({"bbbb-bbbb-bbbb-bbbb": -1})
+        self.liquor_db.read_many = read_many
+
+        self.assertEqual(blocked, [False])
+        self.assertEqual(ledger.available("aaaa-aaaa-aaaa-aaaa"), 48)
+        self.assertEqual(ledger.available("bbbb-bbbb-bbbb-bbbb"), 0)
+        ledger.close()
+
+    def test_failed_writes_keep_the_stock_of_the_db(self):
+        ledger = StockLedger(self.liquor_db, durability="relaxed")
+        ledger.take({"aaaa-aaaa-aaaa-aaaa": -2})
+        update = self.liquor_db.update
+
+        def refuse(uuid, delta_stock):
+            # Someone else took the stock, while a buyer takes more from the ledger
+            ledger.take({"aaaa-aaaa-aaaa-aaaa": -1})
+            raise ValueError("Insufficient stock.")
+
+        def refuse_all(deltas):
+            raise ValueError("Insufficient stock.")
+
+        self.liquor_db.update_stocks = refuse_all
+        self.liquor_db.update = refuse
+        ledger.flush()
+        del self.liquor_db.update_stocks
+        self.liquor_db.update = update
+
+        # The lost decrement isn't counted, the one taken meanwhile still is
+        self.assertEqual(ledger.stats()["failed"], 1)
+        self.assertEqual(ledger.available("aaaa-aaaa-aaaa-aaaa"), 49)
+        ledger.close()
+        self.assertEqual(self.stock("aaaa-aaaa-aaaa-aaaa"), 49)
+
+    def test_store_counts_unwritten_stock(self):
+        ledger = StockLedger(self.liquor_db, durability="relaxed")
+        store = LiquorStore(self.liquor_db, ledger=ledger)
+
+        self.assertEqual(store.substract_cart({"bbbb-bbbb-bbbb-bbbb": 1}), (0, ""))
+        # Sold out before the decrement reaches the DB
+        self.assertEqual(store.check_liquor("bbbb-bbbb-bbbb-bbbb"), (4, ""))
+        self.assertEqual(store.check_cart("bbbb-bbbb-bbbb-bbbb"), (4, ""))
+        self.assertEqual(store.substract_cart({"bbbb-bbbb-bbbb-bbbb": 1}), (4, ""))
+        ledger.close()
+
+    def test_listings_show_unwritten_stock(self):
+        ledger = StockLedger(self.liquor_db, durability="relaxed")
+        store = LiquorStore(self.liquor_db, ledger=ledger)
+        hub = WatchHub(self.liquor_db, ledger=ledger)
+        subscription = hub.subscribe(lambda: None)
+        hub.watch(subscription, ["aaaa-aaaa-aaaa-aaaa"])
+        # Cached before the take, which must invalidate it
+        self.assertIn('"aaaa-aaaa-aaaa-aaaa", "test_liquor1", "co", 50', store.list()[1])
+
+        self.assertEqual(store.substract_cart({"aaaa-aaaa-aaaa-aaaa": 2}), (0, ""))
+        self.assertEqual(self.stock("aaaa-aaaa-aaaa-aaaa"), 50)
+        self.assertIn('"aaaa-aaaa-aaaa-aaaa", "test_liquor1", "co", 48', store.list()[1])
+        self.assertIn('"test_liquor1", "co", 48', store.list_page()[1])
+        self.assertIn('"test_liquor1", "co", 48', next(store.iter_list_chunks()))
+        hub.flush()
+        self.assertEqual(
+            subscription.drain(), [b'UPDATE ["aaaa-aaaa-aaaa-aaaa", 48, 1000.0]\r\n']
+        )
+        hub.stop()
+        ledger.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
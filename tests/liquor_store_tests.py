@@ -1,11 +1,15 @@
+import sqlite3
 import unittest
-from src.db.db import Liquor, LiquorDatabase
+from tempfile import TemporaryDirectory
+from threading import Thread
+from src.db import Liquor, LiquorDatabase, ShardedLiquorDatabase
 
 
 class TestLiquorStoreDB(unittest.TestCase):
     def setUp(self):
-        # Initialize a LiquorDatabase instance
-        self.liquor_db = LiquorDatabase()
+        # Initialize a LiquorDatabase instance on a throwaway file
+        self.tmp_dir = TemporaryDirectory()
+        self.liquor_db = LiquorDatabase(f"{self.tmp_dir.name}/liquor_store.db")
 
     def test_liquor_creation_and_retrieval(self):
         # Create a liquor
@@ -56,12 +60,194 @@ class TestLiquorStoreDB(unittest.TestCase):
         if updated_liquor is not None:
             self.assertEqual(updated_liquor.get_data()[4], new_price)
 
+    def test_insufficient_stock(self):
+        liquor4 = Liquor("dddd-dddd-dddd-dddd", "test_liquor4", "jp", 1, 1000)
+        self.liquor_db.create(liquor4)
+
+        # Stock can't go below zero and the failed update leaves it untouched
+        with self.assertRaises(ValueError):
+            self.liquor_db.update(liquor4.uuid, delta_stock=-2, price=2000)
+
+        updated_liquor = self.liquor_db.read(liquor4.uuid)
+        self.assertEqual(liquor4.get_data(), updated_liquor.get_data())
+
+        with self.assertRaises(NameError):
+            self.liquor_db.update("missing", delta_stock=-1)
+
+    def test_concurrent_stock_updates(self):
+        liquor5 = Liquor("eeee-eeee-eeee-eeee", "test_liquor5", "ru", 50, 1000)
+        self.liquor_db.create(liquor5)
+        sold = []
+
+        def buy():
+            for _ in range(10):
+                try:
+                    self.liquor_db.update(liquor5.uuid, delta_stock=-1)
+                    sold.append(1)
+                except ValueError:
+                    pass
+
+        threads = [Thread(target=buy) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Never oversold, every unit sold exactly once
+        self.assertEqual(len(sold), 50)
+        self.assertEqual(self.liquor_db.read(liquor5.uuid).stock, 0)
+
+    def test_pages(self):
+        liquors = [Liquor(f"{i:03}", f"liquor {i}", "co" if i % 2 else "ru", i % 3, i) for i in range(50)]
+        self.liquor_db.create_many(liquors)
+
+        # Walking the pages lists every liquor once
+        listed, after = [], ""
+        while page := self.liquor_db.read_page(after=after, limit=7, country_code="co"):
+            listed += page
+            after = page[-1].uuid
+        self.assertEqual(listed, [liquor for liquor in liquors if liquor.country_code == "co"])
+
+        in_stock = self.liquor_db.read_page(limit=100, min_price=10, max_price=20, in_stock=True)
+        self.assertEqual(
+            in_stock, [liquor for liquor in liquors if 10 <= liquor.price <= 20 and liquor.stock > 0]
+        )
+        self.assertEqual(list(self.liquor_db.iter_page(after="045", batch_size=2)), liquors[46:])
+
+    def test_restock_and_reprice(self):
+        self.liquor_db.create(Liquor("aaaa-aaaa-aaaa-aaaa", "test_liquor1", "co", 5, 1000))
+        self.liquor_db.create(Liquor("bbbb-bbbb-bbbb-bbbb", "test_liquor2", "co", 1, 2000))
+        changed = []
+        self.liquor_db.add_listener(changed.append)
+
+        results = self.liquor_db.restock(
+            [
+                ("aaaa-aaaa-aaaa-aaaa", 10),
+                ("bbbb-bbbb-bbbb-bbbb", -2),
+                ("cccc-cccc-cccc-cccc", 1),
+                ("aaaa-aaaa-aaaa-aaaa", -3),
+            ]
+        )
+        # Failed items are reported, the others are applied
+        self.assertEqual(results, [(0, 15), (4, None), (252, None), (0, 12)])
+        self.assertEqual(self.liquor_db.read("bbbb-bbbb-bbbb-bbbb").stock, 1)
+        self.assertEqual(changed, ["aaaa-aaaa-aaaa-aaaa"] * 2)
+
+        # Stock past what SQLite stores as an integer is refused
+        results = self.liquor_db.restock([("aaaa-aaaa-aaaa-aaaa", 2**63 - 12)])
+        self.assertEqual(results, [(253, None)])
+        self.assertEqual(self.liquor_db.read("aaaa-aaaa-aaaa-aaaa").stock, 12)
+
+        results = self.liquor_db.reprice(
+            [("bbbb-bbbb-bbbb-bbbb", 2500), ("cccc-cccc-cccc-cccc", 1)]
+        )
+        self.assertEqual(results, [(0, 2500.0), (252, None)])
+        self.assertEqual(self.liquor_db.read("bbbb-bbbb-bbbb-bbbb").price, 2500)
+
+    def test_connection_lifecycle(self):
+        db_path = f"{self.tmp_dir.name}/lifecycle.db"
+        with LiquorDatabase(db_path, synchronous="FULL") as liquor_db:
+            liquor_db.create(Liquor("ffff-ffff-ffff-ffff", "test_liquor6", "co", 1, 1))
+            self.assertIsNotNone(liquor_db.read("ffff-ffff-ffff-ffff"))
+
+        with self.assertRaises(sqlite3.ProgrammingError):
+            liquor_db.read("ffff-ffff-ffff-ffff")
+
+        # Pooled connections switched the file to WAL
+        with sqlite3.connect(db_path) as connection:
+            journal_mode = connection.execute("PRAGMA journal_mode").fetchone()[0]
+        self.assertEqual(journal_mode, "wal")
+
     def tearDown(self):
         # Clean up the database after tests
         self.liquor_db.delete("aaaa-aaaa-aaaa-aaaa")
         self.liquor_db.delete("bbbb-bbbb-bbbb-bbbb")
         self.liquor_db.delete("cccc-cccc-cccc-cccc")
-        pass
+        self.liquor_db.close()
+        self.tmp_dir.cleanup()
+
+
+class TestShardedLiquorStoreDB(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        self.liquor_db = ShardedLiquorDatabase(f"{self.tmp_dir.name}/liquor_store.db", 4)
+        self.liquors = [
+            Liquor(f"{i:04}-uuid", f"liquor {i}", "co" if i % 2 else "ru", i % 5, i * 1.5)
+            for i in range(200)
+        ]
+        self.assertEqual(self.liquor_db.create_many(reversed(self.liquors), batch_size=64), 200)
+
+    def tearDown(self):
+        self.liquor_db.close()
+        self.tmp_dir.cleanup()
+
+    def test_routing(self):
+        # Every shard holds part of the catalog, point reads find each liquor
+        self.assertTrue(all(shard.read(read_all=True) for shard in self.liquor_db.shards))
+        for liquor in self.liquors[::17]:
+            self.assertEqual(self.liquor_db.read(liquor.uuid), liquor)
+        self.assertEqual(
+            sorted(self.liquor_db.read_many(["0003-uuid", "0150-uuid", "9999-uuid"]), key=str),
+            [self.liquors[3], self.liquors[150]],
+        )
+
+        self.liquor_db.update("0007-uuid", delta_stock=3, price=9.5)
+        self.assertEqual(self.liquor_db.read("0007-uuid").get_data()[3:], (5, 9.5))
+        self.liquor_db.delete("0007-uuid")
+        self.assertIsNone(self.liquor_db.read("0007-uuid"))
+
+    def test_scans_are_ordered(self):
+        self.assertEqual(self.liquor_db.read(read_all=True), self.liquors)
+        self.assertEqual(list(self.liquor_db.iter_all(batch_size=7)), self.liquors)
+
+        # Keyset pages across shards
+        pages, after = [], ""
+        while page := self.liquor_db.read_page(after, 30, country_code="co", in_stock=True):
+            pages += page
+            after = page[-1].uuid
+        expected = [l for l in self.liquors if l.country_code == "co" and l.stock > 0]
+        self.assertEqual(pages, expected)
+        self.assertEqual(
+            list(self.liquor_db.iter_page("0100-uuid", 5, batch_size=2)), self.liquors[101:106]
+        )
+
+    def test_batched_changes_keep_order(self):
+        deltas = [(liquor.uuid, 1) for liquor in reversed(self.liquors)] + [("x", 1)]
+        results = self.liquor_db.restock(deltas)
+        self.assertEqual(results[:-1], [(0, liquor.stock + 1) for liquor in reversed(self.liquors)])
+        self.assertEqual(results[-1], (252, None))
+
+    def test_update_stocks_across_shards(self):
+        # 0000 has no stock, the other shards are put back
+        deltas = {uuid: -1 for uuid in ["0001-uuid", "0002-uuid", "0003-uuid", "0000-uuid"]}
+        with self.assertRaises(ValueError):
+            self.liquor_db.update_stocks(deltas)
+        self.assertEqual(
+            [self.liquor_db.read(uuid).stock for uuid in deltas], [1, 2, 3, 0]
+        )
+
+        del deltas["0000-uuid"]
+        self.liquor_db.update_stocks(deltas)
+        self.assertEqual([self.liquor_db.read(uuid).stock for uuid in deltas], [0, 1, 2])
+
+    def test_failed_put_back_keeps_the_original_error(self):
+        # Once a shard refuses the purchase, putting stock back fails too
+        failed = []
+        for shard in self.liquor_db.shards:
+            def update_stocks(deltas, update=shard.update_stocks):
+                if failed:
+                    raise sqlite3.OperationalError("disk I/O error")
+                try:
+                    update(deltas)
+                except ValueError:
+                    failed.append(deltas)
+                    raise
+            shard.update_stocks = update_stocks
+
+        deltas = {uuid: -1 for uuid in ["0001-uuid", "0002-uuid", "0003-uuid", "0000-uuid"]}
+        with self.assertLogs("src.db", "ERROR") as logs, self.assertRaises(ValueError):
+            self.liquor_db.update_stocks(deltas)
+        self.assertTrue(logs.output)
 
 
 if __name__ == "__main__":
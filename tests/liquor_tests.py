@@ -0,0 +1,62 @@
+import unittest
+from tempfile import TemporaryDirectory
+from src.db import Liquor, LiquorDatabase
+from src.liquor import LiquorCache, LiquorStore
+
+
+class TestLiquorStoreCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        self.liquor_db = LiquorDatabase(f"{self.tmp_dir.name}/liquor_store.db")
+        self.liquor_db.create(Liquor("aaaa-aaaa-aaaa-aaaa", "test_liquor1", "co", 2, 1000))
+        self.store = LiquorStore(self.liquor_db)
+
+    def test_lookups_hit_the_cache(self):
+        self.assertEqual(self.store.check_liquor("aaaa-aaaa-aaaa-aaaa"), (0, ""))
+        self.assertEqual(self.store.get_liquor_price("aaaa-aaaa-aaaa-aaaa"), (0, "1000.0"))
+        self.assertEqual(
+            self.store.get_liquor_name("aaaa-aaaa-aaaa-aaaa"), (0, "test_liquor1")
+        )
+
+        stats = self.store.cache_stats()
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["hits"], 2)
+
+    def test_writes_invalidate_the_cache(self):
+        self.store.check_liquor("aaaa-aaaa-aaaa-aaaa")
+        self.store.substract_stock("aaaa-aaaa-aaaa-aaaa")
+        self.store.substract_stock("aaaa-aaaa-aaaa-aaaa")
+        self.assertEqual(self.store.check_liquor("aaaa-aaaa-aaaa-aaaa"), (4, ""))
+
+        self.liquor_db.update("aaaa-aaaa-aaaa-aaaa", price=500)
+        self.assertEqual(self.store.get_liquor_price("aaaa-aaaa-aaaa-aaaa"), (0, "500.0"))
+
+        self.liquor_db.delete("aaaa-aaaa-aaaa-aaaa")
+        self.assertEqual(self.store.check_liquor("aaaa-aaaa-aaaa-aaaa"), (252, ""))
+
+    def test_cache_is_bounded(self):
+        cache = LiquorCache(max_size=2)
+        for uuid in ["a", "b", "c"]:
+            cache.put(uuid, Liquor(uuid, uuid, "co", 1, 1), cache.generation)
+
+        self.assertIsNone(cache.get("a"))
+        self.assertIsNotNone(cache.get("c"))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+        # Entries read before an invalidation are not cached after it
+        generation = cache.generation
+        cache.invalidate("d")
+        cache.put("d", Liquor("d", "d", "co", 1, 1), generation)
+        self.assertIsNone(cache.get("d"))
+
+        expired = LiquorCache(ttl=0)
+        expired.put("a", Liquor("a", "a", "co", 1, 1), expired.generation)
+        self.assertIsNone(expired.get("a"))
+
+    def tearDown(self):
+        self.liquor_db.close()
+        self.tmp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+from urllib.request import urlopen
+from src.metrics import Histogram, Metrics, start_metrics_server
+
+
+class TestMetrics(unittest.TestCase):
+    def test_percentiles(self):
+        histogram = Histogram()
+        for millis in range(1, 101):
+            histogram.record(millis / 1000, error_code=253 if millis % 10 == 0 else 0)
+
+        snapshot = histogram.snapshot()
+        self.assertEqual(snapshot["count"], 100)
+        self.assertEqual(snapshot["errors"], {253: 10})
+        self.assertEqual(snapshot["max"], 0.1)
+        # Buckets are 19% wide, estimates can't be further off than that
+        for key, expected in [("p50", 0.05), ("p95", 0.095), ("p99", 0.099)]:
+            self.assertGreaterEqual(snapshot[key], expected)
+            self.assertLessEqual(snapshot[key], expected * 1.19)
+
+        self.assertEqual(Histogram().percentile(0.5), 0.0)
+
+    def test_timed_and_prometheus(self):
+        metrics = Metrics()
+
+        @metrics.timed("db", "read")
+        def read(fail: bool = False):
+            if fail:
+                raise ValueError()
+            return "liquor"
+
+        self.assertEqual(read(), "liquor")
+        with self.assertRaises(ValueError):
+            read(fail=True)
+        self.assertEqual(metrics.snapshot()["db"]["read"]["count"], 2)
+
+        server = start_metrics_server("127.0.0.1", 0, metrics)
+        with urlopen(f"http://127.0.0.1:{server.server_address[1]}/metrics") as response:
+            body = response.read().decode()
+        server.shutdown()
+
+        self.assertIn('liquor_store_db_seconds_count{db="read"} 2', body)
+        self.assertIn('liquor_store_db_seconds_bucket{db="read",le="+Inf"} 2', body)
+        self.assertIn('liquor_store_db_errors_total{db="read",code="255"} 1', body)
+
+
+if __name__ == "__main__":
+    unittest.main()
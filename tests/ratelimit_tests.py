@@ -0,0 +1,69 @@
+import unittest
+from src.ratelimit import RateLimiter, parse_limits
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestRateLimiter(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def test_parse_limits(self):
+        self.assertEqual(
+            parse_limits(["list=20/40", "*=5", "BUY=0.5"]),
+            {"LIST": (20.0, 40.0), "*": (5.0, 5.0), "BUY": (0.5, 1.0)},
+        )
+        for spec in ["LIST", "=5", "LIST=0", "LIST=5/0", "LIST=fast"]:
+            with self.assertRaises(ValueError):
+                parse_limits([spec])
+
+    def test_per_client_buckets(self):
+        limiter = RateLimiter({"LIST": (2, 3), "*": (1, 1)}, clock=self.clock)
+        self.assertEqual([limiter.allow("1.1.1.1", "LIST") for _ in range(4)], [True] * 3 + [False])
+        # Other clients and commands have their own budgets
+        self.assertTrue(limiter.allow("2.2.2.2", "LIST"))
+        self.assertTrue(limiter.allow("1.1.1.1", "BUY"))
+        self.assertFalse(limiter.allow("1.1.1.1", "CART"))
+
+        # Refilled at the rate, never over the burst
+        self.clock.now = 0.5
+        self.assertEqual([limiter.allow("1.1.1.1", "LIST") for _ in range(2)], [True, False])
+        self.clock.now = 100
+        self.assertEqual([limiter.allow("1.1.1.1", "LIST") for _ in range(4)], [True] * 3 + [False])
+        self.assertEqual(
+            limiter.stats(),
+            {"throttled": {"LIST": 3, "*": 1}, "throttled_global": 0, "clients": 3},
+        )
+
+    def test_global_budget(self):
+        limiter = RateLimiter({"BUY": (10, 10)}, {"BUY": (1, 2)}, clock=self.clock)
+        self.assertTrue(limiter.allow("1.1.1.1", "BUY"))
+        self.assertTrue(limiter.allow("2.2.2.2", "BUY"))
+        self.assertFalse(limiter.allow("3.3.3.3", "BUY"))
+        # Unlimited commands are never throttled
+        self.assertTrue(all(limiter.allow("1.1.1.1", "HI") for _ in range(100)))
+        self.assertEqual(limiter.stats()["throttled_global"], 1)
+
+    def test_idlest_buckets_are_dropped(self):
+        limiter = RateLimiter({"*": (1, 1)}, max_clients=2, clock=self.clock)
+        # A spray of new IPs never grows the buckets past max_clients
+        for index in range(1000):
+            self.assertTrue(limiter.allow(f"10.0.{index // 256}.{index % 256}", "LIST"))
+            self.assertLessEqual(limiter.stats()["clients"], 2)
+
+        self.assertTrue(limiter.allow("1.1.1.1", "LIST"))
+        self.assertTrue(limiter.allow("2.2.2.2", "LIST"))
+        self.assertFalse(limiter.allow("1.1.1.1", "LIST"))
+        # 2.2.2.2 is the idlest now, evicted with its drained bucket
+        self.assertTrue(limiter.allow("3.3.3.3", "LIST"))
+        self.assertFalse(limiter.allow("1.1.1.1", "LIST"))
+        self.assertTrue(limiter.allow("2.2.2.2", "LIST"))
+
+if __name__ == "__main__":
+    unittest.main()
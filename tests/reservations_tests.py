@@ -0,0 +1,110 @@
+import unittest
+from tempfile import TemporaryDirectory
+from threading import Barrier, Thread
+from src.db import Liquor, LiquorDatabase
+from src.liquor import LiquorStore
+from src.reservations import ReservationBook
+
+
+class TestReservationBook(unittest.TestCase):
+    def setUp(self):
+        self.stock = {"aaaa": 2, "bbbb": 1}
+        self.book = ReservationBook(ttl=10, sweep_interval=60)
+
+    def tearDown(self):
+        self.book.close()
+
+    def take(self, items: dict[str, int]):
+        for uuid, quantity in items.items():
+            self.stock[uuid] -= quantity
+
+    def test_hold_and_release(self):
+        first = self.book.hold({"aaaa": 1, "bbbb": 1}, self.stock.get)
+        # The cart is held as a whole or not at all
+        with self.assertRaises(ValueError):
+            self.book.hold({"aaaa": 1, "bbbb": 1}, self.stock.get)
+        self.assertEqual(self.book.held("aaaa"), 1)
+        with self.assertRaises(NameError):
+            self.book.hold({"cccc": 1}, self.stock.get)
+
+        self.book.release(first)
+        self.book.release(first)
+        self.assertEqual(self.book.held("bbbb"), 0)
+        self.book.hold({"aaaa": 1, "bbbb": 1}, self.stock.get)
+        self.assertEqual(self.book.stats()["units"], 2)
+
+    def test_commit(self):
+        items = {"aaaa": 2}
+        reservation = self.book.hold(items, self.stock.get)
+        self.book.commit(reservation, items, lambda: self.take(items), self.stock.get)
+        self.assertEqual((self.stock["aaaa"], self.book.held("aaaa")), (0, 0))
+        # Committed reservations are not given back
+        self.book.release(reservation)
+        self.assertEqual(self.book.held("aaaa"), 0)
+        self.assertEqual(self.book.stats()["released"], 0)
+
+    def test_expired_hold(self):
+        items = {"bbbb": 1}
+        late = self.book.hold(items, self.stock.get)
+        self.assertEqual(self.book.sweep(late.expires), 1)
+        self.assertFalse(late.active)
+
+        # Someone else holds the bottle now, the late payment can't take it
+        other = self.book.hold(items, self.stock.get)
+        with self.assertRaises(ValueError):
+            self.book.commit(late, items, lambda: self.take(items), self.stock.get)
+        self.book.release(other)
+        self.book.commit(late, items, lambda: self.take(items), self.stock.get)
+        self.assertEqual(self.stock["bbbb"], 0)
+        self.assertEqual(self.book.stats()["expired"], 1)
+
+
+class TestStoreReservations(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        self.liquor_db = LiquorDatabase(f"{self.tmp_dir.name}/liquor_store.db")
+        self.liquor_db.create(Liquor("aaaa-aaaa-aaaa-aaaa", "test_liquor1", "co", 5, 1000))
+        self.book = ReservationBook(ttl=10, sweep_interval=60)
+        self.store = LiquorStore(self.liquor_db, reservations=self.book)
+
+    def tearDown(self):
+        self.book.close()
+        self.liquor_db.close()
+        self.tmp_dir.cleanup()
+
+    def test_last_bottles(self):
+        buyers = 20
+        barrier = Barrier(buyers)
+        results = []
+
+        def buy():
+            barrier.wait()
+            error_code, reservation = self.store.reserve({"aaaa-aaaa-aaaa-aaaa": 1})
+            if error_code == 0:
+                results.append(self.store.substract_cart({"aaaa-aaaa-aaaa-aaaa": 1}, reservation))
+            else:
+                results.append((error_code, ""))
+
+        threads = [Thread(target=buy) for _ in range(buyers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Every quoted buyer got a bottle, the others were turned away at the quote
+        self.assertEqual(results.count((0, "")), 5)
+        self.assertEqual(results.count((4, "")), 15)
+        self.assertEqual(self.liquor_db.read("aaaa-aaaa-aaaa-aaaa").stock, 0)
+
+    def test_held_stock_is_not_quoted(self):
+        error_code, reservation = self.store.reserve({"aaaa-aaaa-aaaa-aaaa": 5})
+        self.assertEqual(error_code, 0)
+        self.assertEqual(self.store.check_liquor("aaaa-aaaa-aaaa-aaaa"), (4, ""))
+        self.assertEqual(self.store.reserve({"cccc": 1}), (252, None))
+
+        self.store.release(reservation)
+        self.assertEqual(self.store.check_cart("aaaa-aaaa-aaaa-aaaa:5"), (0, "5000.0"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,523 @@
+import asyncio
+import logging
+import unittest
+from contextlib import redirect_stderr
+from io import StringIO
+from json import dumps, loads
+from socket import AF_INET, SOCK_DGRAM, create_connection, socket
+from tempfile import TemporaryDirectory
+from threading import Thread
+from src import server, wire
+from src.analytics import SalesAggregator
+from src.bank import BankGateway
+from src.db import Liquor, LiquorDatabase
+from src.ratelimit import RateLimiter
+from src.reservations import ReservationBook
+from src.liquor import LiquorStore
+from src.sessions import SessionRegistry
+from src.watch import WatchHub
+
+
+class FakeBank:
+    """
+    Local UDP bank answering every payment with a fixed reply, encrypted with the
+    store's cypher and followed by the shift number.
+    """
+
+    def __init__(self, reply: str, n: int = 3):
+        self.socket = socket(AF_INET, SOCK_DGRAM)
+        self.socket.bind(("127.0.0.1", 0))
+        self.address = self.socket.getsockname()
+        encrypted = server.LiquorStoreSession(None).encrypt(reply, n)
+        self.reply = f"{encrypted} {n}\r\n".encode()
+        Thread(target=self.serve, daemon=True).start()
+
+    def serve(self):
+        while True:
+            try:
+                _, client = self.socket.recvfrom(4096)
+                self.socket.sendto(self.reply, client)
+            except OSError:
+                return
+
+    def close(self):
+        self.socket.close()
+
+
+class ServerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        self.liquor_db = LiquorDatabase(f"{self.tmp_dir.name}/liquor_store.db")
+        self.liquor_db.create(Liquor("aaaa-aaaa-aaaa-aaaa", "Vodka", "ru", 2, 114_900))
+        self.liquor_db.create(Liquor("bbbb-bbbb-bbbb-bbbb", "Soju", "kr", 0, 98_900))
+
+        # The server keeps its state in module globals set up by __main__
+        server.LOGGER = logging.getLogger("liquor_store_tests")
+        server.LOGGER.addHandler(logging.NullHandler())
+        server.LOGGER.propagate = False
+        server.STORE = LiquorStore(self.liquor_db)
+        server.OWNER_UUID = "4e0d3bbc-fac8-4a28-909a-752f65cf9c6c"
+        server.OWNER_UUID_JSON = dumps(server.OWNER_UUID)
+        server.SESSIONS = SessionRegistry()
+        server.SESSIONS.open(("127.0.0.1", 5000), lambda: None)
+        server.HUB = WatchHub(self.liquor_db)
+        server.LIMITER = None
+        server.ADMIN_TOKEN = None
+        server.SALES = SalesAggregator()
+        server.WORKERS = None
+
+        self.session = server.LiquorStoreSession(("127.0.0.1", 5000))
+
+    def tearDown(self):
+        server.HUB.stop()
+        self.liquor_db.close()
+        self.tmp_dir.cleanup()
+
+
+class TestLiquorStoreSession(ServerTestCase):
+    def test_list(self):
+        reply = self.session.process(b"LIST\r\n")
+
+        # Same reply as serializing the catalog and the dynamic tail in one go
+        expected = [list(liquor.get_data()) for liquor in self.liquor_db.read(read_all=True)]
+        expected += [1, server.OWNER_UUID]
+        self.assertEqual(reply, f"OK {dumps(expected)}\r\n".encode())
+        self.assertEqual(loads(reply[3:]), expected)
+
+        # Changes to the catalog are served on the next LIST
+        self.liquor_db.update("aaaa-aaaa-aaaa-aaaa", delta_stock=-1)
+        self.assertEqual(loads(self.session.process(b"LIST\r\n")[3:])[0][3], 1)
+
+    def test_list_empty_catalog(self):
+        self.liquor_db.delete("aaaa-aaaa-aaaa-aaaa")
+        self.liquor_db.delete("bbbb-bbbb-bbbb-bbbb")
+        reply = self.session.process(b"LIST\r\n")
+        self.assertEqual(loads(reply[3:]), [1, server.OWNER_UUID])
+
+    def test_list_pages(self):
+        for i in range(5):
+            self.liquor_db.create(Liquor(f"cccc-{i}", f"Beer {i}", "de", i, 1000 * i))
+
+        page = loads(self.session.process(b"LIST limit=2 country=de\r\n")[3:])
+        self.assertEqual([liquor[0] for liquor in page["liquors"]], ["cccc-0", "cccc-1"])
+        self.assertEqual(page["next"], "cccc-1")
+        self.assertEqual(page["users"], 1)
+        self.assertEqual(page["owner"], server.OWNER_UUID)
+
+        page = loads(
+            self.session.process(b"LIST after=cccc-1 country=de in_stock=1 max_price=3000\r\n")[3:]
+        )
+        self.assertEqual([liquor[0] for liquor in page["liquors"]], ["cccc-2", "cccc-3"])
+        self.assertIsNone(page["next"])
+
+        self.assertEqual(self.session.process(b"LIST limit=0\r\n"), b"ERR 253\r\n")
+        huge = b"limit=99999999999999999999999"
+        self.assertEqual(self.session.process(b"LIST stream=1 " + huge + b"\r\n"), b"ERR 253\r\n")
+        self.assertEqual(self.session.process(b"LIST " + huge + b"\r\n"), b"ERR 253\r\n")
+        self.assertEqual(self.session.process(b"LIST colour=red\r\n"), b"ERR 253\r\n")
+
+    def test_list_stream(self):
+        for i in range(5):
+            self.liquor_db.create(Liquor(f"cccc-{i}", f"Beer {i}", "de", i, 1000 * i))
+        self.addCleanup(setattr, server, "LIST_CHUNK_SIZE", server.LIST_CHUNK_SIZE)
+        server.LIST_CHUNK_SIZE = 2
+        sent = []
+        self.session.write = sent.append
+
+        reply = self.session.process_lines([b"HI\r\n", b"LIST stream=1 country=de min_price=1000\r\n"])
+        self.assertEqual(len(sent), 2)
+        self.assertEqual(loads(sent[0][5:])[0][0], "cccc-1")
+        self.assertEqual(len(loads(sent[1][5:])), 2)
+        self.assertEqual(reply, f'OK [1, "{server.OWNER_UUID}"]\r\n'.encode())
+
+    def test_errors(self):
+        self.assertEqual(self.session.process(b"FOO\r\n"), b"ERR 254\r\n")
+        self.assertEqual(self.session.process(b"BUY\r\n"), b"ERR 253\r\n")
+        self.assertEqual(self.session.process(b"BUY cccc\r\n"), b"ERR 252\r\n")
+        self.assertEqual(self.session.process(b"BUY bbbb-bbbb-bbbb-bbbb\r\n"), b"ERR 4\r\n")
+
+    def test_buy_quote(self):
+        reply = self.session.process(b"BUY aaaa-aaaa-aaaa-aaaa\r\n")
+        self.assertEqual(reply, b"OK 114900.0\r\n")
+        self.assertEqual(self.session.pending_order, {"aaaa-aaaa-aaaa-aaaa": 1})
+
+    def test_pipelined_lines(self):
+        lines = self.session.frame(b"FOO\r\nBUY\r\nBU")
+        self.assertEqual(self.session.process_lines(lines), b"ERR 254\r\nERR 253\r\n")
+        lines = self.session.frame(b"Y aaaa-aaaa-aaaa-aaaa\r\n")
+        self.assertEqual(self.session.process_lines(lines), b"OK 114900.0\r\n")
+
+        self.assertIsNone(self.session.frame(b"x" * (server.MAX_LINE_LENGTH + 1)))
+        self.assertTrue(self.session.closed)
+
+    def test_stats(self):
+        server.BANK = BankGateway(("127.0.0.1", 9), timeout=0.1)
+        self.session.process(b"FOO\r\n")
+        self.session.process(b"BUY cccc\r\n")
+
+        stats = loads(self.session.process(b"STATS\r\n")[3:])
+        self.assertGreaterEqual(stats["metrics"]["command"]["BUY"]["errors"]["252"], 1)
+        self.assertGreaterEqual(stats["metrics"]["command"]["UNKNOWN"]["count"], 1)
+        self.assertGreaterEqual(stats["metrics"]["db"]["read"]["count"], 1)
+        self.assertEqual(stats["sessions"]["active"], 1)
+        self.assertIn("hits", stats["cache"])
+        self.assertEqual(stats["bank"]["requests"], 0)
+        server.BANK.close()
+
+    def test_buy_payment(self):
+        bank = FakeBank("OK Transfer 42 done")
+        server.BANK = BankGateway(bank.address, timeout=1)
+
+        self.session.process(b"BUY aaaa-aaaa-aaaa-aaaa\r\n")
+        reply = self.session.process(b"encrypted payment 3\r\n")
+        self.assertEqual(reply, b"OK Transfer 42 done\r\nHere, enjoy your Vodka\r\n")
+        self.assertIsNone(self.session.pending_order)
+        self.assertEqual(self.liquor_db.read("aaaa-aaaa-aaaa-aaaa").stock, 1)
+
+        server.BANK.close()
+        bank.close()
+
+    def test_bank_reply_spacing(self):
+        # Only the trailing shift number is dropped from the bank's message
+        bank = FakeBank("ERR 3")
+        bank.reply = bank.reply.replace(b" 3\r\n", b"  3 \r\n")
+        server.BANK = BankGateway(bank.address, timeout=1)
+
+        self.session.process(b"BUY aaaa-aaaa-aaaa-aaaa\r\n")
+        self.assertEqual(self.session.process(b"payment 3\r\n"), b"ERR 3\r\n")
+        self.assertEqual(self.liquor_db.read("aaaa-aaaa-aaaa-aaaa").stock, 2)
+
+        server.BANK.close()
+        bank.close()
+
+    def test_cart(self):
+        self.liquor_db.update("bbbb-bbbb-bbbb-bbbb", delta_stock=3)
+        self.assertEqual(
+            self.session.process(b"CART aaaa-aaaa-aaaa-aaaa:3 bbbb-bbbb-bbbb-bbbb\r\n"),
+            b"ERR 4\r\n",
+        )
+        self.assertEqual(self.session.process(b"CART aaaa-aaaa-aaaa-aaaa:x\r\n"), b"ERR 253\r\n")
+        for quantity in ["\u00b2", "9" * 50, "1000001", "600000 aaaa-aaaa-aaaa-aaaa:600000"]:
+            line = f"CART aaaa-aaaa-aaaa-aaaa:{quantity}\r\n".encode()
+            self.assertEqual(self.session.process(line), b"ERR 253\r\n")
+        self.assertEqual(self.session.process(b"CART\r\n"), b"ERR 253\r\n")
+        self.assertEqual(self.session.process(b"CART cccc:1\r\n"), b"ERR 252\r\n")
+
+        reply = self.session.process(
+            b"CART aaaa-aaaa-aaaa-aaaa bbbb-bbbb-bbbb-bbbb:2 aaaa-aaaa-aaaa-aaaa\r\n"
+        )
+        self.assertEqual(reply, f"OK {2 * 114_900.0 + 2 * 98_900.0}\r\n".encode())
+        self.assertEqual(
+            self.session.pending_order,
+            {"aaaa-aaaa-aaaa-aaaa": 2, "bbbb-bbbb-bbbb-bbbb": 2},
+        )
+
+        bank = FakeBank("OK Transfer done")
+        server.BANK = BankGateway(bank.address, timeout=1)
+        reply = self.session.process(b"payment 3\r\n")
+        self.assertEqual(reply, b"OK Transfer done\r\nHere, enjoy your 2 Vodka, 2 Soju\r\n")
+        self.assertEqual(self.liquor_db.read("aaaa-aaaa-aaaa-aaaa").stock, 0)
+        self.assertEqual(self.liquor_db.read("bbbb-bbbb-bbbb-bbbb").stock, 1)
+
+        # Stock ran out between the quote and the payment, nothing is taken
+        self.liquor_db.update("aaaa-aaaa-aaaa-aaaa", delta_stock=1)
+        self.session.process(b"CART bbbb-bbbb-bbbb-bbbb aaaa-aaaa-aaaa-aaaa\r\n")
+        self.liquor_db.update("aaaa-aaaa-aaaa-aaaa", delta_stock=-1)
+        reply = self.session.process(b"payment 3\r\n")
+        self.assertEqual(reply, b"OK Transfer done\r\nERR 4\r\n")
+        self.assertEqual(self.liquor_db.read("bbbb-bbbb-bbbb-bbbb").stock, 1)
+
+        server.BANK.close()
+        bank.close()
+
+    def test_buy_rejected_or_unanswered(self):
+        bank = FakeBank("ERR 3")
+        server.BANK = BankGateway(bank.address, timeout=1)
+        self.session.process(b"BUY aaaa-aaaa-aaaa-aaaa\r\n")
+        self.assertEqual(self.session.process(b"payment 3\r\n"), b"ERR 3\r\n")
+        self.assertEqual(self.liquor_db.read("aaaa-aaaa-aaaa-aaaa").stock, 2)
+        server.BANK.close()
+        bank.close()
+
+        # Nobody listening, the buyer gets an error instead of hanging forever
+        server.BANK = BankGateway(bank.address, timeout=0.1)
+        self.session.process(b"BUY aaaa-aaaa-aaaa-aaaa\r\n")
+        self.assertEqual(self.session.process(b"payment 3\r\n"), b"ERR 255\r\n")
+        server.BANK.close()
+
+    def test_reservations(self):
+        book = ReservationBook(ttl=10, sweep_interval=60)
+        server.STORE = LiquorStore(self.liquor_db, reservations=book)
+        other = server.LiquorStoreSession(("127.0.0.1", 5001))
+        bank = FakeBank("ERR 3")
+        server.BANK = BankGateway(bank.address, timeout=1)
+
+        # Both bottles held by the first buyer until it pays
+        self.assertEqual(
+            self.session.process(b"CART aaaa-aaaa-aaaa-aaaa:2\r\n"), b"OK 229800.0\r\n"
+        )
+        self.assertEqual(other.process(b"BUY aaaa-aaaa-aaaa-aaaa\r\n"), b"ERR 4\r\n")
+
+        # Rejected by the bank, the bottles go back on sale
+        self.assertEqual(self.session.process(b"payment 3\r\n"), b"ERR 3\r\n")
+        self.assertEqual(other.process(b"BUY aaaa-aaaa-aaaa-aaaa\r\n"), b"OK 114900.0\r\n")
+        self.assertEqual(book.held("aaaa-aaaa-aaaa-aaaa"), 1)
+
+        # Disconnected before paying
+        other.release()
+        self.assertEqual(book.held("aaaa-aaaa-aaaa-aaaa"), 0)
+        self.assertEqual(self.liquor_db.read("aaaa-aaaa-aaaa-aaaa").stock, 2)
+
+        server.BANK.close()
+        bank.close()
+        book.close()
+
+    def test_sales(self):
+        self.liquor_db.update("bbbb-bbbb-bbbb-bbbb", delta_stock=3)
+        bank = FakeBank("OK Transfer done")
+        server.BANK = BankGateway(bank.address, timeout=1)
+
+        self.session.process(b"CART aaaa-aaaa-aaaa-aaaa bbbb-bbbb-bbbb-bbbb:3\r\n")
+        self.session.process(b"payment 3\r\n")
+        self.session.process(b"BUY aaaa-aaaa-aaaa-aaaa\r\n")
+        self.session.process(b"payment 3\r\n")
+        # Rejected purchases don't count
+        self.session.process(b"BUY aaaa-aaaa-aaaa-aaaa\r\n")
+
+        self.assertEqual(
+            loads(self.session.process(b"TOP\r\n")[3:]),
+            [["bbbb-bbbb-bbbb-bbbb", 3, 296_700.0], ["aaaa-aaaa-aaaa-aaaa", 2, 229_800.0]],
+        )
+        self.assertEqual(
+            loads(self.session.process(b"TOP limit=1 window=minute\r\n")[3:]),
+            [["bbbb-bbbb-bbbb-bbbb", 3, 296_700.0]],
+        )
+        self.assertEqual(
+            loads(self.session.process(b"SALES window=hour\r\n")[3:]),
+            {"orders": 2, "units": 5, "revenue": 526_500.0},
+        )
+        self.assertEqual(
+            loads(self.session.process(b"SALES uuid=aaaa-aaaa-aaaa-aaaa\r\n")[3:]),
+            {"orders": 2, "units": 2, "revenue": 229_800.0},
+        )
+        for malformed in [
+            b"TOP window=week",
+            b"TOP limit=0",
+            "TOP limit=\u00b2".encode(),
+            b"TOP uuid=x",
+            b"SALES limit=1",
+        ]:
+            self.assertEqual(self.session.process(malformed + b"\r\n"), b"ERR 253\r\n")
+
+        # Workers only count their own sales, reports are left to the sales DB
+        server.WORKERS = object()
+        self.assertEqual(self.session.process(b"TOP\r\n"), b"ERR 254\r\n")
+        self.assertEqual(self.session.process(b"SALES\r\n"), b"ERR 254\r\n")
+        server.BANK.close()
+        bank.close()
+
+    def test_admin_commands(self):
+        restock = b"RESTOCK aaaa-aaaa-aaaa-aaaa:10 bbbb-bbbb-bbbb-bbbb:-1 cccc:1\r\n"
+        self.assertEqual(self.session.process(restock), b"ERR 251\r\n")
+        # Disabled until a token is configured
+        self.assertEqual(self.session.process(b"AUTH secret\r\n"), b"ERR 251\r\n")
+
+        server.ADMIN_TOKEN = "secret"
+        self.assertEqual(self.session.process(b"AUTH guess\r\n"), b"ERR 251\r\n")
+        self.assertEqual(self.session.process(b"AUTH secret\r\n"), b"OK admin\r\n")
+        self.assertEqual(
+            loads(self.session.process(restock)[3:]),
+            [
+                ["aaaa-aaaa-aaaa-aaaa", 0, 12],
+                ["bbbb-bbbb-bbbb-bbbb", 4, None],
+                ["cccc", 252, None],
+            ],
+        )
+        self.assertEqual(
+            loads(self.session.process(b"REPRICE bbbb-bbbb-bbbb-bbbb:1000.5\r\n")[3:]),
+            [["bbbb-bbbb-bbbb-bbbb", 0, 1000.5]],
+        )
+        for malformed in [b"REPRICE aaaa-aaaa-aaaa-aaaa:-1", b"RESTOCK aaaa:1.5", b"REPRICE x:nan"]:
+            self.assertEqual(self.session.process(malformed + b"\r\n"), b"ERR 253\r\n")
+        # Beyond what SQLite stores
+        for huge in [b"9" * 400, b"99999999999999999999", b"-99999999999999999999"]:
+            for command in [b"RESTOCK", b"REPRICE"]:
+                self.assertEqual(
+                    self.session.process(command + b" aaaa-aaaa-aaaa-aaaa:" + huge + b"\r\n"),
+                    b"ERR 253\r\n",
+                )
+        self.assertEqual(
+            loads(self.session.process(b"RESTOCK aaaa-aaaa-aaaa-aaaa:%d\r\n" % (2**63 - 1))[3:]),
+            [["aaaa-aaaa-aaaa-aaaa", 253, None]],
+        )
+
+        # Changes are served right away
+        self.assertEqual(loads(self.session.process(b"LIST\r\n")[3:])[0][3], 12)
+
+    def test_second_binary_hello(self):
+        self.assertEqual(self.session.process(b"HI BIN\r\n"), b"OK BIN\r\n")
+        # Already decoding frames, a text line would break the client's decoder
+        frames = wire.split_frames(bytearray(self.session.process(b"HI BIN\r\n")))
+        self.assertEqual(frames, [(wire.TEXT, b"OK BIN\r\n")])
+        self.assertTrue(self.session.binary)
+
+    def test_binary_replies(self):
+        self.assertEqual(self.session.process(b"HI BIN\r\n"), b"OK BIN\r\n")
+        self.assertTrue(self.session.binary)
+
+        # Same liquors as the text LIST, in a single frame
+        frames = wire.split_frames(bytearray(self.session.process(b"LIST\r\n")))
+        self.assertEqual(len(frames), 1)
+        kind, payload = frames[0]
+        self.assertEqual(kind, wire.LIST)
+        listing = wire.decode_list(payload)
+        expected = [liquor.get_data() for liquor in self.liquor_db.read(read_all=True)]
+        self.assertEqual(listing["liquors"], expected)
+        self.assertEqual(listing["users"], 1)
+        self.assertEqual(listing["owner"], server.OWNER_UUID)
+
+        kind, payload = wire.split_frames(
+            bytearray(self.session.process(b"LIST limit=1\r\n"))
+        )[0]
+        self.assertEqual(wire.decode_list(payload)["next"], "aaaa-aaaa-aaaa-aaaa")
+
+        kind, payload = wire.split_frames(
+            bytearray(self.session.process(b"BUY bbbb-bbbb-bbbb-bbbb\r\n"))
+        )[0]
+        self.assertEqual((kind, wire.decode_error(payload)), (wire.ERROR, 4))
+
+        kind, payload = wire.split_frames(
+            bytearray(self.session.process(b"BUY aaaa-aaaa-aaaa-aaaa\r\n"))
+        )[0]
+        self.assertEqual((kind, wire.decode_quote(payload)), (wire.QUOTE, 114_900.0))
+
+        bank = FakeBank("OK Transfer 42 done")
+        server.BANK = BankGateway(bank.address, timeout=1)
+        frames = wire.split_frames(bytearray(self.session.process(b"payment 3\r\n")))
+        self.assertEqual(
+            frames,
+            [
+                (wire.TEXT, b"OK Transfer 42 done\r\n"),
+                (wire.TEXT, b"Here, enjoy your Vodka\r\n"),
+            ],
+        )
+        server.BANK.close()
+        bank.close()
+
+    def test_watch(self):
+        woken = []
+        self.session.wake = lambda: woken.append(1)
+        self.assertEqual(self.session.process(b"WATCH cccc-cccc-cccc-cccc\r\n"), b"ERR 252\r\n")
+        self.assertFalse(self.session.watching)
+        self.assertEqual(self.session.process(b"WATCH aaaa-aaaa-aaaa-aaaa\r\n"), b"OK 1\r\n")
+        self.assertTrue(self.session.watching)
+
+        self.liquor_db.update("bbbb-bbbb-bbbb-bbbb", delta_stock=1)
+        self.assertEqual(self.session.pushes(), b"")
+        self.liquor_db.update("aaaa-aaaa-aaaa-aaaa", delta_stock=-1)
+        self.liquor_db.update("aaaa-aaaa-aaaa-aaaa", delta_stock=-1)
+        server.HUB.flush()
+        self.assertEqual(len(woken), 1)
+        self.assertEqual(
+            self.session.pushes(), b'UPDATE ["aaaa-aaaa-aaaa-aaaa", 0, 114900.0]\r\n'
+        )
+
+        self.assertEqual(self.session.process(b"UNWATCH\r\n"), b"OK 0\r\n")
+        self.assertFalse(self.session.watching)
+        self.liquor_db.update("aaaa-aaaa-aaaa-aaaa", delta_stock=1)
+        self.assertEqual(self.session.pushes(), b"")
+        self.session.release()
+        self.assertEqual(server.HUB.stats()["subscriptions"], 0)
+
+    def test_rate_limit(self):
+        server.LIMITER = RateLimiter({"LIST": (0.001, 2)})
+        reply = self.session.process_lines([b"LIST limit=1\r\n"] * 3)
+        self.assertEqual(reply.count(b"OK "), 2)
+        self.assertTrue(reply.endswith(b"ERR 249\r\n"))
+        # Other commands are not limited
+        self.assertEqual(self.session.process(b"UNWATCH\r\n"), b"OK 0\r\n")
+        self.assertEqual(server.LIMITER.stats()["throttled"], {"LIST": 1})
+
+
+class TestEngines(ServerTestCase):
+    """
+    Round trips through the I/O loops of both engines over real sockets.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.bank = FakeBank("OK Transfer done")
+        server.BANK = BankGateway(self.bank.address, timeout=1)
+
+    def round_trip(self, address: tuple[str, int]):
+        with create_connection(address, timeout=5) as client:
+            replies = client.makefile("rb")
+            # HI has no reply, the LIST pipelined after it answers for both
+            client.sendall(b"HI\r\nLIST\r\n")
+            listing = loads(replies.readline()[3:])
+            self.assertEqual(listing[0][0], "aaaa-aaaa-aaaa-aaaa")
+            self.assertEqual(listing[-1], server.OWNER_UUID)
+
+            client.sendall(b"BUY aaaa-aaaa-aaaa-aaaa\r\n")
+            self.assertEqual(replies.readline(), b"OK 114900.0\r\n")
+            client.sendall(b"payment 3\r\n")
+            self.assertEqual(replies.readline(), b"OK Transfer done\r\n")
+            self.assertEqual(replies.readline(), b"Here, enjoy your Vodka\r\n")
+            replies.close()
+        self.assertEqual(self.liquor_db.read("aaaa-aaaa-aaaa-aaaa").stock, 1)
+
+    def test_threaded(self):
+        tcp_server = server.LiquorStoreTCPServer(
+            ("127.0.0.1", 0), server.LiquorStoreTCPServerHandler
+        )
+        thread = Thread(target=tcp_server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            self.round_trip(tcp_server.server_address)
+        finally:
+            tcp_server.shutdown()
+            tcp_server.server_close()
+            thread.join()
+
+    def test_asyncio(self):
+        loop = asyncio.new_event_loop()
+        tcp_server = loop.run_until_complete(
+            asyncio.start_server(server.handle_async_connection, "127.0.0.1", 0)
+        )
+        thread = Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+        try:
+            self.round_trip(tcp_server.sockets[0].getsockname())
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            tcp_server.close()
+            loop.run_until_complete(tcp_server.wait_closed())
+            loop.close()
+
+    def tearDown(self):
+        server.BANK.close()
+        self.bank.close()
+        super().tearDown()
+
+
+class TestParseArgs(unittest.TestCase):
+    ADDRESSES = ["127.0.0.1", "5000", "127.0.0.1", "6000"]
+
+    def test_reservations_need_a_single_worker(self):
+        self.assertEqual(server.parse_args(self.ADDRESSES).reservation_ttl, 30)
+        # Holds are per process, several workers would quote the last bottle twice
+        workers = self.ADDRESSES + ["--workers", "2"]
+        self.assertEqual(server.parse_args(workers).reservation_ttl, 0)
+        with redirect_stderr(StringIO()), self.assertRaises(SystemExit):
+            server.parse_args(workers + ["--reservation-ttl", "5"])
+
+    def test_sales_db_follows_the_catalog(self):
+        parsed = server.parse_args(self.ADDRESSES + ["--db-path", "/tmp/x/catalog.db"])
+        self.assertEqual(parsed.sales_db, "/tmp/x/sales.db")
+        parsed = server.parse_args(self.ADDRESSES + ["--sales-db", ""])
+        self.assertEqual(parsed.sales_db, "")
+
+
+if __name__ == "__main__":
+    unittest.main()
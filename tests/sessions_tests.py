@@ -0,0 +1,80 @@
+import unittest
+from time import sleep
+from src.sessions import SessionRegistry
+
+
+class TestSessionRegistry(unittest.TestCase):
+    def test_connection_limit(self):
+        registry = SessionRegistry(max_connections=2)
+        first = registry.open(("127.0.0.1", 1), lambda: None)
+        registry.open(("127.0.0.1", 2), lambda: None)
+        self.assertIsNone(registry.open(("127.0.0.1", 3), lambda: None))
+        self.assertEqual(len(registry), 2)
+
+        # Closing twice only frees one slot
+        registry.close(first)
+        registry.close(first)
+        self.assertEqual(len(registry), 1)
+        self.assertIsNotNone(registry.open(("127.0.0.1", 4), lambda: None))
+        self.assertEqual(registry.stats()["rejected"], 1)
+
+    def test_idle_reaping(self):
+        closed = []
+        registry = SessionRegistry(idle_timeout=0.05)
+        idle = registry.open(("127.0.0.1", 1), lambda: closed.append("idle"))
+        active = registry.open(("127.0.0.1", 2), lambda: closed.append("active"))
+
+        sleep(0.06)
+        registry.touch(active, commands=3)
+        self.assertEqual(registry.reap(), 1)
+        self.assertEqual(closed, ["idle"])
+        self.assertEqual(registry.sessions(), [active])
+        self.assertEqual(active.commands, 3)
+        registry.close(idle)
+
+        registry.start_reaper()
+        sleep(0.2)
+        registry.stop_reaper()
+        self.assertEqual(closed, ["idle", "active"])
+        self.assertEqual(len(registry), 0)
+
+    def test_watchers_are_not_reaped(self):
+        closed = []
+        watching = [True]
+        registry = SessionRegistry(idle_timeout=0.05)
+        registry.open(
+            ("127.0.0.1", 1), lambda: closed.append("watcher"), watching=lambda: watching[0]
+        )
+        registry.open(("127.0.0.1", 2), lambda: closed.append("idle"))
+
+        sleep(0.06)
+        self.assertEqual(registry.reap(), 1)
+        self.assertEqual(closed, ["idle"])
+        self.assertEqual(len(registry), 1)
+
+        # Idle again once it stops watching
+        watching[0] = False
+        sleep(0.06)
+        self.assertEqual(registry.reap(), 1)
+        self.assertEqual(closed, ["idle", "watcher"])
+
+    def test_drain(self):
+        counts = []
+        registry = SessionRegistry()
+        registry.on_change = counts.append
+        closed = []
+
+        # Finishes as soon as it's asked to, like a client waiting for input
+        idle = registry.open(
+            ("127.0.0.1", 1), lambda: None, drain=lambda: registry.close(idle)
+        )
+        # Never finishes its command, closed once the timeout expires
+        registry.open(("127.0.0.1", 2), lambda: closed.append("stuck"), drain=lambda: None)
+
+        self.assertEqual(registry.drain(timeout=0.05), 1)
+        self.assertEqual(closed, ["stuck"])
+        self.assertEqual(counts, [1, 2, 1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import sqlite3
+import unittest
+from tempfile import TemporaryDirectory
+from src import wire
+from src.db import Liquor, LiquorDatabase, ShardedLiquorDatabase
+from src.liquor import LiquorStore
+from src.snapshot import SnapshotError, load_snapshot, save_snapshot
+
+
+class TestCatalogSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        self.db_path = f"{self.tmp_dir.name}/liquor_store.db"
+        self.snapshot_path = f"{self.tmp_dir.name}/catalog.snapshot"
+        self.liquor_db = LiquorDatabase(self.db_path)
+        self.liquor_db.create(Liquor("aaaa-aaaa-aaaa-aaaa", "test_liquor1", "co", 5, 1000))
+        self.liquor_db.create(Liquor("bbbb-bbbb-bbbb-bbbb", "test_liquor2", "ru", 0, 2000))
+
+    def tearDown(self):
+        self.liquor_db.close()
+        self.tmp_dir.cleanup()
+
+    def test_stamp(self):
+        stamp = self.liquor_db.stamp()
+        self.assertEqual(self.liquor_db.stamp(), stamp)
+        self.liquor_db.update("aaaa-aaaa-aaaa-aaaa", delta_stock=-1)
+        self.assertNotEqual(self.liquor_db.stamp(), stamp)
+
+        # A failed write leaves it as it was
+        stamp = self.liquor_db.stamp()
+        with self.assertRaises(ValueError):
+            self.liquor_db.update("bbbb-bbbb-bbbb-bbbb", delta_stock=-1)
+        self.assertEqual(self.liquor_db.stamp(), stamp)
+
+    def test_round_trip(self):
+        store = LiquorStore(self.liquor_db)
+        expected = store.list_prefix(), store.list()[1], store.list_binary()[1]
+        save_snapshot(self.snapshot_path, store, self.liquor_db)
+
+        # Changed behind the database's back, LIST is served from the snapshot
+        connection = sqlite3.connect(self.db_path)
+        with connection:
+            connection.execute("UPDATE liquor_store SET stock = 99")
+        connection.close()
+
+        restarted = LiquorStore(self.liquor_db)
+        load_snapshot(self.snapshot_path, restarted, self.liquor_db)
+        self.assertEqual(
+            (restarted.list_prefix(), restarted.list()[1], restarted.list_binary()[1]),
+            expected,
+        )
+        self.assertEqual(
+            wire.decode_list(wire.encode_list(expected[2], 1, "owner")[5:])["liquors"][0],
+            ("aaaa-aaaa-aaaa-aaaa", "test_liquor1", "co", 5, 1000.0),
+        )
+
+    def test_stale_or_corrupt(self):
+        store = LiquorStore(self.liquor_db)
+        save_snapshot(self.snapshot_path, store, self.liquor_db)
+        self.liquor_db.update("aaaa-aaaa-aaaa-aaaa", price=1500)
+        with self.assertRaises(SnapshotError):
+            load_snapshot(self.snapshot_path, LiquorStore(self.liquor_db), self.liquor_db)
+
+        # Saved again, but cut short
+        save_snapshot(self.snapshot_path, store, self.liquor_db)
+        with open(self.snapshot_path, "r+b") as file:
+            file.truncate(30)
+        with self.assertRaises(SnapshotError):
+            load_snapshot(self.snapshot_path, LiquorStore(self.liquor_db), self.liquor_db)
+        with self.assertRaises(OSError):
+            load_snapshot(f"{self.snapshot_path}.missing", store, self.liquor_db)
+
+    def test_sharded(self):
+        sharded = ShardedLiquorDatabase(self.db_path, 2)
+        sharded.create_many(self.liquor_db.iter_all())
+        store = LiquorStore(sharded)
+        save_snapshot(self.snapshot_path, store, sharded)
+        load_snapshot(self.snapshot_path, LiquorStore(sharded), sharded)
+
+        sharded.delete("aaaa-aaaa-aaaa-aaaa")
+        with self.assertRaises(SnapshotError):
+            load_snapshot(self.snapshot_path, LiquorStore(sharded), sharded)
+        sharded.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import logging
+import unittest
+from src.utils import (
+    SAMPLED,
+    DeferredQueueHandler,
+    Formatter,
+    SamplingFilter,
+    resolve_level,
+)
+
+
+class TestLogging(unittest.TestCase):
+    def test_formatter(self):
+        formatter = Formatter()
+        record = logging.LogRecord(
+            "test", logging.WARNING, __file__, 1, "Bank request failed: %s", ("timeout",), None
+        )
+        self.assertRegex(
+            formatter.format(record),
+            r"^\[WARN\]  \d\d-\d\d-\d{4} \d\d:\d\d:\d\d - Bank request failed: timeout$",
+        )
+
+    def test_sampling(self):
+        sampling = SamplingFilter(rate=10)
+        sampled = logging.makeLogRecord({"msg": "Command LIST issued", **SAMPLED})
+        plain = logging.makeLogRecord({"msg": "Bank request failed"})
+
+        self.assertEqual(sum(sampling.filter(sampled) for _ in range(100)), 10)
+        self.assertTrue(all(sampling.filter(plain) for _ in range(100)))
+        self.assertTrue(all(SamplingFilter(rate=1).filter(sampled) for _ in range(10)))
+
+    def test_resolve_level(self):
+        self.assertEqual(resolve_level("info"), logging.INFO)
+        self.assertEqual(resolve_level(logging.ERROR), logging.ERROR)
+        self.assertEqual(resolve_level("30"), logging.WARNING)
+        with self.assertRaises(ValueError):
+            resolve_level("LOUD")
+
+    def test_deferred_formatting(self):
+        class Liquor:
+            formatted = 0
+
+            def __str__(self):
+                Liquor.formatted += 1
+                return "Aguardiente"
+
+        records = []
+
+        class ListQueue:
+            def put_nowait(self, record):
+                records.append(record)
+
+        logger = logging.getLogger("utils_tests")
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        logger.addHandler(DeferredQueueHandler(ListQueue()))
+
+        logger.debug("Below the level: %s", Liquor())
+        logger.info("Sold %s", Liquor())
+        # Filtered records aren't built and enqueued ones aren't formatted yet
+        self.assertEqual(len(records), 1)
+        self.assertEqual(Liquor.formatted, 0)
+        self.assertEqual(records[0].getMessage(), "Sold Aguardiente")
+
+
+if __name__ == "__main__":
+    unittest.main()
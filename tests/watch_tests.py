@@ -0,0 +1,107 @@
+import unittest
+from tempfile import TemporaryDirectory
+from src.db import Liquor, LiquorDatabase
+from src.watch import RELOAD_LINE, Subscription, WatchHub
+
+
+class TestSubscription(unittest.TestCase):
+    def setUp(self):
+        self.woken = 0
+
+    def wake(self):
+        self.woken += 1
+
+    def test_coalescing(self):
+        subscription = Subscription(self.wake)
+        subscription.put("a", b"1")
+        subscription.put("b", b"2")
+        subscription.put("a", b"3")
+        # Woken once, only the latest state of each liquor is sent
+        self.assertEqual(self.woken, 1)
+        self.assertEqual(subscription.drain(), [b"2", b"3"])
+        self.assertEqual(subscription.drain(), [])
+
+    def test_overflow_reloads(self):
+        subscription = Subscription(self.wake, max_pending=2)
+        for uuid in "abc":
+            subscription.put(uuid, uuid.encode())
+        subscription.put("d", b"d")
+        self.assertEqual(subscription.drain(), [RELOAD_LINE])
+        self.assertEqual(subscription.drain(), [])
+
+
+class TestWatchHub(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        self.liquor_db = LiquorDatabase(f"{self.tmp_dir.name}/liquor_store.db")
+        self.liquor_db.create(Liquor("aaaa-aaaa-aaaa-aaaa", "test_liquor1", "co", 5, 1000))
+        self.liquor_db.create(Liquor("bbbb-bbbb-bbbb-bbbb", "test_liquor2", "co", 1, 2000))
+        self.hub = WatchHub(self.liquor_db)
+
+    def tearDown(self):
+        self.hub.stop()
+        self.liquor_db.close()
+        self.tmp_dir.cleanup()
+
+    def test_fan_out(self):
+        one = self.hub.subscribe(lambda: None)
+        every = self.hub.subscribe(lambda: None)
+        self.hub.watch(one, ["aaaa-aaaa-aaaa-aaaa"])
+        self.hub.watch(every, [])
+
+        self.liquor_db.update("aaaa-aaaa-aaaa-aaaa", delta_stock=-1)
+        self.liquor_db.update("bbbb-bbbb-bbbb-bbbb", delta_stock=-1)
+        self.hub.flush()
+        line = b'UPDATE ["aaaa-aaaa-aaaa-aaaa", 4, 1000.0]\r\n'
+        self.assertEqual(one.drain(), [line])
+        self.assertEqual(
+            every.drain(), [line, b'UPDATE ["bbbb-bbbb-bbbb-bbbb", 0, 2000.0]\r\n']
+        )
+
+        self.liquor_db.delete("aaaa-aaaa-aaaa-aaaa")
+        self.hub.flush()
+        self.assertEqual(one.drain(), [b'UPDATE ["aaaa-aaaa-aaaa-aaaa", null, null]\r\n'])
+
+        self.hub.on_change(None)
+        self.assertEqual(one.drain(), [RELOAD_LINE])
+        self.assertEqual(self.hub.stats()["pushed"], 5)
+
+    def test_committer_never_reads(self):
+        subscription = self.hub.subscribe(lambda: None)
+        self.hub.watch(subscription, [])
+        reads = []
+        read_many = self.liquor_db.read_many
+        self.liquor_db.read_many = lambda uuids: reads.append(uuids) or read_many(uuids)
+        self.hub.stop()
+
+        # Queued by the committing thread, read in one batch by the hub
+        self.liquor_db.update("aaaa-aaaa-aaaa-aaaa", delta_stock=-1)
+        self.liquor_db.update("bbbb-bbbb-bbbb-bbbb", delta_stock=-1)
+        self.liquor_db.update("aaaa-aaaa-aaaa-aaaa", delta_stock=-1)
+        self.assertEqual(reads, [])
+        self.assertEqual(self.hub.flush(), 2)
+        self.assertEqual(reads, [["aaaa-aaaa-aaaa-aaaa", "bbbb-bbbb-bbbb-bbbb"]])
+        self.assertEqual(
+            subscription.drain(),
+            [
+                b'UPDATE ["aaaa-aaaa-aaaa-aaaa", 3, 1000.0]\r\n',
+                b'UPDATE ["bbbb-bbbb-bbbb-bbbb", 0, 2000.0]\r\n',
+            ],
+        )
+
+    def test_unwatch(self):
+        subscription = self.hub.subscribe(lambda: None)
+        self.hub.watch(subscription, ["aaaa-aaaa-aaaa-aaaa", "bbbb-bbbb-bbbb-bbbb"])
+        self.hub.unwatch(subscription, ["aaaa-aaaa-aaaa-aaaa"])
+        self.liquor_db.update("aaaa-aaaa-aaaa-aaaa", delta_stock=-1)
+        self.hub.flush()
+        self.assertEqual(subscription.drain(), [])
+        self.assertEqual(self.hub.stats()["watched"], 1)
+
+        self.hub.close(subscription)
+        self.hub.close(subscription)
+        self.assertEqual(self.hub.stats(), {"subscriptions": 0, "watched": 0, "pushed": 0})
+
+
+if __name__ == "__main__":
+    unittest.main()
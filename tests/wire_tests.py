@@ -0,0 +1,86 @@
+import unittest
+from json import dumps
+from uuid import uuid4
+from src import wire
+from src.db import Liquor
+
+
+class TestWire(unittest.TestCase):
+    def round_trip(self, liquors, next_cursor=None, more=False):
+        frame = wire.encode_list(
+            wire.encode_page(liquors, next_cursor), 7, str(uuid4()), more=more
+        )
+        frames = wire.split_frames(bytearray(frame))
+        self.assertEqual(len(frames), 1)
+        self.assertEqual(frames[0][0], wire.LIST)
+        return wire.decode_list(frames[0][1])
+
+    def test_list_round_trip(self):
+        liquors = [
+            Liquor(str(uuid4()), "Aguardiente Antioqueño", "co", 3, 40_700),
+            Liquor(str(uuid4()), "焼酎", "jp", 0, 0.5),
+            Liquor(str(uuid4()), "Soju", "kr", 2**32 - 1, 98_900),
+            # Restocked past u32
+            Liquor(str(uuid4()), "Pisco", "pe", 2**63 - 1, 60_000),
+        ]
+        listing = self.round_trip(liquors, next_cursor=liquors[-1].uuid, more=True)
+        self.assertEqual(listing["liquors"], [liquor.get_data() for liquor in liquors])
+        self.assertEqual(listing["next"], liquors[-1].uuid)
+        self.assertEqual(listing["users"], 7)
+        self.assertTrue(listing["more"])
+
+        self.assertEqual(self.round_trip([])["liquors"], [])
+
+    def test_non_canonical_uuids(self):
+        # Uppercase and made up UUIDs go through the string table untouched
+        liquors = [
+            Liquor(str(uuid4()).upper(), "Vodka", "ru", 6, 114_900),
+            Liquor("aaaa-aaaa-aaaa-aaaa", "Beer", "de", 10, 3_500),
+        ]
+        listing = self.round_trip(liquors, next_cursor="aaaa-aaaa-aaaa-aaaa")
+        self.assertEqual(listing["liquors"], [liquor.get_data() for liquor in liquors])
+        self.assertEqual(listing["next"], "aaaa-aaaa-aaaa-aaaa")
+        self.assertFalse(listing["more"])
+
+    def test_split_frames(self):
+        stream = (
+            wire.encode_error(252)
+            + wire.encode_quote(114_900.0)
+            + wire.encode_text(b"OK Transfer done\r\n")
+        )
+        buffer = bytearray()
+        frames = []
+        # Byte by byte, like the worst TCP segmentation
+        for byte in stream:
+            buffer.append(byte)
+            frames += wire.split_frames(buffer)
+        self.assertEqual(len(buffer), 0)
+        self.assertEqual(
+            [kind for kind, _ in frames], [wire.ERROR, wire.QUOTE, wire.TEXT]
+        )
+        self.assertEqual(wire.decode_error(frames[0][1]), 252)
+        self.assertEqual(wire.decode_quote(frames[1][1]), 114_900.0)
+        self.assertEqual(frames[2][1], b"OK Transfer done\r\n")
+
+        with self.assertRaises(wire.IncompleteFrame):
+            wire.decode_list(frames[0][1])
+
+    def test_smaller_than_json(self):
+        liquors = [
+            Liquor(str(uuid4()), f"Liquor {i}", "co", i, 1000.0 + i) for i in range(100)
+        ]
+        binary = wire.encode_page(liquors)
+        text = dumps([liquor.get_data() for liquor in liquors]).encode()
+        self.assertLess(len(binary), len(text) * 0.7)
+
+    def test_wide_indexes(self):
+        # More than 65535 strings don't fit u16 indexes
+        liquors = [
+            Liquor(f"{i:08}-load-test", f"Liquor {i}", "co", i, i) for i in range(33_000)
+        ]
+        listing = self.round_trip(liquors)
+        self.assertEqual(listing["liquors"][-1], liquors[-1].get_data())
+
+
+if __name__ == "__main__":
+    unittest.main()
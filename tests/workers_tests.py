@@ -0,0 +1,38 @@
+import os
+import unittest
+from src.workers import WorkerPool
+
+
+@unittest.skipUnless(hasattr(os, "fork"), "needs fork")
+class TestWorkerPool(unittest.TestCase):
+    def test_shared_counters(self):
+        pool = WorkerPool(3)
+        index = pool.fork()
+        if index is not None:
+            # Worker: publish some clients and a catalog change, then leave
+            pool.set_users(index + 1)
+            if index == 1:
+                pool.record_change("0d3bbc5c-1a6e-4b2e-a7e2-53f9c3a1b2d4")
+            os._exit(0)
+
+        self.assertEqual(pool.wait(), 0)
+        self.assertEqual(pool.users(), 6)
+
+        # Seen from worker 0, the change of worker 1 is reported once
+        pool.index = 0
+        self.assertTrue(pool.poll_changes())
+        self.assertFalse(pool.poll_changes())
+        pool.record_change()
+        self.assertFalse(pool.poll_changes())
+
+    def test_failed_worker(self):
+        pool = WorkerPool(2)
+        index = pool.fork()
+        if index is not None:
+            os._exit(index)
+
+        self.assertEqual(pool.wait(), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()